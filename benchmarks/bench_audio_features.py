@@ -0,0 +1,131 @@
+"""
+Compare the shared-STFT feature engine against the original per-feature
+librosa calls on synthetic speech-like audio.
+
+Usage: python -m benchmarks.bench_audio_features --durations 30 60 300
+"""
+import argparse
+import time
+
+import librosa
+import numpy as np
+
+from benchmarks.synthetic import speech_like
+from modules.audio_features import extract_features
+
+
+def legacy_features(y, sr):
+    # The pre-engine implementation of analyze_audio, kept as the reference
+    tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
+    spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
+    spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)[0]
+    zero_crossing_rate = librosa.feature.zero_crossing_rate(y)[0]
+    mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
+    chroma = librosa.feature.chroma_stft(y=y, sr=sr)
+    pitches, magnitudes = librosa.piptrack(y=y, sr=sr)
+    energy = librosa.feature.rms(y=y)[0]
+    onset_env = librosa.onset.onset_strength(y=y, sr=sr)
+    speech_rate = len(librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr)) / (
+        len(y) / sr
+    )
+    pauses = librosa.effects.split(y, top_db=0.1 * np.max(y))
+    pause_count = len(pauses) - 1
+    pause_duration_mean = (
+        np.mean([pause[0] - pauses[i - 1][1] for i, pause in enumerate(pauses[1:], 1)])
+        / sr
+        if pause_count > 0
+        else 0
+    )
+    voice_quality_hnr = np.mean(librosa.effects.harmonic(y)) / np.mean(
+        librosa.effects.percussive(y)
+    )
+    formants = librosa.lpc(y, order=5)[1:]
+    return {
+        'tempo': float(tempo) if np.isscalar(tempo) else float(tempo[0]),
+        'spectral_centroid': float(np.mean(spectral_centroids)),
+        'spectral_rolloff': float(np.mean(spectral_rolloff)),
+        'zero_crossing_rate_mean': float(np.mean(zero_crossing_rate)),
+        'mfccs': np.mean(mfccs, axis=1).tolist(),
+        'pitch_mean': float(np.mean(pitches[pitches > 0])),
+        'pitch_variability': float(np.std(pitches[pitches > 0])),
+        'energy_mean': float(np.mean(energy)),
+        'energy_variability': float(np.std(energy)),
+        'speech_rate': float(speech_rate),
+        'pause_count': int(pause_count),
+        'pause_duration_mean': float(pause_duration_mean),
+        'voice_quality_hnr': float(voice_quality_hnr),
+        'formants': [float(f) for f in formants],
+        'chroma': np.mean(chroma, axis=1).tolist()
+    }
+
+
+# Pauses and speech rate now come from voice activity segments
+# (bench_voice_activity) and pitch from one f0 per frame (bench_pitch), not
+# the legacy heuristics
+CHANGED_KEYS = {
+    'speech_rate',
+    'pause_count',
+    'pause_duration_mean',
+    'pitch_mean',
+    'pitch_variability',
+}
+
+
+def max_relative_error(reference, candidate):
+    worst = 0.0
+    for key, expected in reference.items():
+        if key in CHANGED_KEYS:
+            continue
+        expected = np.atleast_1d(np.asarray(expected, dtype=float))
+        actual = np.atleast_1d(np.asarray(candidate[key], dtype=float))
+        scale = np.maximum(np.abs(expected), 1e-12)
+        worst = max(worst, float(np.max(np.abs(actual - expected) / scale)))
+    return worst
+
+
+def timed(fn, *args, repeat=1):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '--durations',
+        type=float,
+        nargs='+',
+        default=[30, 60, 300],
+        help='Audio lengths in seconds',
+    )
+    parser.add_argument('--sr', type=int, default=22050)
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+
+    # Warm up numba-compiled librosa kernels so the first row isn't skewed
+    warm_up = speech_like(2, sr=args.sr)
+    legacy_features(warm_up, args.sr)
+    extract_features(warm_up, args.sr)
+
+    print(
+        f"{'duration_s':>10} {'legacy_s':>9} {'engine_s':>9} {'speedup':>8} "
+        f"{'max_rel_err':>12}"
+    )
+    for duration in args.durations:
+        y = speech_like(duration, sr=args.sr)
+        legacy_time, reference = timed(legacy_features, y, args.sr, repeat=args.repeat)
+        engine_time, features = timed(extract_features, y, args.sr, repeat=args.repeat)
+        error = max_relative_error(reference, features)
+        print(
+            f"{duration:>10.0f} {legacy_time:>9.2f} {engine_time:>9.2f} "
+            f"{legacy_time / engine_time:>7.2f}x {error:>12.2e}"
+        )
+
+
+if __name__ == '__main__':
+    main()
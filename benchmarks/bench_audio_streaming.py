@@ -0,0 +1,78 @@
+"""
+Peak RSS and wall time of in-memory vs streaming analyze_audio as the
+recording gets longer. Each run happens in a fresh interpreter so ru_maxrss
+reflects that run alone.
+
+Usage: python -m benchmarks.bench_audio_streaming --minutes 5 20 60
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import soundfile as sf
+
+from benchmarks.synthetic import speech_like
+
+RUNNER = """
+import json, resource, sys, time
+from modules.audio_analysis import analyze_audio
+start = time.perf_counter()
+analyze_audio(sys.argv[1], streaming=sys.argv[2] == 'streaming')
+print(json.dumps({
+    'seconds': time.perf_counter() - start,
+    'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+
+def write_recording(path, minutes, sr):
+    # Written a minute at a time so the generator itself stays small
+    with sf.SoundFile(path, 'w', samplerate=sr, channels=1, subtype='PCM_16') as f:
+        for minute in range(int(minutes)):
+            f.write(speech_like(60, sr=sr, seed=minute))
+
+
+def run(path, mode):
+    output = subprocess.run(
+        [sys.executable, '-c', RUNNER, path, mode],
+        check=True, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--minutes', type=float, nargs='+', default=[5, 20, 60])
+    parser.add_argument(
+        '--sr', type=int, default=44100, help='Sampling rate of the generated file'
+    )
+    parser.add_argument(
+        '--modes',
+        nargs='+',
+        default=['memory', 'streaming'],
+        choices=['memory', 'streaming'],
+    )
+    args = parser.parse_args()
+
+    print(f"{'minutes':>8} {'mode':>10} {'seconds':>9} {'peak_rss_mb':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for minutes in args.minutes:
+            path = os.path.join(tmp, f'call_{minutes:g}min.wav')
+            write_recording(path, minutes, args.sr)
+            for mode in args.modes:
+                result = run(path, mode)
+                print(
+                    f"{minutes:>8g} {mode:>10} {result['seconds']:>9.1f} "
+                    f"{result['peak_rss_mb']:>12.0f}"
+                )
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Throughput of Deepgram transcription and Anthropic analysis calls against a
+local stub API: a new client per call (the previous behaviour) versus the
+shared pooled clients, threaded and async.
+
+The stub speaks plain HTTP, so the gain measured here is TCP setup and client
+construction only; against the real services each new connection also pays a
+TLS handshake.
+
+Usage: python -m benchmarks.bench_clients --requests 400 --threads 16 --latency 0.02
+"""
+import argparse
+import asyncio
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import anthropic
+from deepgram import DeepgramClient, DeepgramClientOptions, PrerecordedOptions
+
+from benchmarks.stub_api import StubAPIServer
+from modules import clients, file_transcription, llm_integration
+
+
+def legacy_call(i):
+    # What each upload did before: construct both clients, then call
+    if i % 2:
+        deepgram = DeepgramClient(
+            os.environ['DEEPGRAM_API_KEY'],
+            DeepgramClientOptions(url=os.environ['DEEPGRAM_URL']),
+        )
+        payload = {'buffer': b'RIFF', 'mimetype': 'audio/wav'}
+        deepgram.listen.rest.v("1").transcribe_file(
+            payload, PrerecordedOptions(**file_transcription.TRANSCRIPTION_OPTIONS)
+        )
+    else:
+        anthropic.Anthropic().messages.create(
+            **llm_integration._build_request({'word_count': i})
+        )
+
+
+def pooled_call(i):
+    if i % 2:
+        file_transcription.transcribe_file(io.BytesIO(b'RIFF'), mimetype='audio/wav')
+    else:
+        clients.call_with_retries(
+            clients.ANTHROPIC,
+            clients.get_anthropic_client().messages.create,
+            **llm_integration._build_request({'word_count': i}),
+        )
+
+
+async def async_calls(n):
+    async def call(i):
+        if i % 2:
+            await file_transcription.transcribe_file_async(
+                io.BytesIO(b'RIFF'), mimetype='audio/wav'
+            )
+        else:
+            await clients.acall_with_retries(
+                clients.ANTHROPIC, clients.get_async_anthropic_client().messages.create,
+                **llm_integration._build_request({'word_count': i})
+            )
+    await asyncio.gather(*(call(i) for i in range(n)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument(
+        '--latency', type=float, default=0.02, help='Stub response time in seconds'
+    )
+    args = parser.parse_args()
+
+    with StubAPIServer(latency=args.latency) as stub:
+        os.environ.update({
+            'DEEPGRAM_API_KEY': 'stub', 'DEEPGRAM_URL': stub.url,
+            'ANTHROPIC_API_KEY': 'stub', 'ANTHROPIC_BASE_URL': stub.url,
+            'CLIENT_MAX_CONCURRENCY': str(args.threads),
+        })
+        clients.reset_clients()
+
+        print(f"{'mode':>16} {'seconds':>8} {'req/s':>8} {'connections':>12}")
+        modes = [
+            (
+                'client per call',
+                lambda: list(
+                    ThreadPoolExecutor(args.threads).map(
+                        legacy_call, range(args.requests)
+                    )
+                ),
+            ),
+            (
+                'pooled threads',
+                lambda: list(
+                    ThreadPoolExecutor(args.threads).map(
+                        pooled_call, range(args.requests)
+                    )
+                ),
+            ),
+            ('pooled async', lambda: asyncio.run(async_calls(args.requests))),
+        ]
+        for name, run in modes:
+            connections = stub.connections
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            print(
+                f"{name:>16} {elapsed:>8.2f} {args.requests / elapsed:>8.1f} "
+                f"{stub.connections - connections:>12}"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Entity statistics on transcripts with thousands of entities.
+
+Compares the old list-scan counting with EntityStats, and a live session that
+re-parses the whole transcript after every segment with one that updates
+EntityStats from each new segment only.
+
+Usage: python -m benchmarks.bench_entity_stats --words 5000 20000 80000 \\
+           --segment-words 50
+"""
+import argparse
+import time
+
+from benchmarks.synthetic import transcript_like
+from modules import text_analysis
+
+
+def legacy_entity_types(doc):
+    # The pre-EntityStats implementation (which also always counted 0)
+    entities = [(ent.text, ent.label_) for ent in doc.ents]
+    return {
+        ent_type: entities.count(ent_type)
+        for ent_type in {ent[1] for ent in entities}
+    }
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '--words',
+        type=int,
+        nargs='+',
+        default=[5000, 20000, 80000],
+        help='Transcript sizes in words',
+    )
+    parser.add_argument(
+        '--segment-words', type=int, default=50, help='Words per live segment'
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'words':>7} {'entities':>9} {'legacy_ms':>10} {'stats_ms':>9} "
+        f"{'reparse_s':>10} {'incr_s':>8}"
+    )
+    for n_words in args.words:
+        transcript = transcript_like(n_words)
+        doc = text_analysis.nlp(transcript)
+
+        legacy = timed(lambda doc=doc: legacy_entity_types(doc))
+        counted = timed(
+            lambda doc=doc: text_analysis.EntityStats().update(doc).to_dict()
+        )
+
+        words = transcript.split()
+        segments = [
+            ' '.join(words[i : i + args.segment_words])
+            for i in range(0, len(words), args.segment_words)
+        ]
+
+        def reparse(segments=segments):
+            seen = ''
+            for segment in segments:
+                seen = f'{seen} {segment}'
+                text_analysis.analyze_named_entities(seen)
+
+        def incremental(segments=segments):
+            stats = text_analysis.EntityStats()
+            for segment in segments:
+                stats.update(text_analysis.nlp(segment))
+                stats.to_dict()
+
+        # Re-parsing grows quadratically; skip it where it would take minutes
+        reparse_s = timed(reparse) if len(segments) <= 400 else float('nan')
+        incremental_s = timed(incremental)
+        print(
+            f"{n_words:>7} {len(doc.ents):>9} {legacy * 1000:>10.1f} "
+            f"{counted * 1000:>9.1f} "
+            f"{reparse_s:>10.2f} {incremental_s:>8.2f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
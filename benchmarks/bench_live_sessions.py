@@ -0,0 +1,130 @@
+"""
+Load test for live transcription: many concurrent sessions streaming audio in
+real time through LiveSessionManager and the Deepgram SDK to a local fake
+Deepgram server.
+
+Usage: python -m benchmarks.bench_live_sessions --sessions 200 --seconds 10 \\
+           --chunk-ms 20
+"""
+import argparse
+import collections
+import resource
+import threading
+import time
+
+from deepgram import DeepgramClient, DeepgramClientOptions
+
+from benchmarks.fake_deepgram import BYTES_PER_SECOND, FakeDeepgramServer
+from modules import realtime_transcription
+from modules.live_sessions import LiveSessionManager
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument(
+        '--seconds', type=float, default=10, help='Audio streamed per session'
+    )
+    parser.add_argument(
+        '--chunk-ms', type=int, default=20, help='Audio per client chunk'
+    )
+    parser.add_argument(
+        '--senders', type=int, default=8, help='Client threads driving the sessions'
+    )
+    args = parser.parse_args()
+
+    events = collections.Counter()
+    events_lock = threading.Lock()
+
+    def emit(event, _data):
+        with events_lock:
+            events[event] += 1
+
+    with FakeDeepgramServer() as server:
+        client = DeepgramClient('fake', DeepgramClientOptions(url=server.url))
+        manager = LiveSessionManager(
+            connect=lambda emit, analyzer: (
+                realtime_transcription.start_realtime_transcription(
+                    emit, analyzer, client=client
+                )
+            ),
+            max_sessions=args.sessions,
+        )
+        reaper = threading.Thread(target=manager.run_reaper, daemon=True)
+        reaper.start()
+
+        sids = [f'session-{i}' for i in range(args.sessions)]
+        started = time.perf_counter()
+        for sid in sids:
+            manager.start(sid, emit)
+        connect_seconds = time.perf_counter() - started
+
+        chunk = b'\x00\x01' * (BYTES_PER_SECOND * args.chunk_ms // 2000)
+        n_chunks = int(args.seconds * 1000 / args.chunk_ms)
+        max_queued = 0
+        late = 0
+
+        def sender(group):
+            nonlocal late
+            begin = time.perf_counter()
+            for i in range(n_chunks):
+                # Pace like a microphone: chunk i is due at i * chunk_ms
+                delay = begin + i * args.chunk_ms / 1000 - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                elif delay < -args.chunk_ms / 1000:
+                    late += 1
+                for sid in group:
+                    manager.send(sid, chunk)
+
+        groups = [sids[i::args.senders] for i in range(args.senders)]
+        threads = [threading.Thread(target=sender, args=(group,)) for group in groups]
+        streamed = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            max_queued = max(max_queued, manager.stats()['queued_bytes'])
+            time.sleep(0.05)
+        stream_seconds = time.perf_counter() - streamed
+        active_threads = threading.active_count()
+
+        for sid in sids:
+            manager.finish(sid)
+        manager.close()
+        stats = manager.stats()
+
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(
+        f"sessions={args.sessions} audio={args.seconds:.0f}s/session "
+        f"chunk={args.chunk_ms}ms"
+    )
+    print(
+        f"connect: {connect_seconds:.2f}s total, "
+        f"{connect_seconds / args.sessions * 1000:.1f} ms/session"
+    )
+    print(
+        f"streaming wall time: {stream_seconds:.2f}s for {args.seconds:.0f}s of audio, "
+        f"late pacing ticks: {late}"
+    )
+    print(
+        f"client chunks: {args.sessions * n_chunks}, sends to Deepgram: "
+        f"{stats['sends']} "
+        f"({args.sessions * n_chunks / max(stats['sends'], 1):.1f} chunks/send)"
+    )
+    print(
+        f"bytes sent: {stats['bytes_sent']}, received by server: "
+        f"{server.bytes_received}, "
+        f"dropped: {stats['bytes_dropped']}, max queued: {max_queued}"
+    )
+    print(
+        f"server results: {server.results_sent}, transcript events: "
+        f"{events['transcript']}, "
+        f"live_analysis events: {events['live_analysis']}"
+    )
+    print(f"threads while streaming: {active_threads}, max RSS: {rss_mb:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
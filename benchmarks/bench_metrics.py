@@ -0,0 +1,101 @@
+"""
+Overhead of the stage timers, and the cost of rendering /metrics.
+
+Times an empty ``timed()`` block, outside and inside a ``collect()``
+breakdown, against a bare loop; with 4 threads timing the same stage, which
+contend for the histogram's lock; and rendering the registry with every
+stage an upload records populated.
+
+Usage: python -m benchmarks.bench_metrics
+"""
+import threading
+import time
+
+from modules import metrics
+
+CALLS = 200000
+THREADS = 4
+STAGES = [
+    'transcription',
+    'audio.load',
+    'audio.spectrogram',
+    'audio.tempo',
+    'audio.spectral',
+    'audio.mfcc',
+    'audio.pitch',
+    'audio.energy',
+    'audio.rhythm',
+    'audio.voice_quality',
+    'audio.formants',
+    'audio.chroma',
+    'text.parse',
+    'text.tokens',
+    'text.sentences',
+    'text.sentiment',
+    'text.readability',
+    'text.entities',
+    'llm',
+    'feedback',
+    'db.save',
+    'upload',
+]
+
+
+def per_call_ns(fn, calls=CALLS):
+    start = time.perf_counter()
+    fn(calls)
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def bare(calls):
+    for _ in range(calls):
+        pass
+
+
+def timed_loop(calls):
+    for _ in range(calls):
+        with metrics.timed('bench'):
+            pass
+
+
+def collected_loop(calls):
+    with metrics.collect():
+        timed_loop(calls)
+
+
+def contended(calls):
+    threads = [
+        threading.Thread(target=timed_loop, args=(calls // THREADS,))
+        for _ in range(THREADS)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def main():
+    baseline = per_call_ns(bare)
+    print(f"empty loop:            {baseline:7.0f} ns/iteration")
+    print(f"timed():               {per_call_ns(timed_loop) - baseline:7.0f} ns/call")
+    print(
+        f"timed() in collect():  {per_call_ns(collected_loop) - baseline:7.0f} ns/call"
+    )
+    print(
+        f"timed(), {THREADS} threads:   {per_call_ns(contended) - baseline:7.0f} "
+        "ns/call"
+    )
+
+    for stage in STAGES:
+        metrics.record(stage, 0.1)
+    start = time.perf_counter()
+    for _ in range(100):
+        text = metrics.REGISTRY.render()
+    print(
+        f"render /metrics:       {(time.perf_counter() - start) * 10:7.2f} ms "
+        f"({len(text.splitlines())} lines)"
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Cost of loading a recording with and without the PCM cache.
+
+Encodes a speech-like recording of each ``--durations`` seconds at 44.1 kHz
+stereo in each ``--formats`` and then loads it three ways: librosa.load,
+which decodes and resamples every time; audio_storage.load_pcm on an empty
+cache, which decodes once and writes the artifact; and load_pcm again,
+which maps the artifact. Mapped samples are summed so every page is read.
+Each load is the best of ``--runs``. Finally analyze_audio is timed with
+the cache disabled and with a warm cache.
+
+Usage: python -m benchmarks.bench_pcm_cache --durations 60 600 --formats mp3 flac
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from benchmarks.synthetic import speech_like
+from modules import audio_storage
+from modules.audio_analysis import analyze_audio
+
+
+def best_of(runs, fn, *args):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def first_load(path):
+    shutil.rmtree(audio_storage.PCM_CACHE_DIR, ignore_errors=True)
+    audio_storage.load_pcm(path)
+
+
+def cached_load(path):
+    # Sum the mapped samples so every page is actually read
+    return float(np.sum(audio_storage.load_pcm(path)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--durations', type=float, nargs='+', default=[60, 600])
+    parser.add_argument('--formats', nargs='+', default=['mp3', 'flac'])
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_pcm_cache_')
+    audio_storage.PCM_CACHE_DIR = os.path.join(workdir, 'pcm')
+    print(
+        f"{'file':>14} {'librosa.load':>13} {'first load_pcm':>15} {'cached':>9} "
+        f"{'analyze':>9} {'cached':>9}"
+    )
+    try:
+        for duration in args.durations:
+            y = speech_like(duration, sr=44100)
+            stereo = np.stack([y, 0.8 * y], axis=1)
+            for extension in args.formats:
+                path = os.path.join(workdir, f'call_{duration:g}s.{extension}')
+                sf.write(path, stereo, 44100)
+
+                decode = best_of(args.runs, librosa.load, path)
+                first = best_of(args.runs, first_load, path)
+                cached = best_of(args.runs, cached_load, path)
+
+                audio_storage.PCM_CACHE_MAX_BYTES = 0
+                analyze = best_of(1, analyze_audio, path)
+                audio_storage.PCM_CACHE_MAX_BYTES = 4 * 1024 ** 3
+                analyze_cached = best_of(1, analyze_audio, path)
+
+                print(
+                    f"{os.path.basename(path):>14} {decode:>12.3f}s {first:>14.3f}s "
+                    f"{cached:>8.4f}s "
+                    f"{analyze:>8.2f}s {analyze_cached:>8.2f}s"
+                )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+End-to-end latency of the upload pipeline, stages run one at a time versus
+as a DAG, with Deepgram and Anthropic answered by the local stub API after a
+fixed delay and real audio and text analysis of a synthetic recording.
+
+Usage: python -m benchmarks.bench_pipeline --seconds 60 --latency 2.0
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import soundfile as sf
+
+from benchmarks.stub_api import StubAPIServer
+
+
+def synthetic_call(path, seconds, sr=22050):
+    # Voiced segments with pitch movement, separated by pauses
+    t = np.arange(int(seconds * sr)) / sr
+    pitch = 150 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    voiced = (np.sin(2 * np.pi * 0.4 * t) > -0.3).astype(np.float32)
+    y = 0.3 * np.sin(2 * np.pi * np.cumsum(pitch) / sr) * voiced
+    sf.write(path, y.astype(np.float32), sr)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '--seconds', type=float, default=60, help='Length of the synthetic recording'
+    )
+    parser.add_argument(
+        '--latency', type=float, default=2.0, help='Stub API response time in seconds'
+    )
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    audio_path = os.path.join(workdir, 'call.wav')
+    synthetic_call(audio_path, args.seconds)
+
+    with StubAPIServer(latency=args.latency) as stub:
+        os.environ.update({
+            'DEEPGRAM_API_KEY': 'stub', 'DEEPGRAM_URL': stub.url,
+            'ANTHROPIC_API_KEY': 'stub', 'ANTHROPIC_BASE_URL': stub.url,
+            'LLM_ANALYSIS_ENABLED': '1',
+            'DATABASE_URL': f'sqlite:///{workdir}/bench.db',
+            'PCM_CACHE_DIR': os.path.join(workdir, 'pcm'),
+        })
+        import routes
+        from modules import database
+        db = database.get_db()
+
+        def report(*args):
+            pass
+
+        print(f"{'mode':>10} {'seconds':>8}  stages (start + duration)")
+        modes = [('sequential', 1), ('dag', routes.PIPELINE_WORKERS)]
+        for name, workers in modes:
+            best = None
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for _ in range(args.runs):
+                    pipeline = routes.build_upload_pipeline(report, db, 'call.wav')
+                    started = time.perf_counter()
+                    _, timings = pipeline.run(
+                        executor,
+                        file_path=audio_path,
+                        mimetype='audio/wav',
+                        content_hash=None,
+                    )
+                    elapsed = time.perf_counter() - started
+                    if best is None or elapsed < best[0]:
+                        best = (elapsed, timings)
+            elapsed, timings = best
+            stages = ', '.join(
+                f"{stage} {t['start']:.2f}+{t['seconds']:.2f}"
+                for stage, t in timings.items()
+            )
+            print(f"{name:>10} {elapsed:>8.2f}  {stages}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Compare the pitch features against the legacy piptrack path.
+
+All paths start from the magnitude spectrogram that feature extraction
+shares, so its cost is excluded. The legacy path builds piptrack's pitch
+and magnitude matrices and then masks them. The spectral and yin paths are
+modules.pitch's two methods. Reports time, peak traced memory and the
+resulting pitch mean and standard deviation.
+
+Usage: python -m benchmarks.bench_pitch --durations 60 600
+"""
+import argparse
+import time
+import tracemalloc
+
+import librosa
+import numpy as np
+
+from benchmarks.synthetic import speech_like
+from modules.audio_features import HOP_LENGTH, N_FFT
+from modules.pitch import PitchTracker
+
+
+def legacy_pitch(_y, magnitude, sr):
+    pitches, _ = librosa.piptrack(S=magnitude, sr=sr)
+    voiced = pitches[pitches > 0]
+    return float(np.mean(voiced)), float(np.std(voiced))
+
+
+def tracked_pitch(method):
+    def run(y, magnitude, sr):
+        tracker = PitchTracker(sr, N_FFT, method=method)
+        tracker.push_spectrum(magnitude)
+        tracker.push_samples(y)
+        return tracker.finish()
+    return run
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak / 1e6, result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '--durations',
+        type=float,
+        nargs='+',
+        default=[60, 600],
+        help='Audio lengths in seconds',
+    )
+    parser.add_argument('--sr', type=int, default=22050)
+    args = parser.parse_args()
+
+    paths = [
+        ('legacy piptrack', legacy_pitch),
+        ('spectral', tracked_pitch('spectral')),
+        ('yin', tracked_pitch('yin')),
+    ]
+    warm_up = speech_like(2, sr=args.sr)
+    warm_up_magnitude = np.abs(
+        librosa.stft(warm_up, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    )
+    for _, fn in paths:
+        fn(warm_up, warm_up_magnitude, args.sr)
+
+    print(
+        f"{'duration_s':>10} {'path':>16} {'seconds':>8} {'peak MB':>8} {'mean Hz':>8} "
+        f"{'std Hz':>7}"
+    )
+    for duration in args.durations:
+        y = speech_like(duration, sr=args.sr)
+        magnitude = np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH))
+        for name, fn in paths:
+            seconds, peak, (mean, std) = measure(fn, y, magnitude, args.sr)
+            print(
+                f"{duration:>10.0f} {name:>16} {seconds:>8.2f} {peak:>8.1f} "
+                f"{mean:>8.1f} {std:>7.1f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Size of the LLM analysis prompt before and after compaction, for the feature
+set of a typical call and transcripts of increasing length.
+
+Token counts are prompt_builder estimates. The "full" prompt serializes every
+feature with indent=2, explains every feature and includes the whole
+transcript, which is what was sent before. "compact" is the system prompt
+plus the per-call message; "per call" is the message alone, which is what
+is billed at the full input price once the system prompt is cached.
+
+Usage: python -m benchmarks.bench_prompt
+"""
+import json
+import random
+
+from modules import prompt_builder
+from modules.llm_integration import INPUT_TOKEN_BUDGET
+
+SENTENCES = [
+    "Thank you for calling, how can I help you today?",
+    "I understand how frustrating it is when a delivery is late.",
+    "Let me check the status of your order right now.",
+    "I'm sorry, I can see the package was held at the depot.",
+    "I will make sure it goes out first thing tomorrow morning.",
+]
+
+
+def sample_features(rng):
+    return {
+        "audio_features": {
+            "tempo": rng.uniform(80, 160),
+            "spectral_centroid": rng.uniform(1000, 3000),
+            "spectral_rolloff": rng.uniform(3000, 6000),
+            "mfccs": [rng.gauss(0, 50) for _ in range(13)],
+            "pitch_mean": rng.uniform(100, 2000),
+            "pitch_variability": rng.uniform(100, 1000),
+            "energy_mean": rng.uniform(0.01, 0.1),
+            "energy_variability": rng.uniform(0.01, 0.05),
+            "speech_rate": rng.uniform(120, 240),
+            "articulation_rate": rng.uniform(200, 320),
+            "speaking_ratio": rng.uniform(0.4, 0.8),
+            "pause_count": rng.randint(0, 50),
+            "pause_duration_mean": rng.uniform(0.3, 1.5),
+            "pause_duration_median": rng.uniform(0.3, 1.0),
+            "pause_duration_p90": rng.uniform(1.0, 3.0),
+            "voice_quality_hnr": rng.uniform(0.5, 3),
+            "formants": [rng.gauss(0, 1) for _ in range(5)],
+            "chroma": [rng.random() for _ in range(12)],
+        },
+        "text_features": {
+            "sentiment": {
+                "neg": rng.random(),
+                "neu": rng.random(),
+                "pos": rng.random(),
+                "compound": rng.uniform(-1, 1),
+            },
+            "word_count": rng.randint(100, 10000),
+            "unique_words": rng.randint(50, 2000),
+        },
+        "top_words": {
+            w: rng.randint(1, 30)
+            for w in [
+                "help",
+                "order",
+                "sorry",
+                "check",
+                "today",
+                "delivery",
+                "thank",
+                "call",
+                "depot",
+                "morning",
+            ]
+        },
+    }
+
+
+def full_prompt(data, transcript):
+    notes = '\n'.join(
+        f'{i}. {note}' for i, (_, note) in enumerate(prompt_builder.FEATURE_NOTES, 1)
+    )
+    return (
+        prompt_builder.SYSTEM_PREAMBLE
+        + prompt_builder.PROMPT_HEADER.format(data_str=json.dumps(data, indent=2))
+        + '\n'
+        + notes
+        + '\n'
+        + prompt_builder.TRANSCRIPT_SECTION.format(note='', transcript=transcript)
+        + prompt_builder.INSTRUCTIONS
+    )
+
+
+def main():
+    rng = random.Random(0)
+    data = sample_features(rng)
+    system = prompt_builder.count_tokens(prompt_builder.system_prompt())
+    print(f"{'transcript words':>16} {'full':>7} {'compact':>8} {'per call':>9}")
+    for minutes in (0, 1, 10, 60):
+        # Roughly 150 spoken words a minute
+        words = 150 * minutes
+        sentences = [rng.choice(SENTENCES) for _ in range(words // 10)]
+        transcript = ' '.join(sentences)
+        full = prompt_builder.count_tokens(full_prompt(data, transcript))
+        per_call = prompt_builder.count_tokens(
+            prompt_builder.build_prompt(
+                data, transcript, token_budget=INPUT_TOKEN_BUDGET
+            )
+        )
+        print(f"{words:>16} {full:>7} {system + per_call:>8} {per_call:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Size and listing speed of the results table.
+
+Fills a fresh SQLite database with ``--rows`` results, each with a
+synthetic transcript of ``--words`` words and a full feedback analysis, once
+per compression codec, and reports the file size. It then walks the whole
+history page by page, first by keyset (list_results) and then by OFFSET for
+comparison, reporting the time for the first and last pages, the total, and
+how much the process RSS grew while listing.
+
+Usage: python -m benchmarks.bench_results --rows 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import transcript_like
+from modules import database
+
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        return next(
+            int(line.split()[1]) / 1024 for line in f if line.startswith('VmRSS:')
+        )
+
+
+def fill(db, rows, words):
+    transcripts = [transcript_like(words, seed=seed) for seed in range(20)]
+    analysis = {
+        'empathy_score': 72.5,
+        'clarity_score': 64.0,
+        'feedback': ['Acknowledge the customer before moving on to a solution.'] * 6,
+        'text_features': {
+            'sentiment': {'compound': 0.42, 'pos': 0.2, 'neg': 0.05, 'neu': 0.75},
+            'top_words': [[f'word{i}', 40 - i] for i in range(20)],
+        },
+    }
+    for start in range(0, rows, 1000):
+        database.save_results(
+            db,
+            [
+                {
+                    'filename': f'call_{i}.wav',
+                    'transcript': transcripts[i % 20],
+                    'analysis': {**analysis, 'call': i},
+                }
+                for i in range(start, min(rows, start + 1000))
+            ],
+        )
+
+
+def walk_keyset(db, limit):
+    times, cursor = [], None
+    while True:
+        start = time.perf_counter()
+        _, cursor = database.list_results(db, after=cursor, limit=limit)
+        times.append(time.perf_counter() - start)
+        if cursor is None:
+            return times
+
+
+def walk_offset(db, limit):
+    times, offset = [], 0
+    Result = database.Result
+    while True:
+        start = time.perf_counter()
+        rows = (
+            db.query(Result.id, Result.filename, Result.created_at)
+            .order_by(Result.created_at.desc(), Result.id.desc())
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+        times.append(time.perf_counter() - start)
+        if len(rows) < limit:
+            return times
+        offset += limit
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--words', type=int, default=1500)
+    parser.add_argument('--page', type=int, default=100)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='bench_results_')
+    codecs = ['none', 'zlib'] + (['zstd'] if database.zstandard else [])
+    for codec in codecs:
+        database.RESULT_COMPRESSION = codec
+        path = os.path.join(directory, f'{codec}.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+        db = database.get_db()
+        start = time.perf_counter()
+        fill(db, args.rows, args.words)
+        seconds = time.perf_counter() - start
+        db.get_bind().dispose()
+        print(
+            f'{codec:>5}: {os.path.getsize(path) / 1e6:8.1f} MB, inserted in '
+            f'{seconds:.1f}s'
+        )
+
+    print(
+        f'\nlisting {args.rows} results, {args.page} per page ({codecs[-1]} database)'
+    )
+    for name, walk in (('keyset', walk_keyset), ('offset', walk_offset)):
+        before = rss_mb()
+        times = walk(db, args.page)
+        print(
+            f'{name:>6}: first page {times[0] * 1000:6.2f} ms, last page '
+            f'{times[-1] * 1000:6.2f} ms, '
+            f'total {sum(times):6.2f}s, RSS +{rss_mb() - before:.0f} MB'
+        )
+    db.remove()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Sentence sentiment scoring: NLTK's analyzer against modules.sentiment.
+
+Splits ``--transcripts`` synthetic support-call transcripts of each
+``--words`` size into sentences and scores them all three ways:
+SentimentIntensityAnalyzer.polarity_scores one sentence at a time, the
+vectorized engine with its sentence cache disabled, and the engine again
+with the cache warmed by the previous transcripts (scripted calls repeat
+many sentences). Reports seconds per transcript and checks the scores match.
+
+Usage: python -m benchmarks.bench_sentiment --words 150 1500 9000
+"""
+import argparse
+import time
+
+from nltk.sentiment import SentimentIntensityAnalyzer
+
+from benchmarks.synthetic import transcript_like
+from modules.live_analysis import SENTENCE_PATTERN
+from modules.sentiment import SentimentEngine
+
+
+def per_transcript(fn, batches):
+    start = time.perf_counter()
+    results = [fn(sentences) for sentences in batches]
+    return (time.perf_counter() - start) / len(batches), results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--words', type=int, nargs='+', default=[150, 1500, 9000])
+    parser.add_argument('--transcripts', type=int, default=20)
+    args = parser.parse_args()
+
+    analyzer = SentimentIntensityAnalyzer()
+    print(
+        f"{'words':>6} {'sentences':>9} {'nltk':>9} {'engine':>9} {'cached':>9} "
+        f"{'speedup':>8}"
+    )
+    for words in args.words:
+        batches = [
+            [
+                s
+                for s in SENTENCE_PATTERN.findall(transcript_like(words, seed=seed))
+                if s.strip()
+            ]
+            for seed in range(args.transcripts)
+        ]
+        nltk_seconds, expected = per_transcript(
+            lambda sentences: [
+                analyzer.polarity_scores(s)['compound'] for s in sentences
+            ],
+            batches,
+        )
+
+        uncached = SentimentEngine(analyzer.lexicon, cache_size=0)
+        engine_seconds, actual = per_transcript(
+            lambda sentences, engine=uncached: (
+                engine.score(sentences).compound.tolist()
+            ),
+            batches,
+        )
+
+        cached = SentimentEngine(analyzer.lexicon)
+        for sentences in batches:
+            cached.score(sentences)
+        cached_seconds, _ = per_transcript(cached.score, batches)
+
+        assert actual == expected, 'engine scores differ from NLTK'
+        print(
+            f"{words:>6} {sum(map(len, batches)) / len(batches):>9.0f} "
+            f"{nltk_seconds * 1000:>7.2f}ms "
+            f"{engine_seconds * 1000:>7.2f}ms {cached_seconds * 1000:>7.2f}ms "
+            f"{nltk_seconds / engine_seconds:>7.1f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
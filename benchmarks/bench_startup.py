@@ -0,0 +1,146 @@
+"""
+Cold-start cost of a worker process.
+
+Each measurement runs in a fresh interpreter and reports wall time and the
+RSS afterwards for: importing a module, booting the app (``import main``),
+and the first analyze_text and analyze_audio calls after boot, which pay for
+whatever loading was deferred. Median of ``--runs``.
+
+It then forks ``--workers`` workers from a booted app, with and without
+PRELOAD_MODELS, and reports the memory private to each worker after its
+first analyze_text and analyze_audio calls. With models preloaded in the
+parent this is only what the worker itself allocates.
+
+Usage: python -m benchmarks.bench_startup --runs 5 --workers 4
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+exec(sys.argv[1])
+seconds = time.perf_counter() - start
+with open('/proc/self/status') as f:
+    rss = next(int(line.split()[1]) / 1024 for line in f if line.startswith('VmRSS:'))
+print(json.dumps({'seconds': seconds, 'rss_mb': rss}))
+'''
+
+STEPS = [
+    ('import modules.text_analysis', 'import modules.text_analysis'),
+    ('import modules.file_transcription', 'import modules.file_transcription'),
+    ('import main', 'import main'),
+    (
+        'import main + first analyze_text',
+        'import main\nfrom modules.text_analysis import analyze_text\n'
+        'analyze_text("Thank you for calling. I understand.")',
+    ),
+    (
+        'import main + first analyze_audio',
+        'import main, numpy as np, soundfile as sf, tempfile, os\n'
+        'from modules.audio_analysis import analyze_audio\n'
+        'path = os.path.join(tempfile.mkdtemp(), "a.wav")\n'
+        'y = (0.1 * np.sin(np.arange(22050 * 2) / 10)).astype(np.float32)\n'
+        'sf.write(path, y, 22050)\n'
+        'analyze_audio(path)',
+    ),
+]
+
+
+FORK_PROBE = r'''
+import json, os, sys
+import main
+from modules.text_analysis import analyze_text
+from modules.audio_analysis import analyze_audio
+import numpy as np, soundfile as sf, tempfile
+path = os.path.join(tempfile.mkdtemp(), "a.wav")
+sf.write(path, (0.1 * np.sin(np.arange(22050 * 2) / 10)).astype(np.float32), 22050)
+text = "Thank you for calling. I understand how frustrating this has been."
+
+def private_mb():
+    with open('/proc/self/smaps_rollup') as f:
+        private = [int(line.split()[1]) for line in f if line.startswith('Private_')]
+    return sum(private) / 1024
+
+pipes = []
+for _ in range(int(sys.argv[1])):
+    read, write = os.pipe()
+    if os.fork() == 0:
+        analyze_text(text)
+        analyze_audio(path)
+        os.write(write, json.dumps(private_mb()).encode())
+        os._exit(0)
+    os.close(write)
+    pipes.append(read)
+sizes = [json.loads(os.read(read, 100)) for read in pipes]
+for _ in pipes:
+    os.wait()
+print(json.dumps(sum(sizes) / len(sizes)))
+'''
+
+
+def measure(code, env, cwd):
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE, code],
+        env=env,
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+    )
+    if output.returncode != 0:
+        raise RuntimeError(output.stderr[-2000:])
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    # The probes run in a scratch directory so the logs, stored audio and PCM
+    # cache they write stay out of the working tree
+    cwd = tempfile.mkdtemp(prefix='bench_startup_')
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(
+            filter(None, [os.getcwd(), os.environ.get('PYTHONPATH')])
+        ),
+        DATABASE_URL='sqlite://',
+    )
+    try:
+        print(f"{'step':>36} {'seconds':>8} {'rss MB':>7}")
+        for name, code in STEPS:
+            runs = [measure(code, env, cwd) for _ in range(args.runs)]
+            seconds = statistics.median(r['seconds'] for r in runs)
+            rss = statistics.median(r['rss_mb'] for r in runs)
+            print(f"{name:>36} {seconds:>8.2f} {rss:>7.0f}")
+
+        for preload in ('0', '1'):
+            output = subprocess.run(
+                [sys.executable, '-c', FORK_PROBE, str(args.workers)],
+                cwd=cwd,
+                capture_output=True,
+                text=True,
+                env=dict(env, PRELOAD_MODELS=preload),
+            )
+            if output.returncode != 0:
+                raise RuntimeError(output.stderr[-2000:])
+            private = json.loads(output.stdout.strip().splitlines()[-1])
+            print(
+                f"PRELOAD_MODELS={preload}: {private:.0f} MB private per forked worker"
+            )
+    finally:
+        shutil.rmtree(cwd, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,415 @@
+"""
+Reproducible benchmark suite for the analysis pipeline.
+
+Measures wall time, CPU time and peak RSS of analyze_audio, analyze_text,
+integrate_data, generate_feedback and the full /upload path on synthetic
+inputs of several sizes: speech-like recordings of ``--audio-minutes``
+and support-call transcripts of ``--text-words`` words. Uploads run through
+the Flask app with LLM analysis enabled, with Deepgram and Anthropic
+answered by the local stub API; the stub returns a transcript of about
+WORDS_PER_MINUTE words per minute of audio.
+
+Every case runs in a fresh subprocess, after a warm-up call on a small
+input, so one case's caches, JIT compilation and memory do not leak into
+the next. Fast functions are repeated for at least MIN_CASE_SECONDS and
+reported per call; uploads run once. Each case gets an empty PCM cache, so
+analyze_audio decodes on its first call and repeats read the decoded
+samples back. Synthetic inputs are deterministic and kept in ``--workdir``
+between runs. Each result also lists the seconds spent in each metrics
+stage (transcription, audio.tempo, text.parse, ...).
+
+Results are written as JSON, by default to benchmarks/results/<commit>.json.
+Pass ``--compare`` with an earlier results file to print the change per case;
+the exit status is 1 if any case got slower by more than ``--threshold``.
+
+Usage: python -m benchmarks.bench_suite --audio-minutes 1 10 60 \\
+           --text-words 150 1500 9000
+       python -m benchmarks.bench_suite --cases analyze_text \\
+           --compare benchmarks/results/abc1234.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+CASES = [
+    'analyze_audio',
+    'analyze_text',
+    'integrate_data',
+    'generate_feedback',
+    'upload',
+]
+# Which size argument each case takes
+AUDIO_CASES = {'analyze_audio', 'upload'}
+# Uploading the same file again would be answered from the result cache
+SINGLE_CALL_CASES = {'upload'}
+
+# Speaking rate used to size the stub transcript of an uploaded recording
+WORDS_PER_MINUTE = 150
+
+MIN_CASE_SECONDS = 0.5
+SAMPLE_RATE = 22050
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def audio_file(workdir, minutes):
+    """
+    Path of a deterministic speech-like recording of ``minutes``, written on
+    first use a minute at a time so that long recordings never sit in memory.
+    """
+    import soundfile as sf
+
+    from benchmarks.synthetic import speech_like
+
+    path = os.path.join(workdir, f'speech_{minutes:g}min.wav')
+    if not os.path.exists(path):
+        partial = path + '.partial'
+        with sf.SoundFile(
+            partial,
+            'w',
+            samplerate=SAMPLE_RATE,
+            channels=1,
+            format='WAV',
+            subtype='PCM_16',
+        ) as f:
+            remaining = minutes * 60
+            seed = 0
+            while remaining > 0:
+                f.write(speech_like(min(60, remaining), sr=SAMPLE_RATE, seed=seed))
+                remaining -= 60
+                seed += 1
+        os.replace(partial, path)
+    return path
+
+
+def _status_mb(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in KiB on Linux and bytes on macOS; only the peak is known
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _reset_peak_rss():
+    # Linux resets VmHWM to the current RSS; elsewhere the peak includes setup
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _prepare(case, size, workdir):
+    """
+    Build the inputs of a case outside the measurement.
+
+    :return: Tuple of (call, warm-up call), each taking no arguments
+    """
+    from benchmarks.synthetic import speech_like, transcript_like
+
+    if case == 'analyze_audio':
+        from modules.audio_analysis import analyze_audio
+        path, small = audio_file(workdir, size), audio_file(workdir, 0.1)
+        return (lambda: analyze_audio(path)), (lambda: analyze_audio(small))
+
+    if case == 'upload':
+        return _prepare_upload(
+            audio_file(workdir, size), audio_file(workdir, 0.1), workdir
+        )
+
+    from modules.text_analysis import analyze_text
+    transcript, small = transcript_like(size), transcript_like(50, seed=1)
+    if case == 'analyze_text':
+        return (lambda: analyze_text(transcript)), (lambda: analyze_text(small))
+
+    text_features = analyze_text(transcript)
+    if case == 'integrate_data':
+        from modules.audio_features import extract_features
+        from modules.data_integration import integrate_data
+        audio_features = extract_features(speech_like(10, sr=SAMPLE_RATE), SAMPLE_RATE)
+        return (lambda: integrate_data(audio_features, text_features)), None
+
+    if case == 'generate_feedback':
+        from modules.feedback_generation import generate_feedback
+        return (lambda: generate_feedback(text_features)), None
+
+    raise ValueError(f'Unknown case: {case}')
+
+
+def _prepare_upload(path, small, workdir):
+    os.environ.update({
+        'DATABASE_URL': f'sqlite:///{workdir}/upload_{os.getpid()}.db',
+        'LLM_ANALYSIS_ENABLED': '1',
+        # Every call runs the whole pipeline instead of hitting the result cache
+        'RESULT_CACHE_MAX_BYTES': '0',
+    })
+    from flask import Flask
+    from flask_socketio import SocketIO
+
+    import routes
+    from modules import audio_storage, database
+
+    # Keep stored uploads, and the PCM cache unless the caller placed it, out
+    # of the working tree
+    audio_storage.AUDIO_STORAGE_DIR = os.path.join(workdir, 'uploads')
+    audio_storage.PCM_CACHE_DIR = audio_storage.PCM_CACHE_DIR or os.path.join(
+        workdir, 'pcm'
+    )
+    app = Flask(__name__)
+    routes.init_routes(app, SocketIO(app), database.get_db())
+    client = app.test_client()
+
+    def upload(file_path):
+        with open(file_path, 'rb') as f:
+            response = client.post(
+                '/upload',
+                data={'file': (f, os.path.basename(file_path)), 'timings': '1'},
+                content_type='multipart/form-data',
+            )
+        status_url = response.get_json()['status_url']
+        while True:
+            job = client.get(status_url).get_json()
+            if job['status'] == 'failed':
+                raise RuntimeError(f"Upload failed: {job['error']}")
+            if job['status'] == 'completed':
+                return job['result']
+            time.sleep(0.02)
+
+    return (lambda: upload(path)), (lambda: upload(small))
+
+
+def run_case(case, size, workdir):
+    """
+    Measure one case in this process.
+
+    :return: Dict of measurements, times per call
+    """
+    from modules import metrics
+
+    call, warm_up = _prepare(case, size, workdir)
+    if warm_up is not None:
+        warm_up()
+    else:
+        call()
+
+    baseline_mb = _status_mb('VmRSS')
+    peak_reset = _reset_peak_rss()
+    iterations = 0
+    with metrics.collect() as stages:
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        while True:
+            result = call()
+            iterations += 1
+            if (
+                case in SINGLE_CALL_CASES
+                or time.perf_counter() - wall_start >= MIN_CASE_SECONDS
+            ):
+                break
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    if case == 'upload':
+        # The job ran on a worker thread, outside this context
+        stages = result['timing_breakdown']
+
+    return {
+        'case': case,
+        'size': size,
+        'unit': 'minutes' if case in AUDIO_CASES else 'words',
+        'iterations': iterations,
+        'wall_seconds': wall / iterations,
+        'cpu_seconds': cpu / iterations,
+        'baseline_rss_mb': baseline_mb,
+        'peak_rss_mb': _status_mb('VmHWM'),
+        'peak_rss_includes_setup': not peak_reset,
+        'stages': {
+            stage: seconds / iterations for stage, seconds in sorted(stages.items())
+        },
+    }
+
+
+def _git_commit():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """
+    Print each case's change against ``baseline``.
+
+    :return: List of (case, size) that got slower by more than ``threshold``
+    """
+    previous = {(r['case'], r['size']): r for r in baseline['results']}
+    regressions = []
+    print(f"\nagainst {baseline.get('commit')} ({baseline.get('created_at')}):")
+    print(f"{'case':>18} {'size':>6} {'wall':>8} {'cpu':>8} {'peak rss':>9}")
+    for result in results:
+        old = previous.get((result['case'], result['size']))
+        if old is None:
+            continue
+        wall = result['wall_seconds'] / old['wall_seconds'] - 1
+        cpu = (
+            result['cpu_seconds'] / old['cpu_seconds'] - 1
+            if old['cpu_seconds']
+            else 0.0
+        )
+        rss = result['peak_rss_mb'] / old['peak_rss_mb'] - 1
+        flag = '  REGRESSION' if wall > threshold else ''
+        print(
+            f"{result['case']:>18} {result['size']:>6g} {wall:>+8.1%} {cpu:>+8.1%} "
+            f"{rss:>+9.1%}{flag}"
+        )
+        if flag:
+            regressions.append((result['case'], result['size']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--cases', nargs='+', choices=CASES, default=CASES)
+    parser.add_argument('--audio-minutes', nargs='+', type=float, default=[1, 10, 60])
+    parser.add_argument('--text-words', nargs='+', type=int, default=[150, 1500, 9000])
+    parser.add_argument(
+        '--workdir',
+        default=os.path.join(tempfile.gettempdir(), 'bench_suite'),
+        help='Where synthetic inputs are cached',
+    )
+    parser.add_argument(
+        '--output', help='Results file, benchmarks/results/<commit>.json by default'
+    )
+    parser.add_argument('--compare', help='Earlier results file to compare against')
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.1,
+        help='Wall time increase reported as a regression',
+    )
+    parser.add_argument(
+        '--run-case', nargs=2, metavar=('CASE', 'SIZE'), help=argparse.SUPPRESS
+    )
+    args = parser.parse_args()
+    # Cases run with the workdir as their current directory
+    args.workdir = os.path.abspath(args.workdir)
+    os.makedirs(args.workdir, exist_ok=True)
+
+    if args.run_case:
+        case, size = args.run_case
+        print(
+            json.dumps(
+                run_case(
+                    case,
+                    float(size) if case in AUDIO_CASES else int(size),
+                    args.workdir,
+                )
+            )
+        )
+        return
+
+    from benchmarks.stub_api import StubAPIServer
+    from benchmarks.synthetic import transcript_like
+
+    commit = _git_commit()
+    results = []
+    with StubAPIServer() as stub:
+        env = dict(
+            os.environ,
+            DEEPGRAM_API_KEY='stub',
+            DEEPGRAM_URL=stub.url,
+            ANTHROPIC_API_KEY='stub',
+            ANTHROPIC_BASE_URL=stub.url,
+            PYTHONPATH=os.pathsep.join(
+                filter(None, [os.getcwd(), os.environ.get('PYTHONPATH')])
+            ),
+        )
+        print(
+            f"{'case':>18} {'size':>6} {'calls':>6} {'wall s':>9} {'cpu s':>9} "
+            f"{'peak rss MB':>12}"
+        )
+        for case in args.cases:
+            for size in args.audio_minutes if case in AUDIO_CASES else args.text_words:
+                if case == 'upload':
+                    stub.deepgram_transcript = transcript_like(
+                        max(1, int(size * WORDS_PER_MINUTE))
+                    )
+                # Each case starts with an empty PCM cache, so the first call
+                # decodes as it would for a new upload
+                with tempfile.TemporaryDirectory() as pcm_dir:
+                    process = subprocess.run(
+                        [
+                            sys.executable,
+                            '-m',
+                            'benchmarks.bench_suite',
+                            '--workdir',
+                            args.workdir,
+                            '--run-case',
+                            case,
+                            f'{size:g}',
+                        ],
+                        env=dict(env, PCM_CACHE_DIR=pcm_dir),
+                        cwd=args.workdir,
+                        capture_output=True,
+                        text=True,
+                    )
+                if process.returncode != 0:
+                    print(f"{case:>18} {size:>6g} failed:\n{process.stderr[-2000:]}")
+                    continue
+                result = json.loads(process.stdout.strip().splitlines()[-1])
+                results.append(result)
+                print(
+                    f"{case:>18} {size:>6g} {result['iterations']:>6} "
+                    f"{result['wall_seconds']:>9.4f} "
+                    f"{result['cpu_seconds']:>9.4f} {result['peak_rss_mb']:>12.0f}"
+                )
+
+    report = {
+        'commit': commit,
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(
+            timespec='seconds'
+        ),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Per-transcript latency of analyze_text against the previous implementation,
+which tokenized the transcript several times and rebuilt the stopword set and
+VADER analyzer on every call.
+
+Usage: python -m benchmarks.bench_text_analysis --words 500 5000 20000
+"""
+import argparse
+import time
+
+import spacy
+from nltk.corpus import stopwords
+from nltk.probability import FreqDist
+from nltk.sentiment import SentimentIntensityAnalyzer
+from nltk.tokenize import sent_tokenize, word_tokenize
+from textstat import textstat
+
+from benchmarks.synthetic import transcript_like
+from modules import text_analysis
+
+# The full pipeline, as the old module loaded it; set in main()
+_legacy_nlp = None
+
+
+def legacy_analyze_text(transcript):
+    # The pre-engine implementation, kept as the reference
+    stop_words = set(stopwords.words('english'))
+    words = [w.lower() for w in word_tokenize(transcript) if w.isalnum()]
+    filtered_words = [w for w in words if w not in stop_words]
+    sentiment_scores = SentimentIntensityAnalyzer().polarity_scores(transcript)
+    word_freq = FreqDist(filtered_words)
+    readability_scores = {
+        "flesch_reading_ease": textstat.flesch_reading_ease(transcript),
+        "flesch_kincaid_grade": textstat.flesch_kincaid_grade(transcript),
+        "gunning_fog": textstat.gunning_fog(transcript)
+    }
+    sentences = sent_tokenize(transcript)
+    sentence_analysis = {
+        "sentence_count": len(sentences),
+        "avg_sentence_length": sum(len(word_tokenize(s)) for s in sentences)
+        / len(sentences)
+        if sentences
+        else 0,
+        "complex_sentence_ratio": sum(
+            1 for s in sentences if len(word_tokenize(s)) > 20
+        )
+        / len(sentences)
+        if sentences
+        else 0,
+    }
+    doc = _legacy_nlp(transcript)
+    entities = [(ent.text, ent.label_) for ent in doc.ents]
+    sia = SentimentIntensityAnalyzer()
+    emotions = [sia.polarity_scores(s)['compound'] for s in sent_tokenize(transcript)]
+    return {
+        "sentiment": sentiment_scores,
+        "word_count": len(words),
+        "top_words": dict(word_freq.most_common(10)),
+        "readability_scores": readability_scores,
+        "sentence_analysis": sentence_analysis,
+        "named_entity_count": len(entities),
+        "emotions": emotions,
+    }
+
+
+def timed(fn, arg, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    global _legacy_nlp
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '--words',
+        type=int,
+        nargs='+',
+        default=[500, 5000, 20000],
+        help='Transcript sizes in words',
+    )
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    _legacy_nlp = spacy.load('en_core_web_sm')
+
+    print(f"{'words':>7} {'legacy_ms':>10} {'engine_ms':>10} {'speedup':>8}")
+    for n_words in args.words:
+        transcript = transcript_like(n_words)
+        legacy = timed(legacy_analyze_text, transcript, args.repeat)
+        engine = timed(text_analysis.analyze_text, transcript, args.repeat)
+        print(
+            f"{n_words:>7} {legacy * 1000:>10.1f} {engine * 1000:>10.1f} "
+            f"{legacy / engine:>7.2f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
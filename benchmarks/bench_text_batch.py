@@ -0,0 +1,50 @@
+"""
+Throughput of analyze_texts over a corpus of transcripts, against calling
+analyze_text once per transcript, for a range of process counts.
+
+Usage: python -m benchmarks.bench_text_batch --transcripts 2000 --words 300 \\
+           --processes 1 2 4 8
+"""
+import argparse
+import time
+
+from benchmarks.synthetic import transcript_like
+from modules import text_analysis
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--transcripts', type=int, default=2000)
+    parser.add_argument('--words', type=int, default=300, help='Words per transcript')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    corpus = [transcript_like(args.words, seed=i) for i in range(args.transcripts)]
+
+    start = time.perf_counter()
+    for transcript in corpus:
+        text_analysis.analyze_text(transcript)
+    baseline = time.perf_counter() - start
+    print(f"{'mode':>12} {'seconds':>9} {'docs/s':>9} {'speedup':>8}")
+    print(
+        f"{'per-call':>12} {baseline:>9.2f} {len(corpus) / baseline:>9.1f} {1.0:>7.2f}x"
+    )
+
+    for n_process in args.processes:
+        start = time.perf_counter()
+        for _ in text_analysis.analyze_texts(
+            iter(corpus), batch_size=args.batch_size, n_process=n_process
+        ):
+            pass
+        elapsed = time.perf_counter() - start
+        print(
+            f"{f'batch x{n_process}':>12} {elapsed:>9.2f} "
+            f"{len(corpus) / elapsed:>9.1f} {baseline / elapsed:>7.2f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""
+Peak server memory while many large files are uploaded at once.
+
+Starts the app in a subprocess, with Deepgram and Anthropic pointed at the
+local stub API, then uploads ``--uploads`` distinct files of ``--size-mb`` MB
+concurrently through /upload. It waits for every job to finish and reports
+the server's peak RSS. Uploads are generated on the fly, so the client holds
+none of them in memory either.
+
+Usage: python -m benchmarks.bench_uploads --uploads 20 --size-mb 500
+"""
+import argparse
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+from benchmarks.stub_api import StubAPIServer
+
+
+class SyntheticFile(io.RawIOBase):
+    """Seekable read-only file of ``size`` pseudo-random bytes, unique per ``seed``."""
+
+    def __init__(self, size, seed):
+        self.size = size
+        self.position = 0
+        self.block = os.urandom(1024 * 1024)
+        self.seed = seed.to_bytes(8, 'little')
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}[
+            whence
+        ]
+        self.position = max(0, min(self.size, base + offset))
+        return self.position
+
+    def read(self, n=-1):
+        n = (
+            self.size - self.position
+            if n is None or n < 0
+            else min(n, self.size - self.position)
+        )
+        start = self.position % len(self.block)
+        data = (self.block[start:] + self.block)[:n] if n else b''
+        if self.position == 0 and data:
+            data = self.seed + data[len(self.seed):]
+        self.position += len(data)
+        return data
+
+
+def serve(port):
+    from flask import Flask
+    from flask_socketio import SocketIO
+
+    import routes
+    from modules import database
+
+    app = Flask(__name__)
+    socketio = SocketIO(app)
+    routes.init_routes(app, socketio, database.get_db())
+    app.run(port=port, threaded=True)
+
+
+def peak_rss_mb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--uploads', type=int, default=20)
+    parser.add_argument('--size-mb', type=int, default=500)
+    parser.add_argument('--port', type=int, default=5077)
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port)
+        return
+
+    workdir = tempfile.mkdtemp(prefix='bench_uploads_')
+    with StubAPIServer() as stub:
+        env = dict(
+            os.environ,
+            DATABASE_URL=f'sqlite:///{workdir}/bench.db',
+            DEEPGRAM_API_KEY='stub',
+            DEEPGRAM_URL=stub.url,
+            ANTHROPIC_API_KEY='stub',
+            ANTHROPIC_BASE_URL=stub.url,
+            UPLOAD_QUEUE_LIMIT=str(args.uploads),
+            MAX_UPLOAD_BYTES=str((args.size_mb + 1) * 1024 * 1024),
+            TMPDIR=workdir,
+            PYTHONPATH=os.pathsep.join(
+                filter(None, [os.getcwd(), os.environ.get('PYTHONPATH')])
+            ),
+        )
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                '-m',
+                'benchmarks.bench_uploads',
+                '--serve',
+                '--port',
+                str(args.port),
+            ],
+            cwd=workdir,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        base_url = f'http://127.0.0.1:{args.port}'
+        try:
+            for _ in range(300):
+                try:
+                    httpx.get(base_url + '/jobs/metrics')
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.2)
+            idle_mb = peak_rss_mb(server.pid)
+
+            statuses = []
+            started = time.perf_counter()
+
+            def upload(i):
+                with httpx.Client(base_url=base_url, timeout=None) as client:
+                    f = SyntheticFile(args.size_mb * 1024 * 1024, i)
+                    response = client.post(
+                        '/upload', files={'file': (f'call{i}.wav', f, 'audio/wav')}
+                    )
+                    status_url = response.json()['status_url']
+                    while True:
+                        job = client.get(status_url).json()
+                        if job['status'] in ('completed', 'failed'):
+                            statuses.append(job['status'])
+                            if job['error']:
+                                print(f"job failed: {job['error']}")
+                            return
+                        time.sleep(0.5)
+
+            threads = [
+                threading.Thread(target=upload, args=(i,)) for i in range(args.uploads)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            peak_mb = peak_rss_mb(server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+
+    total_mb = args.uploads * args.size_mb
+    print(
+        f"uploads={args.uploads} x {args.size_mb} MB ({total_mb} MB total) in "
+        f"{elapsed:.1f}s"
+    )
+    print(
+        f"jobs: {statuses.count('completed')} completed, {statuses.count('failed')} "
+        "failed"
+    )
+    print(
+        "bytes received by stub Deepgram: "
+        f"{sum(stub.body_sizes['/v1/listen']) // (1024 * 1024)} MB"
+    )
+    print(f"server RSS: idle {idle_mb:.0f} MB, peak {peak_mb:.0f} MB")
+    print(f"scratch files left in {workdir}")
+
+
+if __name__ == '__main__':
+    main()
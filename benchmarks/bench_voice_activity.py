@@ -0,0 +1,103 @@
+"""
+Compare voice activity segmentation against the legacy pause and speech-rate
+heuristics (librosa.effects.split over the samples plus onset detection).
+
+Both start from decoded audio. The legacy path needs the onset envelope,
+which only speech rate used; the new path needs the rms envelope, which
+energy features compute anyway, so it is timed both with and without it.
+
+Usage: python -m benchmarks.bench_voice_activity --durations 60 600 3600
+"""
+import argparse
+import time
+import tracemalloc
+
+import librosa
+import numpy as np
+
+from benchmarks.synthetic import speech_like
+from modules.audio_features import HOP_LENGTH, N_FFT
+from modules.voice_activity import analyze_activity
+
+
+def legacy_rhythm(y, sr):
+    # The pre-VAD speech rate and pause features of analyze_audio
+    onset_env = librosa.onset.onset_strength(y=y, sr=sr)
+    speech_rate = len(librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr)) / (
+        len(y) / sr
+    )
+    pauses = librosa.effects.split(y, top_db=0.1 * np.max(y))
+    pause_count = len(pauses) - 1
+    pause_duration_mean = (
+        np.mean([pause[0] - pauses[i - 1][1] for i, pause in enumerate(pauses[1:], 1)])
+        / sr
+        if pause_count > 0
+        else 0
+    )
+    return {
+        'speech_rate': speech_rate,
+        'pause_count': pause_count,
+        'pause_duration_mean': pause_duration_mean,
+    }
+
+
+def vad_rhythm(y, sr, rms=None):
+    if rms is None:
+        rms = librosa.feature.rms(y=y, frame_length=N_FFT, hop_length=HOP_LENGTH)[0]
+    return analyze_activity(rms, sr, HOP_LENGTH, n_samples=len(y))
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak / 1e6, result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '--durations',
+        type=float,
+        nargs='+',
+        default=[60, 600, 3600],
+        help='Audio lengths in seconds',
+    )
+    parser.add_argument('--sr', type=int, default=22050)
+    args = parser.parse_args()
+
+    warm_up = speech_like(2, sr=args.sr)
+    legacy_rhythm(warm_up, args.sr)
+    vad_rhythm(warm_up, args.sr)
+
+    print(f"{'duration_s':>10} {'path':>14} {'seconds':>8} {'peak MB':>8}  result")
+    for duration in args.durations:
+        y = speech_like(duration, sr=args.sr)
+        rms = librosa.feature.rms(y=y, frame_length=N_FFT, hop_length=HOP_LENGTH)[0]
+        for name, fn, fn_args in (('legacy', legacy_rhythm, (y, args.sr)),
+                                  ('vad', vad_rhythm, (y, args.sr)),
+                                  ('vad, rms given', vad_rhythm, (y, args.sr, rms))):
+            seconds, peak, result = measure(fn, *fn_args)
+            summary = ', '.join(
+                f'{key}={value:.3g}'
+                for key, value in result.items()
+                if key
+                in (
+                    'speech_rate',
+                    'pause_count',
+                    'pause_duration_mean',
+                    'speaking_ratio',
+                )
+            )
+            print(
+                f"{duration:>10.0f} {name:>14} {seconds:>8.3f} {peak:>8.1f}  {summary}"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+A local stand-in for Deepgram's live transcription websocket.
+
+It accepts any number of connections and answers every ``bytes_per_result``
+bytes of audio with a finalized ``Results`` message, so the live pipeline can
+be exercised without network access or an API key.
+"""
+import itertools
+import json
+import threading
+
+from websockets.exceptions import ConnectionClosed
+from websockets.sync.server import serve
+
+from benchmarks.synthetic import SENTENCES
+
+# One second of 16 kHz, 16-bit mono audio
+BYTES_PER_SECOND = 32000
+
+
+def _result(transcript, start, duration):
+    return json.dumps(
+        {
+            'type': 'Results',
+            'channel_index': [0, 1],
+            'duration': duration,
+            'start': start,
+            'is_final': True,
+            'speech_final': True,
+            'channel': {
+                'alternatives': [
+                    {'transcript': transcript, 'confidence': 0.99, 'words': []}
+                ]
+            },
+            'metadata': {
+                'request_id': 'fake',
+                'model_uuid': 'fake',
+                'model_info': {'name': 'fake', 'version': '0', 'arch': 'fake'},
+            },
+        }
+    )
+
+
+class FakeDeepgramServer:
+    """
+    :param bytes_per_result: Audio bytes answered by each Results message
+    """
+
+    def __init__(self, bytes_per_result=BYTES_PER_SECOND):
+        self.bytes_per_result = bytes_per_result
+        self.connections = 0
+        self.bytes_received = 0
+        self.results_sent = 0
+        self._lock = threading.Lock()
+        self._server = serve(self._handle, '127.0.0.1', 0)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.socket.getsockname()[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._thread.join()
+
+    def _handle(self, websocket):
+        with self._lock:
+            self.connections += 1
+        sentences = itertools.cycle(SENTENCES)
+        pending = 0
+        position = 0.0
+        try:
+            for message in websocket:
+                if isinstance(message, str):
+                    if 'CloseStream' in message:
+                        break
+                    continue
+                pending += len(message)
+                with self._lock:
+                    self.bytes_received += len(message)
+                while pending >= self.bytes_per_result:
+                    pending -= self.bytes_per_result
+                    duration = self.bytes_per_result / BYTES_PER_SECOND
+                    text = next(sentences).format(
+                        name='Sarah', place='Boston', org='Acme'
+                    )
+                    websocket.send(_result(text, position, duration))
+                    position += duration
+                    with self._lock:
+                        self.results_sent += 1
+        except ConnectionClosed:
+            pass
@@ -0,0 +1,424 @@
+"""
+A local stub of the Deepgram prerecorded and Anthropic Messages HTTP APIs.
+
+It records how many TCP connections and concurrent requests it sees and can
+be told to answer the next few requests with 429s, so client pooling,
+concurrency limits and retries can be measured without network access.
+
+Messages requests report prompt caching in their usage: a system prefix
+marked with cache_control is counted as written to the cache the first time
+it is seen and as read from it afterwards. Message Batches are answered the
+same way, ending after ``batch_pending_polls`` status checks.
+"""
+import collections
+import datetime
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Audio request bodies up to this size are kept in ``bodies`` for inspection
+MAX_KEPT_BODY = 1024 * 1024
+
+TRANSCRIPT = "Thank you for calling. I understand how frustrating this has been."
+LLM_ANALYSIS = {
+    "tone_analysis": "Calm and professional",
+    "sentiment_analysis": "Mostly positive",
+    "empathy_level": "High",
+    "key_points": ["Acknowledged the delay"],
+    "improvement_areas": ["Summarize next steps"],
+}
+
+
+def deepgram_response(transcript=TRANSCRIPT):
+    return {
+        "metadata": {
+            "request_id": "stub",
+            "created": "",
+            "duration": 1.0,
+            "channels": 1,
+            "models": [],
+            "model_info": {},
+        },
+        "results": {
+            "channels": [
+                {
+                    "alternatives": [
+                        {"transcript": transcript, "confidence": 0.99, "words": []}
+                    ]
+                }
+            ]
+        },
+    }
+
+
+def anthropic_response(text=None, usage=None, tool=None, tool_input=None):
+    """
+    :param text: Text answer; defaults to the JSON of LLM_ANALYSIS
+    :param tool: Name of a forced tool; answered with a call to it taking
+        ``tool_input`` (LLM_ANALYSIS by default) unless ``text`` is given
+    """
+    if tool is not None and text is None:
+        content = [{"type": "tool_use", "id": "toolu_stub", "name": tool,
+                    "input": LLM_ANALYSIS if tool_input is None else tool_input}]
+        stop_reason = "tool_use"
+    else:
+        content = [
+            {
+                "type": "text",
+                "text": text if text is not None else json.dumps(LLM_ANALYSIS),
+            }
+        ]
+        stop_reason = "end_turn"
+    return {
+        "id": "msg_stub",
+        "type": "message",
+        "role": "assistant",
+        "model": "stub",
+        "content": content,
+        "stop_reason": stop_reason,
+        "stop_sequence": None,
+        "usage": usage or {"input_tokens": 100, "output_tokens": 50},
+    }
+
+
+def stream_events(message, chunk_size=16):
+    """
+    Server-sent events streaming ``message`` the way the Messages API does,
+    with text and tool input split into ``chunk_size`` character deltas.
+    """
+    events = [
+        (
+            'message_start',
+            {
+                "type": "message_start",
+                "message": {
+                    **message,
+                    "content": [],
+                    "stop_reason": None,
+                    "usage": {**message["usage"], "output_tokens": 1},
+                },
+            },
+        )
+    ]
+    for index, block in enumerate(message["content"]):
+        if block["type"] == "tool_use":
+            start = {**block, "input": {}}
+            payload, delta_type, field = (
+                json.dumps(block["input"]),
+                "input_json_delta",
+                "partial_json",
+            )
+        else:
+            start = {**block, "text": ""}
+            payload, delta_type, field = block["text"], "text_delta", "text"
+        events.append(
+            (
+                'content_block_start',
+                {"type": "content_block_start", "index": index, "content_block": start},
+            )
+        )
+        for i in range(0, len(payload), chunk_size):
+            events.append(
+                (
+                    'content_block_delta',
+                    {
+                        "type": "content_block_delta",
+                        "index": index,
+                        "delta": {
+                            "type": delta_type,
+                            field: payload[i : i + chunk_size],
+                        },
+                    },
+                )
+            )
+        events.append(
+            ('content_block_stop', {"type": "content_block_stop", "index": index})
+        )
+    events.append(
+        (
+            'message_delta',
+            {
+                "type": "message_delta",
+                "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+                "usage": {"output_tokens": message["usage"]["output_tokens"]},
+            },
+        )
+    )
+    events.append(('message_stop', {"type": "message_stop"}))
+    return ''.join(
+        f'event: {name}\ndata: {json.dumps(data)}\n\n' for name, data in events
+    )
+
+
+class StubAPIServer:
+    """
+    :param latency: Seconds each request takes to answer
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.connections = 0
+        self.requests = collections.Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.bodies = collections.defaultdict(list)
+        self.body_sizes = collections.defaultdict(list)
+        self.deepgram_transcript = TRANSCRIPT
+        self.anthropic_text = None
+        self.anthropic_tool_input = None
+        self.cached_prefixes = set()
+        self.batches = {}
+        self.batch_pending_polls = 1
+        # custom_ids whose batch requests fail
+        self.batch_errors = set()
+        self._failures = collections.deque()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def fail_next(self, count, status=429, retry_after='0'):
+        with self._lock:
+            self._failures.extend([(status, retry_after)] * count)
+
+    def _usage(self, body):
+        # Cacheable prefix: system blocks up to the last one marked with
+        # cache_control, priced at ~4 characters a token
+        system = body.get('system') if isinstance(body.get('system'), list) else []
+        marked = [i for i, block in enumerate(system) if block.get('cache_control')]
+        usage = {"input_tokens": 100, "output_tokens": 50,
+                 "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+        if marked:
+            prefix = ''.join(block['text'] for block in system[:marked[-1] + 1])
+            with self._lock:
+                hit = prefix in self.cached_prefixes
+                self.cached_prefixes.add(prefix)
+            usage[
+                'cache_read_input_tokens' if hit else 'cache_creation_input_tokens'
+            ] = len(prefix) // 4
+        return usage
+
+    def _message(self, body):
+        tool_choice = body.get('tool_choice') or {}
+        tool = tool_choice.get('name') if tool_choice.get('type') == 'tool' else None
+        return anthropic_response(
+            self.anthropic_text, self._usage(body), tool, self.anthropic_tool_input
+        )
+
+    def _create_batch(self, body):
+        with self._lock:
+            batch_id = f'msgbatch_stub{len(self.batches) + 1}'
+            self.batches[batch_id] = {'requests': body['requests'], 'polls': 0}
+        return self._batch(batch_id)
+
+    def _batch(self, batch_id):
+        batch = self.batches[batch_id]
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        ended = batch['polls'] > self.batch_pending_polls
+        errored = sum(r['custom_id'] in self.batch_errors for r in batch['requests'])
+        total = len(batch['requests'])
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else total,
+                "succeeded": total - errored if ended else 0,
+                "errored": errored if ended else 0,
+                "canceled": 0,
+                "expired": 0,
+            },
+            "created_at": now,
+            "expires_at": now,
+            "ended_at": now if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f'{self.url}/v1/messages/batches/{batch_id}/results'
+            if ended
+            else None,
+        }
+
+    def _batch_results(self, batch_id):
+        lines = []
+        for request in self.batches[batch_id]['requests']:
+            if request['custom_id'] in self.batch_errors:
+                result = {
+                    "type": "errored",
+                    "error": {
+                        "type": "error",
+                        "error": {
+                            "type": "invalid_request_error",
+                            "message": "stub failure",
+                        },
+                    },
+                }
+            else:
+                message = self._message(request['params'])
+                result = {"type": "succeeded", "message": message}
+            lines.append(
+                json.dumps({"custom_id": request['custom_id'], "result": result})
+            )
+        return '\n'.join(lines) + '\n'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                path = self.path.split('?')[0]
+                # Audio uploads are only counted; JSON bodies are always kept
+                body, size = self._read_body(keep_all=not path.endswith('/listen'))
+                with stub._lock:
+                    stub.requests[path] += 1
+                    stub.bodies[path].append(body)
+                    stub.body_sizes[path].append(size)
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                    failure = stub._failures.popleft() if stub._failures else None
+                try:
+                    if stub.latency:
+                        time.sleep(stub.latency)
+                    if failure is not None:
+                        status, retry_after = failure
+                        self._send(
+                            status,
+                            {
+                                "type": "error",
+                                "error": {
+                                    "type": "rate_limit_error",
+                                    "message": "slow down",
+                                },
+                                "err_msg": "slow down",
+                            },
+                            {'Retry-After': retry_after},
+                        )
+                    elif path.endswith('/listen'):
+                        self._send(200, deepgram_response(stub.deepgram_transcript))
+                    elif path.endswith('/messages'):
+                        request = json.loads(body)
+                        if request.get('stream'):
+                            self._send_raw(
+                                200,
+                                stream_events(stub._message(request)),
+                                'text/event-stream',
+                            )
+                        else:
+                            self._send(200, stub._message(request))
+                    elif path.endswith('/messages/batches'):
+                        self._send(200, stub._create_batch(json.loads(body)))
+                    else:
+                        self._send(404, {"err_msg": "not found"})
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                with stub._lock:
+                    stub.requests[path] += 1
+                parts = path.rstrip('/').split('/')
+                # /v1/messages/batches/<id>[/results]
+                batch_id = (
+                    parts[4] if len(parts) > 4 and parts[3] == 'batches' else None
+                )
+                if batch_id not in stub.batches:
+                    self._send(
+                        404,
+                        {
+                            "type": "error",
+                            "error": {
+                                "type": "not_found_error",
+                                "message": "not found",
+                            },
+                        },
+                    )
+                elif len(parts) == 6 and parts[5] == 'results':
+                    self._send_raw(
+                        200, stub._batch_results(batch_id), 'application/binary'
+                    )
+                else:
+                    with stub._lock:
+                        stub.batches[batch_id]['polls'] += 1
+                    self._send(200, stub._batch(batch_id))
+
+            def _read_body(self, keep_all=False):
+                # Large bodies (audio uploads) are drained in chunks, not kept
+                if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+                    chunks = iter(self._read_chunked, None)
+                else:
+                    chunks = self._read_sized(
+                        int(self.headers.get('Content-Length', 0))
+                    )
+                kept = bytearray()
+                size = 0
+                for chunk in chunks:
+                    size += len(chunk)
+                    if keep_all or size <= MAX_KEPT_BODY:
+                        kept += chunk
+                return (
+                    bytes(kept) if keep_all or size <= MAX_KEPT_BODY else None
+                ), size
+
+            def _read_sized(self, remaining):
+                while remaining:
+                    chunk = self.rfile.read(min(remaining, 1024 * 1024))
+                    if not chunk:
+                        return
+                    remaining -= len(chunk)
+                    yield chunk
+
+            def _read_chunked(self):
+                length = int(self.rfile.readline().split(b';')[0], 16)
+                if length == 0:
+                    # Trailer section ends with an empty line
+                    while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                        pass
+                    return None
+                chunk = self.rfile.read(length)
+                self.rfile.readline()
+                return chunk
+
+            def _send_raw(self, status, text, content_type):
+                data = text.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send(self, status, payload, headers=None):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
@@ -0,0 +1,74 @@
+import numpy as np
+
+
+def speech_like(duration, sr=22050, seed=0):
+    """
+    Generate a deterministic speech-like signal: voiced harmonic "syllables"
+    with a gliding fundamental, broken up by short pauses, over a low noise floor.
+
+    :param duration: Length in seconds
+    :param sr: Sampling rate
+    :param seed: Random seed
+    :return: float32 numpy array
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration * sr)
+    y = 0.003 * rng.standard_normal(n)
+
+    pos = 0
+    while pos < n:
+        syllable = int(rng.uniform(0.12, 0.3) * sr)
+        end = min(pos + syllable, n)
+        t = np.arange(end - pos) / sr
+        f0 = rng.uniform(100, 220) * (1 + 0.1 * t / max(t[-1], 1e-3))
+        phase = 2 * np.pi * np.cumsum(f0) / sr
+        voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+        envelope = np.hanning(end - pos)
+        y[pos:end] += 0.3 * envelope * voiced
+        pos = end
+        # Occasional pause between words
+        if rng.random() < 0.25:
+            pos += int(rng.uniform(0.2, 0.8) * sr)
+
+    return y.astype(np.float32)
+
+
+SENTENCES = [
+    "Thank you for calling {org}, my name is {name}, how can I help you today?",
+    "I understand how frustrating it must be to wait this long for a refund.",
+    "Let me pull up your account so I can see what happened with the order you placed "
+    "in {place}.",
+    "I'm really sorry about the confusion, that should never have happened.",
+    "Could you confirm the email address we have on file for you?",
+    "Okay, I see the problem now and I can fix it right away.",
+    "The package was shipped from our warehouse in {place} on Monday but it looks like "
+    "it was delayed.",
+    "Is there anything else I can help you with today?",
+    "I appreciate your patience while I look into this.",
+    "That's a great question, and honestly I think it was our mistake.",
+    "I'll escalate this to {name} on the billing team at {org} and they will follow up "
+    "within two days.",
+    "No problem at all, I'm happy to help.",
+]
+NAMES = ['Sarah', 'John', 'Maria', 'David', 'Priya', 'Chen', 'Fatima', 'Luis']
+PLACES = ['Boston', 'Chicago', 'Denver', 'Seattle', 'Austin', 'Toronto']
+ORGS = ['Acme', 'Globex', 'Initech', 'Umbrella']
+
+
+def transcript_like(n_words, seed=0):
+    """
+    Generate a deterministic support-call style transcript of about
+    ``n_words`` words, with names, places and organisations for NER.
+    """
+    rng = np.random.default_rng(seed)
+    sentences = []
+    words = 0
+    while words < n_words:
+        sentence = SENTENCES[rng.integers(len(SENTENCES))].format(
+            name=NAMES[rng.integers(len(NAMES))],
+            place=PLACES[rng.integers(len(PLACES))],
+            org=ORGS[rng.integers(len(ORGS))],
+        )
+        sentences.append(sentence)
+        words += len(sentence.split())
+    return ' '.join(sentences)
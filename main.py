@@ -3,7 +3,7 @@ import logging
 from dotenv import load_dotenv
 from flask import Flask
 from flask_socketio import SocketIO
-from modules import database
+from modules import clients, database, models
 from routes import init_routes
 
 load_dotenv()  # Load environment variables from .env file
@@ -20,6 +20,20 @@ logging.getLogger('werkzeug').setLevel(logging.WARNING)
 logging.getLogger('engineio').setLevel(logging.WARNING)
 logging.getLogger('socketio').setLevel(logging.WARNING)
 
+# Load models now rather than on the first request. With a server that
+# imports the app once and forks workers (e.g. gunicorn --preload), the
+# workers share them. This runs before any connection or thread is opened.
+if os.getenv('PRELOAD_MODELS', '').lower() in ('1', 'true', 'yes'):
+    models.preload()
+
+def reset_after_fork():
+    # Workers forked from a preloaded app must not share the parent's pooled
+    # database and API connections
+    database.dispose_engines()
+    clients.reset_clients()
+
+os.register_at_fork(after_in_child=reset_after_fork)
+
 # Database setup
 db = database.get_db()
 
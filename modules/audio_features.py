@@ -0,0 +1,178 @@
+from functools import cached_property
+
+import librosa
+import numpy as np
+
+from modules.metrics import timed
+from modules.pitch import PitchTracker
+from modules.voice_activity import analyze_activity
+
+# librosa's defaults for every feature extracted in analyze_audio. All the
+# spectral features share one STFT, so they must agree on the framing.
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MFCC = 13
+LPC_ORDER = 5
+
+# Bump when analyze_audio output changes so cached results are recomputed
+AUDIO_FEATURES_VERSION = '3'
+
+
+class FeatureEngine:
+    """
+    Derives the analyze_audio feature set from a single STFT of the signal.
+
+    Each intermediate (complex STFT, magnitude and power spectrograms, log-mel
+    spectrogram, harmonic/percussive split) is computed at most once, on first
+    use, and shared by every feature that needs it. The results match calling
+    the individual librosa feature functions on ``y`` directly.
+
+    :param y: Mono audio time series
+    :param sr: Sampling rate of ``y``
+    """
+
+    def __init__(self, y, sr):
+        self.y = y
+        self.sr = sr
+
+    @cached_property
+    def stft(self):
+        return librosa.stft(self.y, n_fft=N_FFT, hop_length=HOP_LENGTH)
+
+    @cached_property
+    def magnitude(self):
+        return np.abs(self.stft)
+
+    @cached_property
+    def power(self):
+        return self.magnitude ** 2
+
+    @cached_property
+    def log_mel(self):
+        # Shared by MFCCs and both onset envelopes
+        mel = librosa.feature.melspectrogram(S=self.power, sr=self.sr)
+        return librosa.power_to_db(mel)
+
+    @cached_property
+    def onset_envelope(self):
+        return librosa.onset.onset_strength(S=self.log_mel, sr=self.sr)
+
+    @cached_property
+    def hpss(self):
+        # One decomposition serves both the harmonic and percussive signals
+        stft_harm, stft_perc = librosa.decompose.hpss(self.stft)
+        length = self.y.shape[-1]
+        y_harm = librosa.istft(
+            stft_harm, dtype=self.y.dtype, hop_length=HOP_LENGTH, length=length
+        )
+        y_perc = librosa.istft(
+            stft_perc, dtype=self.y.dtype, hop_length=HOP_LENGTH, length=length
+        )
+        return y_harm, y_perc
+
+    def tempo(self):
+        # beat_track aggregates its onset envelope with the median, not the mean
+        onset_env = librosa.onset.onset_strength(
+            S=self.log_mel, sr=self.sr, aggregate=np.median
+        )
+        tempo, _ = librosa.beat.beat_track(onset_envelope=onset_env, sr=self.sr)
+        return float(tempo) if np.isscalar(tempo) else float(tempo[0])
+
+    def spectral_centroid(self):
+        return librosa.feature.spectral_centroid(S=self.magnitude, sr=self.sr)[0]
+
+    def spectral_rolloff(self):
+        return librosa.feature.spectral_rolloff(S=self.magnitude, sr=self.sr)[0]
+
+    def zero_crossing_rate(self):
+        return librosa.feature.zero_crossing_rate(self.y)[0]
+
+    def mfccs(self):
+        return librosa.feature.mfcc(S=self.log_mel, n_mfcc=N_MFCC)
+
+    def chroma(self):
+        return librosa.feature.chroma_stft(S=self.power, sr=self.sr)
+
+    def pitch(self):
+        # Mean and standard deviation of f0 over voiced frames
+        tracker = PitchTracker(self.sr, N_FFT)
+        tracker.push_spectrum(self.magnitude)
+        tracker.push_samples(self.y)
+        return tracker.finish()
+
+    @cached_property
+    def rms(self):
+        # RMS over time-domain frames; the spectrogram-based variant is windowed
+        # and would not match. Shared by energy and voice activity.
+        return librosa.feature.rms(y=self.y, frame_length=N_FFT, hop_length=HOP_LENGTH)[
+            0
+        ]
+
+    def energy(self):
+        return self.rms
+
+    def activity(self):
+        # Pauses, speaking ratio and speech rate from voice activity segments
+        return analyze_activity(self.rms, self.sr, HOP_LENGTH, n_samples=len(self.y))
+
+    def voice_quality_hnr(self):
+        y_harm, y_perc = self.hpss
+        return np.mean(y_harm) / np.mean(y_perc)
+
+    def formants(self):
+        return librosa.lpc(self.y, order=LPC_ORDER)[1:]
+
+    def _prime(self):
+        # Build the shared intermediates up front so they are not billed to
+        # whichever feature group happens to need them first
+        return self.power, self.log_mel
+
+    def extract(self):
+        """
+        Compute the full feature dict returned by analyze_audio.
+
+        Each feature group is timed as an ``audio.*`` metrics stage.
+
+        :return: Dict of JSON-serializable audio features
+        """
+        with timed('audio.spectrogram'):
+            self._prime()
+        with timed('audio.tempo'):
+            tempo = self.tempo()
+        with timed('audio.spectral'):
+            spectral_centroid = np.mean(self.spectral_centroid())
+            spectral_rolloff = np.mean(self.spectral_rolloff())
+            zero_crossing_rate = np.mean(self.zero_crossing_rate())
+        with timed('audio.mfcc'):
+            mfccs = np.mean(self.mfccs(), axis=1)
+        with timed('audio.pitch'):
+            pitch_mean, pitch_variability = self.pitch()
+        with timed('audio.energy'):
+            energy = self.energy()
+        with timed('audio.rhythm'):
+            activity = self.activity()
+        with timed('audio.voice_quality'):
+            voice_quality_hnr = self.voice_quality_hnr()
+        with timed('audio.formants'):
+            formants = self.formants()
+        with timed('audio.chroma'):
+            chroma = np.mean(self.chroma(), axis=1)
+
+        return {
+            'tempo': tempo,
+            'spectral_centroid': float(spectral_centroid),
+            'spectral_rolloff': float(spectral_rolloff),
+            'zero_crossing_rate_mean': float(zero_crossing_rate),
+            'mfccs': mfccs.tolist(),  # Convert to list for JSON serialization
+            'pitch_mean': float(pitch_mean),
+            'pitch_variability': float(pitch_variability),
+            'energy_mean': float(np.mean(energy)),
+            'energy_variability': float(np.std(energy)),
+            **activity,
+            'voice_quality_hnr': float(voice_quality_hnr),
+            'formants': [float(f) for f in formants],
+            'chroma': chroma.tolist()  # Convert to list for JSON serialization
+        }
+
+def extract_features(y, sr):
+    return FeatureEngine(y, sr).extract()
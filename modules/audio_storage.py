@@ -1,7 +1,38 @@
+import contextlib
+import hashlib
+import logging
 import os
+import tempfile
+import threading
+import time
 from datetime import datetime
 
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
 AUDIO_STORAGE_DIR = 'audio_storage'
+CHUNK_SIZE = 1024 * 1024
+
+# Decoded audio is kept as raw mono float32 at the analysis rate, one file per
+# recording content, so analysis reads it back without decoding again. By
+# default it lives under AUDIO_STORAGE_DIR/pcm; a limit of 0 disables it.
+PCM_CACHE_DIR = os.getenv('PCM_CACHE_DIR')
+PCM_CACHE_MAX_BYTES = int(os.getenv('PCM_CACHE_MAX_BYTES', str(4 * 1024 ** 3)))
+PCM_SAMPLE_RATE = 22050
+PCM_DTYPE = np.float32
+# Partial artifacts untouched for this long were left by a crashed writer
+PCM_PARTIAL_MAX_AGE_SECONDS = 3600
+
+_pcm_lock = threading.Lock()
+
+class UploadTooLargeError(Exception):
+    """Raised when a stream being saved exceeds the allowed size."""
 
 def save_audio(audio_data, file_name=None):
     if not os.path.exists(AUDIO_STORAGE_DIR):
@@ -17,6 +48,47 @@ def save_audio(audio_data, file_name=None):
 
     return file_path
 
+def save_stream(stream, file_name=None, max_bytes=None, chunk_size=CHUNK_SIZE):
+    """
+    Copy a binary file-like object to storage in chunks, hashing it on the way,
+    so memory use does not depend on the size of the file.
+
+    :param stream: Object with a ``read(size)`` method
+    :param file_name: Stored file name
+    :param max_bytes: Largest accepted size; None for no limit
+    :return: (file_path, sha256 hex digest, size in bytes)
+    :raises UploadTooLargeError: If the stream is longer than max_bytes; nothing is kept
+    """
+    if not os.path.exists(AUDIO_STORAGE_DIR):
+        os.makedirs(AUDIO_STORAGE_DIR)
+
+    if file_name is None:
+        file_name = f"audio_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav"
+
+    file_path = os.path.join(AUDIO_STORAGE_DIR, file_name)
+    partial_path = f'{file_path}.part'
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        with open(partial_path, 'wb') as f:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise UploadTooLargeError(f'Upload exceeds {max_bytes} bytes')
+                digest.update(chunk)
+                f.write(chunk)
+        os.replace(partial_path, file_path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    return file_path, digest.hexdigest(), size
+
 def get_audio(file_name):
     file_path = os.path.join(AUDIO_STORAGE_DIR, file_name)
 
@@ -24,4 +96,139 @@ def get_audio(file_name):
         with open(file_path, 'rb') as f:
             return f.read()
     else:
-        return None
\ No newline at end of file
+        return None
+
+def file_hash(file_path, chunk_size=CHUNK_SIZE):
+    """
+    :return: sha256 hex digest of a file, read in chunks
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return digest.hexdigest()
+            digest.update(chunk)
+
+def pcm_cache_dir():
+    return PCM_CACHE_DIR or os.path.join(AUDIO_STORAGE_DIR, 'pcm')
+
+@contextlib.contextmanager
+def _pcm_cache_lock():
+    # Threads take _pcm_lock; processes sharing the cache directory (e.g. the
+    # batch_analysis pool) also take a lock file in it. Without fcntl only
+    # the threads of one process are kept apart.
+    directory = pcm_cache_dir()
+    os.makedirs(directory, exist_ok=True)
+    with _pcm_lock, open(os.path.join(directory, '.lock'), 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+def load_pcm(file_path, content_hash=None, sr=PCM_SAMPLE_RATE):
+    """
+    Decoded samples of an audio file, decoding it only the first time.
+
+    The first call writes the file's mono samples at ``sr`` to the PCM cache,
+    keyed by content hash and rate, a block at a time; later calls for the
+    same content, under any file name, map that artifact instead. The least
+    recently used artifacts are deleted once the cache is larger than
+    PCM_CACHE_MAX_BYTES.
+
+    :param file_path: Path to an audio file in any format read_blocks accepts
+    :param content_hash: sha256 of the file, if already known (e.g. from save_stream)
+    :param sr: Sampling rate of the samples
+    :return: Read-only 1-D float32 ``np.memmap``, or an empty array for empty audio
+    """
+    if content_hash is None:
+        content_hash = file_hash(file_path)
+    directory = pcm_cache_dir()
+    pcm_path = os.path.join(directory, f'{content_hash}_{sr}.f32')
+
+    # Artifacts are found or renamed into place, and mapped, under the cache
+    # lock so evict_pcm cannot delete one before it is mapped; once mapped it
+    # stays readable
+    with _pcm_cache_lock():
+        try:
+            # The modification time is the last use, for eviction
+            os.utime(pcm_path)
+            return _map_pcm(pcm_path)
+        except FileNotFoundError:
+            pass
+
+    partial_path = _decode_pcm(file_path, pcm_path, sr)
+    with _pcm_cache_lock():
+        os.replace(partial_path, pcm_path)
+        pcm = _map_pcm(pcm_path)
+        _evict_pcm(PCM_CACHE_MAX_BYTES, keep=pcm_path)
+    logger.info(f'Decoded {file_path} to {pcm_path}')
+    return pcm
+
+def _map_pcm(pcm_path):
+    if os.path.getsize(pcm_path) == 0:
+        return np.zeros(0, dtype=PCM_DTYPE)
+    return np.memmap(pcm_path, dtype=PCM_DTYPE, mode='r')
+
+def _decode_pcm(file_path, pcm_path, sr):
+    """
+    :return: Path of a partial artifact next to ``pcm_path``, for the caller
+        to rename into place, so a concurrent reader never maps a partial one
+    """
+    # Imported here so the app starts without librosa and audioread
+    from modules.audio_streaming import read_blocks
+
+    os.makedirs(os.path.dirname(pcm_path), exist_ok=True)
+    fd, partial_path = tempfile.mkstemp(dir=os.path.dirname(pcm_path), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for block in read_blocks(file_path, sr=sr):
+                f.write(np.ascontiguousarray(block, dtype=PCM_DTYPE).tobytes())
+    except BaseException:
+        os.remove(partial_path)
+        raise
+    return partial_path
+
+def evict_pcm(max_bytes=None, keep=None):
+    """
+    Delete the least recently used PCM artifacts until the cache fits in
+    ``max_bytes``. Artifacts already mapped stay readable until unmapped.
+    Partial artifacts older than PCM_PARTIAL_MAX_AGE_SECONDS are deleted too.
+
+    :param max_bytes: Size limit; defaults to PCM_CACHE_MAX_BYTES
+    :param keep: Path of an artifact that is never deleted
+    :return: Number of artifacts deleted
+    """
+    if max_bytes is None:
+        max_bytes = PCM_CACHE_MAX_BYTES
+    with _pcm_cache_lock():
+        return _evict_pcm(max_bytes, keep)
+
+def _evict_pcm(max_bytes, keep):
+    entries = []
+    stale_before = time.time() - PCM_PARTIAL_MAX_AGE_SECONDS
+    with os.scandir(pcm_cache_dir()) as it:
+        for entry in it:
+            if not entry.name.endswith(('.f32', '.part')):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith('.f32'):
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            elif stat.st_mtime < stale_before:
+                logger.info(f'Deleting stale partial PCM artifact {entry.path}')
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(entry.path)
+    total = sum(size for _, size, _ in entries)
+    deleted = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        total -= size
+        deleted += 1
+    return deleted
@@ -0,0 +1,546 @@
+import logging
+
+import librosa
+import numpy as np
+import scipy.signal
+import soundfile as sf
+import soxr
+
+from modules.audio_features import HOP_LENGTH, LPC_ORDER, N_FFT, N_MFCC
+from modules.pitch import PitchTracker
+from modules.voice_activity import analyze_activity
+
+logger = logging.getLogger('audio_analysis_logger')
+
+DEFAULT_SR = 22050
+BLOCK_FRAMES = 1024  # STFT frames per processing block, ~24 s at 22050 Hz
+READ_BLOCK_SAMPLES = 65536
+TUNING_SECONDS = 60  # Audio used to estimate the chroma tuning offset
+TOP_DB = 80.0  # power_to_db default floor below the peak
+TEMPOGRAM_BLOCK = 4096  # Onset frames per tempogram block
+AC_SIZE = 8.0  # librosa.feature.tempo autocorrelation window, in seconds
+
+HPSS_KERNEL = 31
+HPSS_CONTEXT = HPSS_KERNEL // 2
+EDGE_FRAMES = N_FFT // HOP_LENGTH + 4  # Frames near the ends that need an exact istft
+
+
+def read_blocks(file_path, sr=DEFAULT_SR):
+    """
+    Decode an audio file block by block as mono float32 at ``sr``.
+
+    Uses soundfile block reads where libsndfile understands the format and
+    falls back to audioread (ffmpeg/gstreamer) for the rest, e.g. m4a.
+    Each block is downmixed and fed through a streaming soxr resampler, the
+    same one librosa.load uses, so only one block is in memory at a time.
+    """
+    try:
+        source = _soundfile_blocks(file_path)
+        native_sr = next(source)
+    except sf.LibsndfileError:
+        source = _audioread_blocks(file_path)
+        native_sr = next(source)
+
+    if native_sr == sr:
+        yield from source
+        return
+
+    resampler = soxr.ResampleStream(native_sr, sr, 1, dtype='float32', quality='HQ')
+    for block in source:
+        yield resampler.resample_chunk(block)
+    yield resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+
+def _soundfile_blocks(file_path):
+    with sf.SoundFile(file_path) as f:
+        yield f.samplerate
+        for block in f.blocks(
+            blocksize=READ_BLOCK_SAMPLES, dtype='float32', always_2d=True
+        ):
+            yield block.mean(axis=1, dtype=np.float32)
+
+
+def _audioread_blocks(file_path):
+    import audioread
+
+    with audioread.audio_open(file_path) as f:
+        yield f.samplerate
+        for buf in f:
+            block = np.frombuffer(buf, dtype='<i2').astype(np.float32) / 32768.0
+            yield block.reshape(-1, f.channels).mean(axis=1, dtype=np.float32)
+
+
+class _Framer:
+    # Cuts a sample stream into the same centered, zero-padded frames that
+    # librosa.stft(center=True) and librosa.feature.rms produce
+    def __init__(self):
+        self.buffer = np.zeros(N_FFT // 2, dtype=np.float32)
+        self.n_samples = 0
+
+    def push(self, samples):
+        self.n_samples += len(samples)
+        self.buffer = np.concatenate([self.buffer, samples])
+        return self._take()
+
+    def finish(self):
+        self.buffer = np.concatenate(
+            [self.buffer, np.zeros(N_FFT // 2, dtype=np.float32)]
+        )
+        return self._take()
+
+    def _take(self):
+        if len(self.buffer) < N_FFT:
+            return np.zeros((N_FFT, 0), dtype=np.float32)
+        n_frames = 1 + (len(self.buffer) - N_FFT) // HOP_LENGTH
+        frames = librosa.util.frame(
+            self.buffer, frame_length=N_FFT, hop_length=HOP_LENGTH
+        )[:, :n_frames]
+        frames = np.ascontiguousarray(frames)
+        self.buffer = self.buffer[n_frames * HOP_LENGTH:]
+        return frames
+
+
+class _HarmonicPercussiveMeans:
+    """
+    Accumulates mean(harmonic) and mean(percussive) from librosa.effects.hpss
+    without materialising either signal.
+
+    The median filters run on blocks padded with HPSS_CONTEXT frames either
+    side, which reproduces the full-signal filter exactly. The istft sum is
+    linear, so interior frames contribute a dot product with a precomputed
+    vector; only the few frames at each end, where the window overlap-add is
+    not constant, go through an explicit inverse FFT.
+    """
+
+    def __init__(self):
+        self.window = scipy.signal.get_window('hann', N_FFT, fftbins=True)
+        weights = np.full(N_FFT // 2 + 1, 2.0)
+        weights[0] = weights[-1] = 1.0
+        # sum(window * irfft(X)) == real(dot(frame_weights, X))
+        self.frame_weights = weights * np.conj(np.fft.rfft(self.window)) / N_FFT
+        self.steady_state_wss = float(
+            np.sum(self.window.reshape(-1, HOP_LENGTH) ** 2, axis=0).mean()
+        )
+
+        self.left_context = np.zeros((N_FFT // 2 + 1, 0), dtype=np.complex64)
+        self.pending = np.zeros((N_FFT // 2 + 1, 0), dtype=np.complex64)
+        self.next_index = 0  # Global index of the first pending frame
+
+        self.totals = np.zeros(2)
+        self.head = {}  # Frames at the start of the signal, kept for the exact pass
+        # The most recent frames, kept until they are known to be interior
+        self.tail = []
+
+    def push(self, stft_frames, final=False):
+        self.pending = np.concatenate([self.pending, stft_frames], axis=1)
+        n_ready = (
+            self.pending.shape[1] if final else self.pending.shape[1] - HPSS_CONTEXT
+        )
+        if n_ready <= 0:
+            return
+
+        window = np.concatenate([self.left_context, self.pending], axis=1)
+        harm, perc = librosa.decompose.hpss(window, kernel_size=HPSS_KERNEL)
+        start = self.left_context.shape[1]
+        self._accumulate(harm[:, start:start + n_ready], perc[:, start:start + n_ready])
+
+        ready = window[:, :start + n_ready]
+        self.left_context = ready[:, -HPSS_CONTEXT:]
+        self.pending = self.pending[:, n_ready:]
+
+    def _accumulate(self, harm, perc):
+        for j in range(harm.shape[1]):
+            index = self.next_index + j
+            if index < EDGE_FRAMES:
+                self.head[index] = (harm[:, j].copy(), perc[:, j].copy())
+            else:
+                self.tail.append((index, harm[:, j].copy(), perc[:, j].copy()))
+        self.next_index += harm.shape[1]
+
+        # Frames with at least EDGE_FRAMES successors are interior: fold them in
+        while len(self.tail) > EDGE_FRAMES:
+            _, h, p = self.tail.pop(0)
+            self.totals += (
+                np.real(self.frame_weights @ np.stack([h, p], axis=1))
+                / self.steady_state_wss
+            )
+
+    def finish(self, n_samples):
+        self.push(np.zeros((N_FFT // 2 + 1, 0), dtype=np.complex64), final=True)
+        n_frames = self.next_index
+
+        edge = dict(self.head)
+        edge.update({index: (h, p) for index, h, p in self.tail})
+        for index, (h, p) in edge.items():
+            gain = self._inverse_wss(index, n_frames, n_samples)
+            frames = self.window[:, None] * np.fft.irfft(
+                np.stack([h, p], axis=1), n=N_FFT, axis=0
+            )
+            self.totals += gain @ frames
+
+        return self.totals / max(n_samples, 1)
+
+    def _inverse_wss(self, index, n_frames, n_samples):
+        # Per-sample 1 / window_sumsquare for one frame, zero outside the
+        # trimmed output span, as librosa.istft(center=True, length=n_samples)
+        start = index * HOP_LENGTH
+        wss = np.zeros(N_FFT)
+        first = max(0, index - N_FFT // HOP_LENGTH + 1)
+        last = min(n_frames - 1, index + N_FFT // HOP_LENGTH - 1)
+        for other in range(first, last + 1):
+            offset = other * HOP_LENGTH - start
+            lo, hi = max(0, offset), min(N_FFT, offset + N_FFT)
+            wss[lo:hi] += self.window[lo - offset:hi - offset] ** 2
+
+        positions = start + np.arange(N_FFT)
+        inside = (positions >= N_FFT // 2) & (positions < N_FFT // 2 + n_samples)
+        gain = np.where(
+            wss > librosa.util.tiny(wss),
+            1.0 / np.maximum(wss, librosa.util.tiny(wss)),
+            1.0,
+        )
+        return np.where(inside, gain, 0.0)
+
+
+class StreamingFeatureAccumulator:
+    """
+    Builds the analyze_audio feature dict from audio pushed in arbitrary-sized
+    blocks, holding O(block) memory.
+
+    Mean/std features (energy, centroid, rolloff, ZCR, pitch, MFCC and chroma
+    means, HNR, LPC autocorrelation) are running sums. Tempo and voice
+    activity need whole-file peak picking and thresholds, so the per-frame
+    rms and onset envelopes are kept; at one float per hop they are ~500x
+    smaller than the decoded audio.
+
+    Results match FeatureEngine on the same samples except where a feature
+    depends on a whole-file statistic:
+    - the log-mel 80 dB floor is taken relative to the running peak
+    - chroma tuning is estimated from the first ``tuning_seconds`` of audio
+
+    Formants run Burg's recursion on covariance sums rebuilt from the running
+    autocorrelation and the first/last few samples. The sums are float64, so
+    they match librosa.lpc on float64 input; librosa's float32 recursion drifts
+    from that on long signals.
+    """
+
+    def __init__(
+        self, sr=DEFAULT_SR, block_frames=BLOCK_FRAMES, tuning_seconds=TUNING_SECONDS
+    ):
+        self.sr = sr
+        self.block_frames = block_frames
+        self.tuning_frames = int(tuning_seconds * sr / HOP_LENGTH)
+
+        self.framer = _Framer()
+        self.hpss = _HarmonicPercussiveMeans()
+        self.window = scipy.signal.get_window('hann', N_FFT, fftbins=True)[:, None]
+        self.pending_frames = []
+        self.pending_count = 0
+
+        self.n_frames = 0
+        self.first_sample = None
+        self.last_sample = 0.0
+        self.autocorr = np.zeros(LPC_ORDER + 1)
+        self.autocorr_carry = np.zeros(0, dtype=np.float64)
+        self.head_samples = np.zeros(0, dtype=np.float64)
+        self.tail_samples = np.zeros(0, dtype=np.float64)
+
+        self.zero_crossings = 0
+        self.centroid_sum = 0.0
+        self.rolloff_sum = 0.0
+        self.pitch = PitchTracker(sr, N_FFT)
+        self.log_mel_sum = None
+        self.log_mel_peak = -np.inf
+        self.last_log_mel = None
+        self.chroma_sum = np.zeros(12)
+        self.tuning = None
+        self.tuning_buffer = []
+
+        self.rms = []
+        self.onset_median = []
+
+    def push(self, samples):
+        samples = np.asarray(samples, dtype=np.float32)
+        if len(samples) == 0:
+            return
+        if self.first_sample is None:
+            self.first_sample = float(samples[0])
+        self.last_sample = float(samples[-1])
+        self._update_autocorr(samples)
+        self.pitch.push_samples(samples)
+        self._queue(self.framer.push(samples))
+
+    def finish(self):
+        """
+        Flush buffered audio and compute the feature dict.
+
+        :return: Dict of JSON-serializable audio features
+        """
+        self._queue(self.framer.finish(), flush=True)
+        n_samples = self.framer.n_samples
+        if n_samples == 0:
+            raise ValueError('No audio samples were provided')
+        if self.tuning is None:
+            self._resolve_tuning()
+
+        harm_mean, perc_mean = self.hpss.finish(n_samples)
+        rms = np.concatenate(self.rms)
+        energy_mean = np.mean(rms)
+        pitch_mean, pitch_std = self.pitch.finish()
+        mfccs = librosa.feature.mfcc(
+            S=(self.log_mel_sum / self.n_frames)[:, None], n_mfcc=N_MFCC
+        )[:, 0]
+
+        return {
+            'tempo': self._tempo(),
+            'spectral_centroid': float(self.centroid_sum / self.n_frames),
+            'spectral_rolloff': float(self.rolloff_sum / self.n_frames),
+            'zero_crossing_rate_mean': float(
+                self._zero_crossing_total(n_samples) / (N_FFT * self.n_frames)
+            ),
+            'mfccs': mfccs.tolist(),  # Convert to list for JSON serialization
+            'pitch_mean': float(pitch_mean),
+            'pitch_variability': float(pitch_std),
+            'energy_mean': float(energy_mean),
+            'energy_variability': float(np.std(rms)),
+            **analyze_activity(rms, self.sr, HOP_LENGTH, n_samples=n_samples),
+            'voice_quality_hnr': float(harm_mean / perc_mean),
+            'formants': [float(f) for f in self._formants(n_samples)],
+            'chroma': (
+                self.chroma_sum / self.n_frames
+            ).tolist(),  # Convert to list for JSON serialization
+        }
+
+    def _queue(self, frames, flush=False):
+        if frames.shape[1]:
+            self.pending_frames.append(frames)
+            self.pending_count += frames.shape[1]
+        if self.pending_count >= self.block_frames or (flush and self.pending_count):
+            block = np.concatenate(self.pending_frames, axis=1)
+            self.pending_frames, self.pending_count = [], 0
+            self._process_block(block)
+
+    def _process_block(self, frames):
+        self.n_frames += frames.shape[1]
+
+        # Time-domain frame features
+        self.rms.append(np.sqrt(np.mean(frames ** 2, axis=0)))
+        self.zero_crossings += int(
+            np.sum(librosa.zero_crossings(frames, axis=0, pad=False))
+        )
+
+        # One STFT per block shared by every spectral feature
+        stft = np.fft.rfft(self.window * frames, axis=0).astype(np.complex64)
+        magnitude = np.abs(stft)
+        power = magnitude ** 2
+
+        self.centroid_sum += float(
+            np.sum(librosa.feature.spectral_centroid(S=magnitude, sr=self.sr))
+        )
+        self.rolloff_sum += float(
+            np.sum(librosa.feature.spectral_rolloff(S=magnitude, sr=self.sr))
+        )
+
+        self.pitch.push_spectrum(magnitude)
+
+        self._update_log_mel(power)
+        self._update_chroma(power)
+        self.hpss.push(stft)
+
+    def _update_log_mel(self, power):
+        mel = librosa.feature.melspectrogram(S=power, sr=self.sr)
+        log_mel = librosa.power_to_db(mel, top_db=None)
+        self.log_mel_peak = max(self.log_mel_peak, float(log_mel.max()))
+        log_mel = np.maximum(log_mel, self.log_mel_peak - TOP_DB)
+
+        if self.log_mel_sum is None:
+            self.log_mel_sum = np.zeros(log_mel.shape[0])
+        self.log_mel_sum += log_mel.sum(axis=1)
+
+        # Onset strength is a first difference, so carry the previous frame over
+        with_previous = (
+            log_mel
+            if self.last_log_mel is None
+            else np.concatenate([self.last_log_mel, log_mel], axis=1)
+        )
+        flux = np.maximum(0.0, with_previous[:, 1:] - with_previous[:, :-1])
+        self.onset_median.append(np.median(flux, axis=0))
+        self.last_log_mel = log_mel[:, -1:]
+
+    def _update_chroma(self, power):
+        if self.tuning is None:
+            self.tuning_buffer.append(power)
+            if (
+                sum(block.shape[1] for block in self.tuning_buffer)
+                >= self.tuning_frames
+            ):
+                self._resolve_tuning()
+            return
+        self.chroma_sum += librosa.feature.chroma_stft(
+            S=power, sr=self.sr, tuning=self.tuning
+        ).sum(axis=1)
+
+    def _resolve_tuning(self):
+        buffered = np.concatenate(self.tuning_buffer, axis=1)
+        self.tuning_buffer = []
+        self.tuning = librosa.estimate_tuning(
+            S=buffered, sr=self.sr, bins_per_octave=12
+        )
+        self.chroma_sum += librosa.feature.chroma_stft(
+            S=buffered, sr=self.sr, tuning=self.tuning
+        ).sum(axis=1)
+
+    def _update_autocorr(self, samples):
+        segment = np.concatenate([self.autocorr_carry, samples.astype(np.float64)])
+        carry = len(self.autocorr_carry)
+        for lag in range(LPC_ORDER + 1):
+            start = max(carry, lag)
+            if start < len(segment):
+                self.autocorr[lag] += np.dot(
+                    segment[start - lag : len(segment) - lag], segment[start:]
+                )
+        self.autocorr_carry = segment[-LPC_ORDER:]
+
+        # Burg's sums skip a few samples at each end of the signal
+        edge = 2 * (LPC_ORDER + 1)
+        if len(self.head_samples) < edge:
+            self.head_samples = np.concatenate(
+                [self.head_samples, segment[carry : carry + edge]]
+            )[:edge]
+        self.tail_samples = np.concatenate([self.tail_samples, segment[carry:]])[-edge:]
+
+    def _sample(self, index, n_samples):
+        if index < len(self.head_samples):
+            return self.head_samples[index]
+        return self.tail_samples[index - (n_samples - len(self.tail_samples))]
+
+    def _covariance(self, lo, hi, lag, n_samples):
+        # sum(y[m] * y[m + lag] for m in lo..hi) from the full-signal autocorrelation
+        total = self.autocorr[lag]
+        total -= sum(
+            self._sample(m, n_samples) * self._sample(m + lag, n_samples)
+            for m in range(0, lo)
+        )
+        total -= sum(
+            self._sample(m, n_samples) * self._sample(m + lag, n_samples)
+            for m in range(hi + 1, n_samples - lag)
+        )
+        return total
+
+    def _formants(self, n_samples):
+        # librosa.lpc's Burg recursion, with each stage's forward/backward
+        # prediction error sums written as quadratic forms over covariances
+        ar_coeffs = np.zeros(LPC_ORDER + 1)
+        ar_coeffs[0] = 1.0
+        for i in range(LPC_ORDER):
+            size = i + 2
+            cov = np.empty((size, size))
+            for p in range(size):
+                for q in range(size):
+                    delay, lag = max(p, q), abs(p - q)
+                    cov[p, q] = self._covariance(
+                        i + 1 - delay, n_samples - 1 - delay, lag, n_samples
+                    )
+
+            fwd = np.zeros(size)
+            fwd[:i + 1] = ar_coeffs[:i + 1]
+            bwd = np.zeros(size)
+            bwd[1:] = ar_coeffs[i::-1]
+            den = fwd @ cov @ fwd + bwd @ cov @ bwd
+            reflect_coeff = -2 * (fwd @ cov @ bwd) / (den + librosa.util.tiny(den))
+
+            prev = ar_coeffs.copy()
+            for j in range(1, i + 2):
+                ar_coeffs[j] = prev[j] + reflect_coeff * prev[i - j + 1]
+        return ar_coeffs[1:]
+
+    def _onset_envelope(self, parts):
+        # Same lag + centering shift as librosa.onset.onset_strength
+        pad = 1 + N_FFT // (2 * HOP_LENGTH)
+        envelope = np.concatenate([np.zeros(pad, dtype=np.float32)] + parts)
+        return envelope[:self.n_frames]
+
+    def _tempo(self):
+        # beat_track's tempo is feature.tempo over the mean tempogram. The full
+        # tempogram is (window x n_frames), so average it a block at a time.
+        envelope = self._onset_envelope(self.onset_median)
+        if not envelope.any():
+            return 0.0
+
+        win_length = librosa.time_to_frames(
+            AC_SIZE, sr=self.sr, hop_length=HOP_LENGTH
+        ).item()
+        padded = np.pad(
+            envelope, win_length // 2, mode='linear_ramp', end_values=[0, 0]
+        )
+        ac_window = scipy.signal.get_window('hann', win_length, fftbins=True)[:, None]
+        tempogram_sum = np.zeros(win_length)
+        for start in range(0, len(envelope), TEMPOGRAM_BLOCK):
+            stop = min(len(envelope), start + TEMPOGRAM_BLOCK)
+            frames = librosa.util.frame(
+                padded[start : stop + win_length - 1],
+                frame_length=win_length,
+                hop_length=1,
+            )
+            tempogram = librosa.util.normalize(
+                librosa.autocorrelate(frames * ac_window, axis=-2), norm=np.inf, axis=-2
+            )
+            tempogram_sum += tempogram.sum(axis=1)
+
+        mean_tempogram = (tempogram_sum / len(envelope))[:, None]
+        tempo = librosa.feature.tempo(
+            tg=mean_tempogram, sr=self.sr, hop_length=HOP_LENGTH
+        )
+        return float(tempo[0])
+
+    def _zero_crossing_total(self, n_samples):
+        # zero_crossing_rate pads with edge values, not zeros; remove the
+        # crossings the zero padding adds at each end of the signal
+        total = self.zero_crossings
+        threshold = 1e-10
+        if self.first_sample < -threshold:
+            total -= sum(
+                1
+                for t in range(min(self.n_frames, EDGE_FRAMES))
+                if t * HOP_LENGTH <= N_FFT // 2 - 1
+            )
+        if self.last_sample < -threshold:
+            junction = N_FFT // 2 + n_samples
+            total -= sum(
+                1
+                for t in range(max(0, self.n_frames - EDGE_FRAMES), self.n_frames)
+                if t * HOP_LENGTH <= junction - 1
+                and junction <= t * HOP_LENGTH + N_FFT - 1
+            )
+        return total
+
+
+def analyze_audio_stream(file_path, sr=DEFAULT_SR, block_frames=BLOCK_FRAMES):
+    """
+    Compute the analyze_audio feature dict while decoding the file in blocks.
+
+    :param file_path: Path to an audio file
+    :param sr: Analysis sampling rate
+    :param block_frames: STFT frames per processing block; bounds peak memory
+    :return: Dict of JSON-serializable audio features
+    """
+    accumulator = StreamingFeatureAccumulator(sr=sr, block_frames=block_frames)
+    for block in read_blocks(file_path, sr=sr):
+        accumulator.push(block)
+    return accumulator.finish()
+
+
+def analyze_samples_stream(y, sr=DEFAULT_SR, block_frames=BLOCK_FRAMES):
+    """
+    analyze_audio_stream() for samples that are already decoded, such as a
+    memory-mapped PCM artifact; only one block of them is read at a time.
+
+    :param y: Mono samples at ``sr``
+    :return: Dict of JSON-serializable audio features
+    """
+    accumulator = StreamingFeatureAccumulator(sr=sr, block_frames=block_frames)
+    for start in range(0, len(y), READ_BLOCK_SAMPLES):
+        accumulator.push(
+            np.asarray(y[start : start + READ_BLOCK_SAMPLES], dtype=np.float32)
+        )
+    return accumulator.finish()
@@ -0,0 +1,328 @@
+"""
+Batch re-scoring of archived calls.
+
+Pairs recordings and transcripts by file stem (``call.wav`` + ``call.txt``)
+under a directory, analyzes them across a process pool and writes one row per
+call to the ``results`` table.
+
+Rows are tagged with a batch key: the text and audio analyzer versions, and
+the ``--run-id`` when one is given. Calls that already have a row with the
+same key are skipped, so an interrupted run can simply be started again,
+while a version bump or a new run id re-scores everything. ``--rescore``
+analyzes every call regardless.
+
+With ``--llm-batch`` the new results are also submitted for LLM analysis
+through the Message Batches API. The run prints the batch id; once the batch
+has ended, ``--collect-llm <batch id>`` stores each analysis under the
+``llm_analysis`` key of its result.
+
+Usage: python -m modules.batch_analysis <directory> [--workers N] [--commit-every N] \\
+           [--run-id ID] [--rescore] [--streaming] [--llm-batch]
+       python -m modules.batch_analysis --collect-llm <batch id>
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+
+from modules import database
+
+logger = logging.getLogger(__name__)
+
+# Same set the /upload route accepts
+AUDIO_EXTENSIONS = {'wav', 'mp3', 'ogg', 'flac', 'm4a', 'mp4'}
+TRANSCRIPT_EXTENSIONS = {'txt'}
+
+# Per-worker state, set once by _init_worker
+_worker_options = {}
+
+
+def find_jobs(directory):
+    """
+    Collect the calls under ``directory``.
+
+    :return: Sorted list of (filename, audio_path, transcript_path) tuples; either
+        path may be None. ``filename`` is the call's path relative to ``directory``
+        without extension, which is also the key stored in the results table.
+    """
+    calls = {}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            stem, _, extension = name.rpartition('.')
+            extension = extension.lower()
+            if not stem or extension not in AUDIO_EXTENSIONS | TRANSCRIPT_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            key = os.path.relpath(os.path.join(root, stem), directory)
+            slot = 0 if extension in AUDIO_EXTENSIONS else 1
+            calls.setdefault(key, [None, None])[slot] = path
+    return sorted(
+        (key, audio, transcript) for key, (audio, transcript) in calls.items()
+    )
+
+
+def batch_key(run_id=None):
+    """
+    :param run_id: Optional name of the run, e.g. a date for nightly runs
+    :return: Key stored with each result of a run, which scopes resuming
+    """
+    from modules.audio_features import AUDIO_FEATURES_VERSION
+    from modules.text_analysis import ANALYZER_VERSION
+
+    key = f'text-{ANALYZER_VERSION}/audio-{AUDIO_FEATURES_VERSION}'
+    return f'{run_id}/{key}' if run_id else key
+
+
+def _init_worker(load_text_models, streaming):
+    # Load spaCy and the NLTK resources up front so each worker pays for that
+    # once, before its first job, instead of inside the first job's timing
+    if load_text_models:
+        from modules import models
+        models.warm_up(audio=False)
+    import modules.audio_analysis  # noqa: F401
+    _worker_options['streaming'] = streaming
+
+
+def _analyze_job(job):
+    from modules.audio_analysis import analyze_audio
+
+    filename, audio_path, transcript_path = job
+    started = time.perf_counter()
+    try:
+        analysis = {}
+        transcript = None
+        audio_seconds = 0.0
+        if audio_path:
+            import librosa
+            audio_seconds = librosa.get_duration(path=audio_path)
+            analysis['audio_features'] = analyze_audio(
+                audio_path, streaming=_worker_options.get('streaming')
+            )
+        if transcript_path:
+            from modules.text_analysis import analyze_text
+            with open(transcript_path, encoding='utf-8') as f:
+                transcript = f.read()
+            analysis['text_features'] = analyze_text(transcript)
+        return {
+            'filename': filename,
+            'transcript': transcript,
+            'analysis': analysis,
+            'audio_seconds': audio_seconds,
+            'seconds': time.perf_counter() - started,
+        }
+    except Exception as e:
+        return {'filename': filename, 'error': str(e)}
+
+
+def run_batch(
+    directory,
+    db=None,
+    workers=None,
+    commit_every=50,
+    streaming=None,
+    llm_batch=False,
+    run_id=None,
+    rescore=False,
+):
+    """
+    Analyze every unprocessed call under ``directory`` and save the results.
+
+    :param directory: Root directory of recordings and transcripts
+    :param db: Database session; defaults to database.get_db()
+    :param workers: Process pool size; defaults to the CPU count
+    :param commit_every: Number of results written per commit
+    :param streaming: Use bounded-memory streaming audio analysis for every
+        recording. By default analyze_audio only streams long recordings.
+    :param llm_batch: Submit the new results for LLM analysis as one Message
+        Batch; its id is returned as ``llm_batch_id``
+    :param run_id: Name of this run; see batch_key
+    :param rescore: Analyze calls even if this batch key already has a result
+    :return: Dict with processed/skipped/failed counts and throughput
+    """
+    db = db or database.get_db()
+    workers = workers or os.cpu_count()
+
+    key = batch_key(run_id)
+    jobs = find_jobs(directory)
+    done = (
+        set()
+        if rescore
+        else database.get_processed_filenames(db, (job[0] for job in jobs), key)
+    )
+    pending = [job for job in jobs if job[0] not in done]
+    logger.info(
+        f'Batch analysis: {len(pending)} calls to process, {len(jobs) - len(pending)} '
+        'already done'
+    )
+
+    stats = {
+        'processed': 0,
+        'skipped': len(jobs) - len(pending),
+        'failed': 0,
+        'audio_seconds': 0.0,
+    }
+    started = time.perf_counter()
+    buffer = []
+    llm_payloads = []
+
+    def flush():
+        if buffer:
+            ids = database.save_results(db, buffer)
+            if llm_batch:
+                llm_payloads.extend(
+                    (f'result-{result_id}', result['analysis'], result['transcript'])
+                    for result_id, result in zip(ids, buffer, strict=True)
+                )
+            buffer.clear()
+
+    if pending:
+        load_text_models = any(transcript for _, _, transcript in pending)
+        with multiprocessing.Pool(
+            workers, initializer=_init_worker, initargs=(load_text_models, streaming)
+        ) as pool:
+            for result in pool.imap_unordered(_analyze_job, pending):
+                if 'error' in result:
+                    stats['failed'] += 1
+                    logger.error(
+                        f"Failed to analyze {result['filename']}: {result['error']}"
+                    )
+                    continue
+
+                stats['processed'] += 1
+                stats['audio_seconds'] += result['audio_seconds']
+                result['batch_key'] = key
+                buffer.append(result)
+                if len(buffer) >= commit_every:
+                    flush()
+                    _log_progress(stats, len(pending), started)
+        flush()
+
+    elapsed = time.perf_counter() - started
+    stats['seconds'] = elapsed
+    stats['files_per_second'] = stats['processed'] / elapsed if elapsed else 0.0
+    stats['audio_seconds_per_second'] = (
+        stats['audio_seconds'] / elapsed if elapsed else 0.0
+    )
+    _log_progress(stats, len(pending), started)
+
+    if llm_payloads:
+        from modules import llm_integration
+        stats['llm_batch_id'] = llm_integration.submit_batch(llm_payloads)
+    return stats
+
+
+def collect_llm_batch(batch_id, db=None, poll_interval=None, commit_every=50):
+    """
+    Wait for an LLM batch submitted by run_batch and store its analyses.
+    Failed requests are logged and counted; their results keep whatever
+    analysis they already have.
+
+    :param batch_id: The ``llm_batch_id`` returned by run_batch
+    :param db: Database session; defaults to database.get_db()
+    :param poll_interval: Seconds between batch status checks
+    :param commit_every: Number of results updated per commit
+    :return: Dict with updated and failed counts
+    """
+    from modules import llm_integration
+
+    db = db or database.get_db()
+    kwargs = {} if poll_interval is None else {'poll_interval': poll_interval}
+    stats = {'updated': 0, 'failed': 0}
+    updates = {}
+
+    for custom_id, analysis in llm_integration.collect_batch(batch_id, **kwargs):
+        result_id = int(custom_id.rpartition('-')[2])
+        if isinstance(analysis, llm_integration.LLMAnalysisError):
+            stats['failed'] += 1
+            logger.error(f"LLM analysis failed for result {result_id}: {str(analysis)}")
+            continue
+        updates[result_id] = {'llm_analysis': analysis.to_dict()}
+        if len(updates) >= commit_every:
+            stats['updated'] += database.update_analyses(db, updates)
+            updates.clear()
+    if updates:
+        stats['updated'] += database.update_analyses(db, updates)
+    return stats
+
+
+def _log_progress(stats, total, started):
+    elapsed = time.perf_counter() - started
+    finished = stats['processed'] + stats['failed']
+    logger.info(
+        f"{finished}/{total} calls, {stats['processed'] / elapsed:.2f} files/s, "
+        f"{stats['audio_seconds'] / elapsed:.1f} audio-s/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Analyze a directory of call recordings and transcripts.'
+    )
+    parser.add_argument('directory', nargs='?')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Process pool size (default: CPU count)',
+    )
+    parser.add_argument(
+        '--commit-every', type=int, default=50, help='Results per database commit'
+    )
+    parser.add_argument(
+        '--run-id',
+        help='Name of this run; calls are only skipped if this run analyzed them',
+    )
+    parser.add_argument(
+        '--rescore',
+        action='store_true',
+        help='Analyze every call, even those already analyzed',
+    )
+    parser.add_argument(
+        '--streaming',
+        action='store_const',
+        const=True,
+        help='Use bounded-memory audio analysis for every recording '
+        '(default: only for long recordings)',
+    )
+    parser.add_argument(
+        '--llm-batch',
+        action='store_true',
+        help='Submit new results for batched LLM analysis',
+    )
+    parser.add_argument(
+        '--collect-llm',
+        metavar='BATCH_ID',
+        help='Store the results of an LLM batch and exit',
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.collect_llm:
+        stats = collect_llm_batch(args.collect_llm, commit_every=args.commit_every)
+        print(f"updated={stats['updated']} failed={stats['failed']}")
+        return
+    if not args.directory:
+        parser.error('a directory is required unless --collect-llm is given')
+
+    stats = run_batch(
+        args.directory,
+        workers=args.workers,
+        commit_every=args.commit_every,
+        streaming=args.streaming,
+        llm_batch=args.llm_batch,
+        run_id=args.run_id,
+        rescore=args.rescore,
+    )
+    print(
+        f"processed={stats['processed']} skipped={stats['skipped']} "
+        f"failed={stats['failed']} "
+        f"files/s={stats['files_per_second']:.2f} "
+        f"audio-s/s={stats['audio_seconds_per_second']:.1f}"
+    )
+    if 'llm_batch_id' in stats:
+        print(f"llm_batch_id={stats['llm_batch_id']}")
+
+
+if __name__ == '__main__':
+    main()
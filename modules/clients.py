@@ -0,0 +1,280 @@
+"""
+Shared Deepgram and Anthropic clients.
+
+Clients are created once per process (async clients once per event loop) and
+reuse pooled keep-alive HTTP connections instead of paying a new TCP and TLS
+handshake on every upload. Calls made through call_with_retries and
+acall_with_retries are limited to ``CLIENT_MAX_CONCURRENCY`` in flight per
+service and retried with jittered exponential backoff when the service is
+rate limited or temporarily unavailable.
+
+Settings are read from the environment when a client is first created:
+``DEEPGRAM_API_KEY``, ``DEEPGRAM_URL`` (optional), ``ANTHROPIC_API_KEY``,
+``ANTHROPIC_BASE_URL`` (optional), ``CLIENT_MAX_CONCURRENCY`` (default 8),
+``CLIENT_MAX_RETRIES`` (default 4) and ``CLIENT_POOL_SIZE`` (default 20, the
+Deepgram connection pool; the Anthropic SDK manages its own pool).
+"""
+import asyncio
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import weakref
+
+import httpx
+from deepgram import (
+    DeepgramApiError,
+    DeepgramClient,
+    DeepgramClientOptions,
+    DeepgramUnknownApiError,
+)
+
+logger = logging.getLogger(__name__)
+
+DEEPGRAM = 'deepgram'
+ANTHROPIC = 'anthropic'
+
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+KEEPALIVE_EXPIRY = 60.0
+# Deepgram transcribes long uploads synchronously
+DEEPGRAM_TIMEOUT = httpx.Timeout(300.0, connect=10.0)
+ANTHROPIC_TIMEOUT = 120.0
+
+_lock = threading.Lock()
+_clients = {}
+_limits = {}
+# Async clients and semaphores are bound to the loop they were created on
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def max_concurrency():
+    return int(os.getenv('CLIENT_MAX_CONCURRENCY', '8'))
+
+
+def max_retries():
+    return int(os.getenv('CLIENT_MAX_RETRIES', '4'))
+
+
+def _pool_limits():
+    size = int(os.getenv('CLIENT_POOL_SIZE', '20'))
+    return httpx.Limits(
+        max_connections=size,
+        max_keepalive_connections=size,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+class _SharedTransport(httpx.BaseTransport):
+    # The Deepgram SDK opens and closes an httpx.Client per request, which
+    # would close the pool with it; this keeps the pool alive across requests
+    def __init__(self, transport):
+        self._transport = transport
+
+    def handle_request(self, request):
+        return self._transport.handle_request(request)
+
+    def close(self):
+        pass
+
+
+class _SharedAsyncTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport):
+        self._transport = transport
+
+    async def handle_async_request(self, request):
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self):
+        pass
+
+
+def _deepgram_client():
+    options = DeepgramClientOptions(url=os.getenv('DEEPGRAM_URL', ''))
+    return DeepgramClient(os.environ['DEEPGRAM_API_KEY'], options)
+
+
+def _anthropic_options():
+    # The SDK pools keep-alive connections per client instance. Retries are
+    # handled by call_with_retries, so its own are disabled.
+    return {'max_retries': 0, 'timeout': ANTHROPIC_TIMEOUT}
+
+
+def _get(name, factory):
+    with _lock:
+        if name not in _clients:
+            _clients[name] = factory()
+        return _clients[name]
+
+
+def get_deepgram_client():
+    return _get(DEEPGRAM, _deepgram_client)
+
+
+def deepgram_transport():
+    """
+    :return: Pooled transport to pass as ``transport=`` to Deepgram REST calls
+    """
+    return _get(
+        'deepgram_transport',
+        lambda: _SharedTransport(httpx.HTTPTransport(limits=_pool_limits())),
+    )
+
+
+def _anthropic():
+    # The SDK takes over a second to import; workers that never call the LLM
+    # skip it
+    import anthropic
+    return anthropic
+
+
+def get_anthropic_client():
+    return _get(ANTHROPIC, lambda: _anthropic().Anthropic(**_anthropic_options()))
+
+
+def _loop_clients():
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        _async_clients[loop] = {
+            'limits': {
+                DEEPGRAM: asyncio.Semaphore(max_concurrency()),
+                ANTHROPIC: asyncio.Semaphore(max_concurrency()),
+            },
+        }
+    return _async_clients[loop]
+
+
+def _get_async(name, factory):
+    # Created on first use, so a service that is never called needs no key
+    loop_clients = _loop_clients()
+    if name not in loop_clients:
+        loop_clients[name] = factory()
+    return loop_clients[name]
+
+
+def get_async_deepgram_client():
+    return _get_async(DEEPGRAM, _deepgram_client)
+
+
+def async_deepgram_transport():
+    return _get_async(
+        'deepgram_transport',
+        lambda: _SharedAsyncTransport(httpx.AsyncHTTPTransport(limits=_pool_limits())),
+    )
+
+
+def get_async_anthropic_client():
+    return _get_async(
+        ANTHROPIC, lambda: _anthropic().AsyncAnthropic(**_anthropic_options())
+    )
+
+
+def reset_clients():
+    """
+    Drop the shared clients so the next call recreates them from the current
+    environment, e.g. after a fork or a configuration change.
+    """
+    with _lock:
+        if ANTHROPIC in _clients:
+            _clients[ANTHROPIC].close()
+        if 'deepgram_transport' in _clients:
+            _clients['deepgram_transport']._transport.close()
+        _clients.clear()
+        _limits.clear()
+    _async_clients.clear()
+
+
+def _limit(service):
+    with _lock:
+        if service not in _limits:
+            _limits[service] = threading.BoundedSemaphore(max_concurrency())
+        return _limits[service]
+
+
+def _status(error):
+    # Errors can only come from the Anthropic SDK once it has been imported
+    anthropic = sys.modules.get('anthropic')
+    if anthropic is not None and isinstance(error, anthropic.APIStatusError):
+        return error.status_code
+    if isinstance(error, (DeepgramApiError, DeepgramUnknownApiError)):
+        try:
+            return int(error.status)
+        except (TypeError, ValueError):
+            return None
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code
+    return None
+
+
+def is_retryable(error):
+    """
+    Rate limits, overload, server errors and dropped connections are retried;
+    other client errors are not.
+    """
+    anthropic = sys.modules.get('anthropic')
+    if anthropic is not None and isinstance(error, anthropic.APIConnectionError):
+        return True
+    if isinstance(error, httpx.TransportError):
+        return True
+    status = _status(error)
+    return status is not None and (status in (408, 409, 429) or status >= 500)
+
+
+def retry_delay(attempt, error=None):
+    """
+    Full-jitter exponential backoff, or the server's Retry-After when given.
+
+    :param attempt: Zero-based number of the failed attempt
+    """
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), RETRY_MAX_DELAY)
+        except ValueError:
+            pass
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def call_with_retries(service, fn, *args, **kwargs):
+    """
+    Call ``fn(*args, **kwargs)`` under the service's concurrency limit, retrying
+    retryable errors up to CLIENT_MAX_RETRIES times.
+
+    :param service: DEEPGRAM or ANTHROPIC
+    """
+    attempts = max_retries() + 1
+    for attempt in range(attempts):
+        try:
+            with _limit(service):
+                return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == attempts - 1 or not is_retryable(e):
+                raise
+            delay = retry_delay(attempt, e)
+            logger.warning(
+                f'{service} call failed ({str(e)}), retrying in {delay:.2f}s'
+            )
+            time.sleep(delay)
+
+
+async def acall_with_retries(service, fn, *args, **kwargs):
+    """
+    Async counterpart of call_with_retries for coroutine functions.
+    """
+    limit = _loop_clients()['limits'][service]
+    attempts = max_retries() + 1
+    for attempt in range(attempts):
+        try:
+            async with limit:
+                return await fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == attempts - 1 or not is_retryable(e):
+                raise
+            delay = retry_delay(attempt, e)
+            logger.warning(
+                f'{service} call failed ({str(e)}), retrying in {delay:.2f}s'
+            )
+            await asyncio.sleep(delay)
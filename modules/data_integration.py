@@ -21,8 +21,10 @@ def numpy_to_python(obj):
 def integrate_data(audio_features, text_features):
     logger.info("Starting data integration")
     try:
-        integrated_data = {
-            "audio_features": {
+        integrated_data = {}
+        # Audio analysis is best effort; without it the text features stand alone
+        if audio_features is not None:
+            integrated_data["audio_features"] = {
                 "tempo": audio_features["tempo"],
                 "spectral_centroid": audio_features["spectral_centroid"],
                 "spectral_rolloff": audio_features["spectral_rolloff"],
@@ -32,19 +34,22 @@ def integrate_data(audio_features, text_features):
                 "energy_mean": audio_features["energy_mean"],
                 "energy_variability": audio_features["energy_variability"],
                 "speech_rate": audio_features["speech_rate"],
+                "articulation_rate": audio_features["articulation_rate"],
+                "speaking_ratio": audio_features["speaking_ratio"],
                 "pause_count": audio_features["pause_count"],
                 "pause_duration_mean": audio_features["pause_duration_mean"],
+                "pause_duration_median": audio_features["pause_duration_median"],
+                "pause_duration_p90": audio_features["pause_duration_p90"],
                 "voice_quality_hnr": audio_features["voice_quality_hnr"],
                 "formants": audio_features["formants"],
                 "chroma": audio_features["chroma"]
-            },
-            "text_features": {
-                "sentiment": text_features["sentiment"],
-                "word_count": text_features["word_count"],
-                "unique_words": text_features["unique_words"]
-            },
-            "top_words": text_features["top_words"]
+            }
+        integrated_data["text_features"] = {
+            "sentiment": text_features["sentiment"],
+            "word_count": text_features["word_count"],
+            "unique_words": text_features["unique_words"]
         }
+        integrated_data["top_words"] = text_features["top_words"]
 
         logger.info("Completed data integration")
         return numpy_to_python(integrated_data)
@@ -1,30 +1,387 @@
-from sqlalchemy import create_engine, Column, Integer, String, JSON
+from sqlalchemy import (
+    create_engine,
+    event,
+    inspect,
+    insert,
+    select,
+    text,
+    tuple_,
+    Column,
+    Float,
+    Index,
+    Integer,
+    String,
+    JSON,
+)
+from sqlalchemy import LargeBinary, TypeDecorator
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import StaticPool
+import json
 import os
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from modules.metrics import timed
 
 Base = declarative_base()
 
+# Connection pool for server databases (PostgreSQL, MySQL, ...). SQLite
+# files get a pool too, but the database itself allows one writer at a time.
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv('DB_POOL_RECYCLE_SECONDS', '1800'))
+# Seconds a SQLite writer waits for the lock before failing
+SQLITE_BUSY_TIMEOUT_SECONDS = float(os.getenv('SQLITE_BUSY_TIMEOUT_SECONDS', '30'))
+
+# Codec for stored transcripts and analyses: zstd (needs the zstandard
+# package; falls back to zlib without it), zlib or none. Values shorter than
+# COMPRESS_MIN_BYTES are stored as they are. Rows written with any codec stay
+# readable after a change.
+RESULT_COMPRESSION = os.getenv('RESULT_COMPRESSION', 'zstd' if zstandard else 'zlib')
+COMPRESS_MIN_BYTES = 256
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+
+# Stored values start with one byte naming their codec
+_RAW, _ZLIB, _ZSTD = b'\x00', b'\x01', b'\x02'
+
+def _compress(data):
+    if len(data) < COMPRESS_MIN_BYTES or RESULT_COMPRESSION == 'none':
+        return _RAW + data
+    if RESULT_COMPRESSION == 'zstd' and zstandard is not None:
+        return _ZSTD + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return _ZLIB + zlib.compress(data, ZLIB_LEVEL)
+
+def _decompress(value):
+    codec, data = value[:1], value[1:]
+    if codec == _ZSTD:
+        if zstandard is None:
+            raise RuntimeError(
+                'Result was stored with zstd; install the zstandard package to read it'
+            )
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == _ZLIB:
+        return zlib.decompress(data)
+    return data
+
+class _Compressed(TypeDecorator):
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):  # noqa: ARG002
+        return None if value is None else _compress(self.encode(value))
+
+    def process_result_value(self, value, dialect):  # noqa: ARG002
+        if value is None:
+            return None
+        if isinstance(value, str):
+            # Written as text, before values were compressed
+            return self.decode(value.encode('utf-8'))
+        return self.decode(_decompress(bytes(value)))
+
+class CompressedText(_Compressed):
+    """String column stored compressed."""
+    cache_ok = True
+
+    def encode(self, value):
+        return value.encode('utf-8')
+
+    def decode(self, data):
+        return data.decode('utf-8')
+
+class CompressedJSON(_Compressed):
+    """JSON column stored compressed. Values cannot be queried in SQL."""
+    cache_ok = True
+
+    def encode(self, value):
+        return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+    def decode(self, data):
+        return json.loads(data)
+
 class Result(Base):
     __tablename__ = 'results'
+    # Keyset pagination walks (created_at, id), optionally within one filename
+    __table_args__ = (
+        Index('ix_results_created_at_id', 'created_at', 'id'),
+        Index('ix_results_filename_created_at_id', 'filename', 'created_at', 'id'),
+        Index('ix_results_batch_key_filename', 'batch_key', 'filename'),
+    )
 
     id = Column(Integer, primary_key=True)
     filename = Column(String)
-    transcript = Column(String)
-    analysis = Column(JSON)
+    transcript = Column(CompressedText)
+    analysis = Column(CompressedJSON)
+    created_at = Column(Float, default=time.time)
+    # Set by batch_analysis runs, which resume by it; None for uploads
+    batch_key = Column(String)
+
+# Fields list_results can return, and those it returns by default
+RESULT_FIELDS = ('id', 'filename', 'created_at', 'transcript', 'analysis')
+DEFAULT_LIST_FIELDS = ('id', 'filename', 'created_at')
+# File names per query when looking up processed batch calls
+FILENAME_LOOKUP_CHUNK = 500
+
+class CacheEntry(Base):
+    __tablename__ = 'result_cache'
+
+    key = Column(String, primary_key=True)
+    payload = Column(JSON)
+    size = Column(Integer)
+    created_at = Column(Float, index=True)
+    last_accessed = Column(Float, index=True)
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+def _sqlite_pragmas(dbapi_connection, _connection_record):
+    # WAL lets readers proceed while a write is in progress, and NORMAL
+    # sync is durable in WAL mode except against power loss
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+def _create_engine(url):
+    if url.startswith('sqlite'):
+        connect_args = {
+            'check_same_thread': False,
+            'timeout': SQLITE_BUSY_TIMEOUT_SECONDS,
+        }
+        if url in ('sqlite://', 'sqlite:///:memory:'):
+            # Every connection to :memory: is a separate database; share one
+            return create_engine(url, connect_args=connect_args, poolclass=StaticPool)
+        engine = create_engine(
+            url,
+            connect_args=connect_args,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+        )
+        event.listen(engine, 'connect', _sqlite_pragmas)
+        return engine
+    return create_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                         pool_recycle=DB_POOL_RECYCLE_SECONDS, pool_pre_ping=True)
+
+def _migrate(engine):
+    # create_all only creates missing tables; add what older databases lack
+    columns = {
+        column['name']: column['type']
+        for column in inspect(engine).get_columns('results')
+    }
+    if 'created_at' not in columns:
+        with engine.begin() as connection:
+            connection.execute(text('ALTER TABLE results ADD COLUMN created_at FLOAT'))
+            # Rows from before created_at sort as the oldest
+            connection.execute(text('UPDATE results SET created_at = 0'))
+    if 'batch_key' not in columns:
+        with engine.begin() as connection:
+            connection.execute(text('ALTER TABLE results ADD COLUMN batch_key VARCHAR'))
+    # Before compression transcript and analysis were text columns. SQLite
+    # stores bytes in them as they are, and text values still read back.
+    text_columns = [
+        name for name in ('transcript', 'analysis') if not _is_binary(columns[name])
+    ]
+    if text_columns and engine.dialect.name != 'sqlite':
+        _convert_to_binary(engine, text_columns)
+    for index in Result.__table__.indexes:
+        index.create(engine, checkfirst=True)
+
+def _is_binary(column_type):
+    try:
+        return column_type.python_type is bytes
+    except NotImplementedError:
+        return False
+
+def _convert_to_binary(engine, names):
+    if engine.dialect.name != 'postgresql':
+        raise RuntimeError(
+            f"The results columns {', '.join(names)} must be converted to a binary "
+            f"type before this version can use the {engine.dialect.name} database: "
+            "store each value as its UTF-8 text prefixed by a 0x00 byte"
+        )
+    with engine.begin() as connection:
+        for name in names:
+            # The leading 0x00 marks the existing values as uncompressed
+            connection.execute(text(
+                f"ALTER TABLE results ALTER COLUMN {name} TYPE BYTEA "
+                f"USING decode('00', 'hex') || convert_to({name}::text, 'UTF8')"
+            ))
+
+def get_engine():
+    """
+    :return: The engine for DATABASE_URL, created, and its schema brought up
+        to date, on first use
+    """
+    url = os.getenv('DATABASE_URL', 'sqlite:///empathy_analyzer.db')
+    with _engines_lock:
+        if url not in _engines:
+            engine = _create_engine(url)
+            Base.metadata.create_all(engine)
+            _migrate(engine)
+            _engines[url] = engine
+        return _engines[url]
+
+def dispose_engines():
+    """
+    Drop the pooled connections a forked process inherited, so it opens its
+    own. The parent's connections are left open for the parent.
+    """
+    # No lock: it may have been held by another thread at the fork
+    for engine in list(_engines.values()):
+        engine.dispose(close=False)
 
 def get_db():
-    DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///empathy_analyzer.db')
-    engine = create_engine(DATABASE_URL)
-    Base.metadata.create_all(engine)
-    Session = sessionmaker(bind=engine)
-    return Session()
+    """
+    :return: A scoped_session. It is used like a Session, but each thread
+        gets its own session, so one registry can be shared by every request,
+        job and pipeline stage. Call ``remove()`` when a thread's unit of
+        work is done to release its session.
+    """
+    # Objects stay readable after commit without a refresh query
+    return scoped_session(sessionmaker(bind=get_engine(), expire_on_commit=False))
 
+def _commit(db):
+    # A failed commit leaves the session unusable until rolled back
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+@timed('db.save')
 def save_result(db, filename, transcript, analysis):
     result = Result(filename=filename, transcript=transcript, analysis=analysis)
     db.add(result)
-    db.commit()
+    _commit(db)
     return result.id
 
 def get_result(db, result_id):
-    return db.query(Result).filter(Result.id == result_id).first()
\ No newline at end of file
+    return db.query(Result).filter(Result.id == result_id).first()
+
+@timed('db.save')
+def save_results(db, results):
+    """
+    Insert many results with one multi-row INSERT per batch of rows and a
+    single commit.
+
+    :param results: Iterable of dicts with filename, transcript and analysis
+        keys, and optionally batch_key
+    :return: Ids of the inserted rows, in order
+    """
+    now = time.time()
+    rows = [
+        {
+            'filename': r['filename'],
+            'transcript': r['transcript'],
+            'analysis': r['analysis'],
+            'created_at': now,
+            'batch_key': r.get('batch_key'),
+        }
+        for r in results
+    ]
+    if not rows:
+        return []
+    if not db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        # Without RETURNING for multi-row inserts, ids come from the ORM
+        objects = [Result(**row) for row in rows]
+        db.add_all(objects)
+        _commit(db)
+        return [row.id for row in objects]
+    try:
+        ids = db.scalars(
+            insert(Result).returning(Result.id, sort_by_parameter_order=True), rows
+        ).all()
+    except Exception:
+        db.rollback()
+        raise
+    _commit(db)
+    return list(ids)
+
+def update_analyses(db, updates):
+    """
+    Merge new keys into the analysis of existing results, in a single commit.
+
+    :param updates: Dict of result id to a dict of analysis keys to set
+    :return: Number of rows updated
+    """
+    rows = db.query(Result).filter(Result.id.in_(list(updates))).all()
+    for row in rows:
+        # Assign a new dict so the JSON column is marked as changed
+        row.analysis = {**(row.analysis or {}), **updates[row.id]}
+    _commit(db)
+    return len(rows)
+
+def get_processed_filenames(db, filenames, batch_key):
+    """
+    :param filenames: File names to look up
+    :param batch_key: Only count results saved under this batch key
+    :return: Set of those file names that have a result with ``batch_key``
+    """
+    filenames = list(filenames)
+    done = set()
+    # Bounded IN lists stay under the database's bound parameter limit
+    for start in range(0, len(filenames), FILENAME_LOOKUP_CHUNK):
+        chunk = filenames[start:start + FILENAME_LOOKUP_CHUNK]
+        done.update(
+            filename
+            for (filename,) in db.query(Result.filename).filter(
+                Result.batch_key == batch_key, Result.filename.in_(chunk)
+            )
+        )
+    return done
+
+def list_results(
+    db,
+    fields=DEFAULT_LIST_FIELDS,
+    since=None,
+    until=None,
+    filename=None,
+    after=None,
+    limit=50,
+):
+    """
+    One page of results, newest first. Pages are found by keyset instead of
+    offset, so every page costs the same however far into the history it is.
+    Only the requested columns are read; lists that leave out transcript and
+    analysis never load or decompress them.
+
+    :param fields: Names from RESULT_FIELDS
+    :param since: Earliest created_at to include, in epoch seconds
+    :param until: Only include results created before this, in epoch seconds
+    :param filename: Only include results for this file name
+    :param after: Cursor returned with the previous page
+    :param limit: Page size
+    :return: Tuple of the rows as dicts, and the cursor for the next page,
+        or None on the last page
+    """
+    unknown = set(fields) - set(RESULT_FIELDS)
+    if unknown:
+        raise ValueError(f'Unknown result fields: {", ".join(sorted(unknown))}')
+    # created_at and id are always read: they make up the cursor
+    query = select(
+        Result.created_at, Result.id, *[getattr(Result, field) for field in fields]
+    )
+    if filename is not None:
+        query = query.where(Result.filename == filename)
+    if since is not None:
+        query = query.where(Result.created_at >= since)
+    if until is not None:
+        query = query.where(Result.created_at < until)
+    if after is not None:
+        # A row value comparison, unlike the equivalent OR, is a single
+        # range on the (created_at, id) index
+        query = query.where(tuple_(Result.created_at, Result.id) < tuple_(*after))
+    rows = db.execute(
+        query.order_by(Result.created_at.desc(), Result.id.desc()).limit(limit + 1)
+    ).all()
+
+    page = [dict(zip(fields, row[2:], strict=True)) for row in rows[:limit]]
+    cursor = tuple(rows[limit - 1][:2]) if len(rows) > limit else None
+    return page, cursor
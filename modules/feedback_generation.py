@@ -1,19 +1,27 @@
 import json
+from modules.llm_integration import LLMAnalysis
 from modules.logger import setup_logger
+from modules.metrics import timed
 
 logger = setup_logger('feedback_generation_logger', 'logs/feedback_generation.log')
 
+@timed('feedback')
 def generate_feedback(analysis_result):
     """
     Generate user-friendly feedback based on the analysis results.
 
-    :param analysis_result: Dict containing the results of audio and text analysis, or a JSON string
+    :param analysis_result: LLMAnalysis, dict containing the results of audio and
+        text analysis, or a JSON string
     :return: Dict containing feedback messages
     """
     logger.info("Starting feedback generation")
     feedback = {}
 
     try:
+        # Already validated; no parsing needed
+        if isinstance(analysis_result, LLMAnalysis):
+            analysis_result = analysis_result.to_dict()
+
         # Check if analysis_result is a string, if so, try to parse it as JSON
         if isinstance(analysis_result, str):
             try:
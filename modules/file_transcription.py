@@ -1,36 +1,95 @@
-import os
+import asyncio
 import logging
-from deepgram import DeepgramClient, FileSource, PrerecordedOptions
+from deepgram import FileSource, PrerecordedOptions
 from dotenv import load_dotenv
+from modules import clients
+from modules.metrics import timed
 
 # Load environment variables from .env file
 load_dotenv()
 
-DEEPGRAM_API_KEY = os.environ['DEEPGRAM_API_KEY']
+# Prerecorded transcription settings; part of the result cache key, so
+# changing them invalidates cached transcripts
+TRANSCRIPTION_OPTIONS = {
+    'model': 'nova-2',
+    'smart_format': True,
+    'punctuate': True,
+}
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-def transcribe_file(file):
-    deepgram = DeepgramClient(DEEPGRAM_API_KEY)
+# Size of the reads when streaming a file to Deepgram asynchronously
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
-    payload: FileSource = {
-        'buffer': file.read(),
-        'mimetype': file.content_type
-    }
+def transcribe_file(file, mimetype=None):
+    """
+    :param file: Binary file object positioned at the start of the audio; it
+        is streamed to Deepgram rather than read into memory
+    :param mimetype: Audio MIME type; defaults to ``file.content_type``
+    """
+    deepgram = clients.get_deepgram_client()
+    mimetype = mimetype or file.content_type
+    options = PrerecordedOptions(**TRANSCRIPTION_OPTIONS)
+    start = file.tell()
 
-    options = PrerecordedOptions(
-        model="nova-2",
-        smart_format=True,
-        punctuate = True,
-    )
+    def send():
+        # Rewind so a retried request sends the whole file again
+        file.seek(start)
+        return deepgram.listen.rest.v("1").transcribe_file(
+            _payload(file, mimetype),
+            options,
+            timeout=clients.DEEPGRAM_TIMEOUT,
+            transport=clients.deepgram_transport(),
+        )
 
     try:
-        response = deepgram.listen.prerecorded.v("1").transcribe_file(payload, options)
-        
-        return response["results"]["channels"][0]["alternatives"][0]["transcript"]
+        with timed('transcription'):
+            response = clients.call_with_retries(clients.DEEPGRAM, send)
+        return _transcript(response)
 
     except Exception as e:
         logger.error(f"Exception in transcribe_file: {e}")
-        logger.info(f"Deepgram API response: {response}")
         raise
+
+async def transcribe_file_async(file, mimetype=None):
+    deepgram = clients.get_async_deepgram_client()
+    mimetype = mimetype or file.content_type
+    options = PrerecordedOptions(**TRANSCRIPTION_OPTIONS)
+    start = file.tell()
+
+    async def send():
+        file.seek(start)
+        return await deepgram.listen.asyncrest.v("1").transcribe_file(
+            _payload(_read_chunks(file), mimetype),
+            options,
+            timeout=clients.DEEPGRAM_TIMEOUT,
+            transport=clients.async_deepgram_transport(),
+        )
+
+    try:
+        with timed('transcription'):
+            response = await clients.acall_with_retries(clients.DEEPGRAM, send)
+        return _transcript(response)
+
+    except Exception as e:
+        logger.error(f"Exception in transcribe_file_async: {e}")
+        raise
+
+async def _read_chunks(file):
+    # The async HTTP client needs an async iterable; reads happen off the loop
+    while True:
+        chunk = await asyncio.to_thread(file.read, UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+def _payload(stream, mimetype):
+    payload: FileSource = {
+        'stream': stream,
+        'mimetype': mimetype
+    }
+    return payload
+
+def _transcript(response):
+    return response["results"]["channels"][0]["alternatives"][0]["transcript"]
@@ -0,0 +1,158 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at its pending limit."""
+
+
+class Job:
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = QUEUED
+        self.stage = None
+        self.progress = 0.0
+        # Fields of the result reported before it is complete
+        self.partial = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': self.progress,
+            'partial': self.partial,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    In-process job queue backed by a bounded thread pool.
+
+    Jobs are callables taking a ``report(stage, progress, partial)`` function
+    as their first argument; ``partial`` is an optional dict of result fields
+    that are already known. Submissions beyond ``max_pending`` queued-or-running
+    jobs are rejected with QueueFullError so callers can shed load. Finished
+    jobs are kept for polling until ``history`` newer jobs have finished.
+
+    :param max_workers: Number of jobs processed concurrently
+    :param max_pending: Maximum number of queued plus running jobs
+    :param history: Number of finished jobs retained for status lookups
+    """
+
+    def __init__(self, max_workers=2, max_pending=16, history=1000):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.history = history
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='job'
+        )
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._finished = OrderedDict()
+        self._counters = {'submitted': 0, 'rejected': 0, 'completed': 0, 'failed': 0}
+        self._wait_time = 0.0
+        self._run_time = 0.0
+
+    def submit(self, fn, *args, on_update=None):
+        """
+        Queue ``fn(report, *args)`` for execution.
+
+        :param on_update: Optional callback invoked with the Job on every
+            progress report and on completion or failure
+        :return: The queued Job
+        :raises QueueFullError: If max_pending jobs are already queued or running
+        """
+        with self._lock:
+            if len(self._jobs) >= self.max_pending:
+                self._counters['rejected'] += 1
+                raise QueueFullError(
+                    f'Job queue is full ({self.max_pending} pending jobs)'
+                )
+            job = Job(uuid.uuid4().hex)
+            self._jobs[job.id] = job
+            self._counters['submitted'] += 1
+
+        self._executor.submit(self._run, job, fn, args, on_update)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id) or self._finished.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.status == RUNNING)
+            finished = self._counters['completed'] + self._counters['failed']
+            return {
+                'queue_depth': len(self._jobs) - running,
+                'running': running,
+                'max_pending': self.max_pending,
+                'workers': self.max_workers,
+                **self._counters,
+                'avg_wait_seconds': self._wait_time / finished if finished else 0.0,
+                'avg_run_seconds': self._run_time / finished if finished else 0.0,
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job, fn, args, on_update):
+        def report(stage, progress=None, partial=None):
+            job.stage = stage
+            if progress is not None:
+                job.progress = progress
+            if partial:
+                job.partial = {**job.partial, **partial}
+            self._notify(job, on_update)
+
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = fn(report, *args)
+            job.status = COMPLETED
+            job.progress = 1.0
+        except Exception as e:
+            logger.error(f'Job {job.id} failed: {str(e)}')
+            job.error = str(e)
+            job.status = FAILED
+        job.finished_at = time.time()
+
+        with self._lock:
+            self._jobs.pop(job.id, None)
+            self._finished[job.id] = job
+            while len(self._finished) > self.history:
+                self._finished.popitem(last=False)
+            self._counters[job.status] += 1
+            self._wait_time += job.started_at - job.created_at
+            self._run_time += job.finished_at - job.started_at
+        self._notify(job, on_update)
+
+    def _notify(self, job, on_update):
+        if on_update is None:
+            return
+        try:
+            on_update(job)
+        except Exception as e:
+            logger.error(f'Error delivering update for job {job.id}: {str(e)}')
@@ -0,0 +1,252 @@
+import bisect
+import collections
+import math
+import re
+import threading
+import time
+
+from modules import models
+from modules.text_analysis import EMOTION_BUCKETS, emotion_bucket
+from modules.voice_activity import MIN_PAUSE_SECONDS
+
+DEFAULT_WINDOW_SECONDS = 60.0
+DEFAULT_MIN_INTERVAL = 1.0
+
+WORD_PATTERN = re.compile(r'[^\W_]+')
+SENTENCE_PATTERN = re.compile(r'[^.!?]+[.!?]*')
+
+_Segment = collections.namedtuple(
+    '_Segment',
+    'start end intervals word_count content_words emotions compound_sum '
+    'lead_pause pauses',
+)
+
+
+def _segment_pauses(intervals, speech_end):
+    """
+    Pauses before and within a segment's speech intervals, found as
+    voice_activity.interval_features finds them: gaps of at least
+    MIN_PAUSE_SECONDS after the latest end so far.
+
+    :param speech_end: Latest interval end before the segment, or None
+    :return: (pause before the first interval or None, pauses within the
+        segment, latest interval end including the segment)
+    """
+    gaps = []
+    for start, end in intervals:
+        gaps.append(
+            start - speech_end
+            if speech_end is not None and start - speech_end >= MIN_PAUSE_SECONDS
+            else None
+        )
+        speech_end = end if speech_end is None else max(speech_end, end)
+    return gaps[0], [gap for gap in gaps[1:] if gap is not None], speech_end
+
+
+def _percentile(values, q):
+    # np.percentile's linear interpolation, over a sorted list
+    position = (len(values) - 1) * q / 100
+    low = math.floor(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+class LiveAnalyzer:
+    """
+    Rolling coaching metrics over the last ``window_seconds`` of a live call:
+    sentiment, emotion counts as in analyze_emotions, lexical diversity, and
+    the pause, speaking ratio and speech rate features of recorded audio,
+    computed from word timings.
+
+    Each finalized transcript segment is tokenized and scored once on arrival
+    and the window totals are adjusted as segments enter and leave it, so an
+    update costs O(new tokens) however long the call has been running. The
+    pauses in the window are kept sorted, so their median and 90th
+    percentile are read off directly.
+    Updates are returned at most once every ``min_interval`` seconds.
+
+    :param window_seconds: Length of the sliding window, in audio seconds
+    :param min_interval: Minimum wall-clock seconds between returned updates
+    :param clock: Monotonic clock, replaceable for tests
+    """
+
+    def __init__(
+        self,
+        window_seconds=DEFAULT_WINDOW_SECONDS,
+        min_interval=DEFAULT_MIN_INTERVAL,
+        clock=time.monotonic,
+    ):
+        self.window_seconds = window_seconds
+        self.min_interval = min_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._segments = collections.deque()
+        self._word_count = 0
+        self._content_counts = collections.Counter()
+        self._content_total = 0
+        self._emotions = dict.fromkeys(EMOTION_BUCKETS, 0)
+        self._compound_sum = 0.0
+        # Latest word end so far, and the pauses in the window (sorted)
+        self._speech_end = None
+        self._pauses = []
+        self._pause_sum = 0.0
+        self._last_update = None
+        self._pending = False
+
+    def add_segment(self, text, start, end, word_times=None):
+        """
+        Add a finalized transcript segment.
+
+        :param text: Segment transcript
+        :param start: Segment start, in seconds from the start of the stream
+        :param end: Segment end, in seconds from the start of the stream
+        :param word_times: (start, end) of each word, if known; pauses inside the
+            segment are only seen with them
+        :return: A snapshot() dict if an update is due, otherwise None
+        """
+        sia, stop_words = models.sentiment_analyzer.get(), models.stop_words.get()
+        words = [w.lower() for w in WORD_PATTERN.findall(text)]
+        compounds = sia.score(
+            [s for s in SENTENCE_PATTERN.findall(text) if s.strip()]
+        ).compound.tolist()
+        segment = _Segment(
+            start=start,
+            end=end,
+            intervals=word_times or [(start, end)],
+            word_count=len(words),
+            content_words=[w for w in words if w not in stop_words],
+            emotions=[emotion_bucket(c) for c in compounds],
+            compound_sum=sum(compounds),
+            lead_pause=None,
+            pauses=(),
+        )
+
+        with self._lock:
+            self._add(segment)
+            while self._segments[0].end <= end - self.window_seconds:
+                self._remove(self._segments[0])
+            self._pending = True
+
+            now = self._clock()
+            if (
+                self._last_update is not None
+                and now - self._last_update < self.min_interval
+            ):
+                return None
+            self._last_update = now
+            self._pending = False
+            return self._snapshot()
+
+    def flush(self):
+        """
+        :return: A snapshot() dict if segments arrived since the last update,
+            otherwise None
+        """
+        with self._lock:
+            if not self._pending:
+                return None
+            self._last_update = self._clock()
+            self._pending = False
+            return self._snapshot()
+
+    def poll(self):
+        """
+        Trailing edge of the throttle; call periodically.
+
+        :return: A snapshot() dict if an update was held back and min_interval has
+            since passed, otherwise None
+        """
+        with self._lock:
+            if (
+                not self._pending
+                or self._clock() - self._last_update < self.min_interval
+            ):
+                return None
+            self._last_update = self._clock()
+            self._pending = False
+            return self._snapshot()
+
+    def snapshot(self):
+        with self._lock:
+            return self._snapshot()
+
+    def _add(self, segment):
+        lead_pause, pauses, self._speech_end = _segment_pauses(
+            segment.intervals, self._speech_end
+        )
+        segment = segment._replace(lead_pause=lead_pause, pauses=pauses)
+        # The pause before the first segment of the window is not in it
+        if self._segments and lead_pause is not None:
+            self._add_pause(lead_pause)
+        for pause in pauses:
+            self._add_pause(pause)
+        self._segments.append(segment)
+        self._word_count += segment.word_count
+        self._content_counts.update(segment.content_words)
+        self._content_total += len(segment.content_words)
+        for bucket in segment.emotions:
+            self._emotions[bucket] += 1
+        self._compound_sum += segment.compound_sum
+
+    def _remove(self, segment):
+        self._segments.popleft()
+        self._word_count -= segment.word_count
+        for word in segment.content_words:
+            self._content_counts[word] -= 1
+            if not self._content_counts[word]:
+                del self._content_counts[word]
+        self._content_total -= len(segment.content_words)
+        for bucket in segment.emotions:
+            self._emotions[bucket] -= 1
+        self._compound_sum -= segment.compound_sum
+        for pause in segment.pauses:
+            self._remove_pause(pause)
+        # The pause before the new first segment is no longer in the window
+        if self._segments and self._segments[0].lead_pause is not None:
+            self._remove_pause(self._segments[0].lead_pause)
+
+    def _add_pause(self, pause):
+        bisect.insort(self._pauses, pause)
+        self._pause_sum += pause
+
+    def _remove_pause(self, pause):
+        del self._pauses[bisect.bisect_left(self._pauses, pause)]
+        # Start again from zero rather than carry rounding errors
+        self._pause_sum = self._pause_sum - pause if self._pauses else 0.0
+
+    def _activity_features(self):
+        # voice_activity.activity_features of the window's word timings
+        duration = (
+            self._speech_end - self._segments[0].intervals[0][0]
+            if self._segments
+            else 0.0
+        )
+        speaking = duration - self._pause_sum
+        pauses = self._pauses
+        return {
+            'pause_count': len(pauses),
+            'pause_duration_mean': self._pause_sum / len(pauses) if pauses else 0.0,
+            'pause_duration_median': _percentile(pauses, 50) if pauses else 0.0,
+            'pause_duration_p90': _percentile(pauses, 90) if pauses else 0.0,
+            'speaking_ratio': speaking / duration if duration > 0 else 0.0,
+            # Speech rate and articulation rate are in words per minute
+            'speech_rate': self._word_count / duration * 60 if duration > 0 else 0.0,
+            'articulation_rate': self._word_count / speaking * 60
+            if speaking > 0
+            else 0.0,
+        }
+
+    def _snapshot(self):
+        sentence_count = sum(self._emotions.values())
+        return {
+            "window_seconds": self.window_seconds,
+            "window_start": self._segments[0].start if self._segments else 0.0,
+            "window_end": self._segments[-1].end if self._segments else 0.0,
+            "word_count": self._word_count,
+            "sentiment": self._compound_sum / sentence_count if sentence_count else 0.0,
+            "emotion_analysis": dict(self._emotions),
+            "lexical_diversity": len(self._content_counts) / self._content_total
+            if self._content_total
+            else 0,
+            **self._activity_features(),
+        }
@@ -0,0 +1,327 @@
+import logging
+import threading
+import time
+
+from modules import realtime_transcription
+from modules.live_analysis import LiveAnalyzer
+
+logger = logging.getLogger(__name__)
+
+# Audio is forwarded once this much is buffered, or after FLUSH_INTERVAL
+COALESCE_BYTES = 16 * 1024
+FLUSH_INTERVAL = 0.1
+# Chunks are dropped while more than this is waiting to be sent
+MAX_QUEUED_BYTES = 1024 * 1024
+IDLE_TIMEOUT = 30.0
+MAX_SESSIONS = 500
+# Seconds a closing session waits for its sender to finish forwarding
+SENDER_CLOSE_TIMEOUT = 2.0
+
+
+class SessionLimitError(Exception):
+    """Raised when a live session is started while max_sessions are active."""
+
+
+class LiveSession:
+    def __init__(self, sid, emit, connection, analyzer, now):
+        self.sid = sid
+        self.emit = emit
+        self.connection = connection
+        self.analyzer = analyzer
+        self.started_at = now
+        self.last_activity = now
+        self.buffer = bytearray()
+        self.buffered_since = None
+        self.overflowing = False
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.bytes_dropped = 0
+        self.sends = 0
+        # Bytes taken from the buffer by the sender and not yet sent
+        self.in_flight = 0
+        self.flush_requested = False
+        self.closing = False
+        # Guards the buffer; the sender thread waits on wakeup for audio to forward
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.sender = None
+
+    @property
+    def queued_bytes(self):
+        return len(self.buffer) + self.in_flight
+
+
+class LiveSessionManager:
+    """
+    Owns the live transcription connections, one per Socket.IO session.
+
+    Small audio chunks are coalesced and forwarded once ``coalesce_bytes`` are
+    buffered or the oldest buffered chunk is ``flush_interval`` seconds old.
+    Each session forwards its audio from its own sender thread, so a slow
+    connection never blocks the Socket.IO handlers. While more than
+    ``max_queued_bytes`` are buffered or being sent, new chunks are dropped and
+    the client is sent ``transcription_backpressure``.
+    Sessions without audio for ``idle_timeout`` seconds are closed by sweep(),
+    which run_reaper() calls in the background. Closing waits at most
+    ``close_timeout`` seconds for the sender; a sender stuck in a send is
+    abandoned and the rest of its audio dropped.
+
+    :param connect: Callable ``connect(emit, analyzer)`` returning a connection
+        with ``send(bytes)``; defaults to realtime_transcription
+    :param disconnect: Callable closing a connection
+    :param max_sessions: Maximum number of concurrent sessions
+    """
+
+    def __init__(
+        self,
+        connect=None,
+        disconnect=None,
+        max_sessions=MAX_SESSIONS,
+        coalesce_bytes=COALESCE_BYTES,
+        flush_interval=FLUSH_INTERVAL,
+        max_queued_bytes=MAX_QUEUED_BYTES,
+        idle_timeout=IDLE_TIMEOUT,
+        analyzer_factory=LiveAnalyzer,
+        clock=time.monotonic,
+        close_timeout=SENDER_CLOSE_TIMEOUT,
+    ):
+        self.connect = connect or realtime_transcription.start_realtime_transcription
+        self.disconnect = (
+            disconnect or realtime_transcription.stop_realtime_transcription
+        )
+        self.max_sessions = max_sessions
+        self.coalesce_bytes = coalesce_bytes
+        self.flush_interval = flush_interval
+        self.max_queued_bytes = max_queued_bytes
+        self.idle_timeout = idle_timeout
+        self.analyzer_factory = analyzer_factory
+        self.close_timeout = close_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._starting = 0
+        self._stopped = threading.Event()
+        self._counters = {
+            'started': 0, 'finished': 0, 'timed_out': 0, 'rejected': 0,
+            'bytes_received': 0, 'bytes_sent': 0, 'bytes_dropped': 0, 'sends': 0,
+        }
+
+    def start(self, sid, emit):
+        """
+        Open a connection for ``sid``, replacing any session it already has.
+
+        :param emit: Callable ``emit(event, data)`` delivering events to the client
+        :raises SessionLimitError: If max_sessions sessions are active
+        """
+        with self._lock:
+            if (
+                len(self._sessions) + self._starting >= self.max_sessions
+                and sid not in self._sessions
+            ):
+                self._counters['rejected'] += 1
+                raise SessionLimitError(
+                    f'Live session limit reached ({self.max_sessions} sessions)'
+                )
+            self._starting += 1
+
+        try:
+            analyzer = self.analyzer_factory()
+            connection = self.connect(emit, analyzer)
+        finally:
+            with self._lock:
+                self._starting -= 1
+
+        session = LiveSession(sid, emit, connection, analyzer, self._clock())
+        session.sender = threading.Thread(
+            target=self._run_sender,
+            args=(session,),
+            name=f'live-sender-{sid}',
+            daemon=True,
+        )
+        session.sender.start()
+        with self._lock:
+            previous = self._sessions.pop(sid, None)
+            self._sessions[sid] = session
+            self._counters['started'] += 1
+        if previous is not None:
+            self._close(previous)
+        return session
+
+    def send(self, sid, chunk):
+        """
+        Queue an audio chunk for ``sid``.
+
+        :return: False if there is no session or the chunk was dropped
+        """
+        session = self._sessions.get(sid)
+        if session is None:
+            return False
+
+        now = self._clock()
+        with session.lock:
+            session.last_activity = now
+            session.bytes_received += len(chunk)
+            if session.queued_bytes + len(chunk) > self.max_queued_bytes:
+                session.bytes_dropped += len(chunk)
+                notify = not session.overflowing
+                session.overflowing = True
+            else:
+                notify = False
+                session.overflowing = False
+                session.buffer += chunk
+                if session.buffered_since is None:
+                    session.buffered_since = now
+                if len(session.buffer) >= self.coalesce_bytes:
+                    session.wakeup.notify()
+            queued = session.queued_bytes
+            accepted = not session.overflowing
+
+        if notify:
+            logger.warning(f'Dropping audio for session {sid}: {queued} bytes queued')
+            session.emit('transcription_backpressure', {'queued_bytes': queued})
+        return accepted
+
+    def finish(self, sid):
+        """
+        Flush and close the session for ``sid``.
+
+        :return: False if there was no session
+        """
+        with self._lock:
+            session = self._sessions.pop(sid, None)
+        if session is None:
+            return False
+        self._close(session)
+        return True
+
+    def sweep(self):
+        """
+        Forward audio that has waited flush_interval, send analysis updates the
+        analyzer's throttle held back and close idle sessions.
+        """
+        now = self._clock()
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            if now - session.last_activity >= self.idle_timeout:
+                with self._lock:
+                    if self._sessions.get(session.sid) is not session:
+                        continue
+                    del self._sessions[session.sid]
+                    self._counters['timed_out'] += 1
+                logger.info(f'Closing idle live session {session.sid}')
+                self._close(session)
+                session.emit('transcription_stopped', {'reason': 'timeout'})
+            else:
+                if (
+                    session.buffered_since is not None
+                    and now - session.buffered_since >= self.flush_interval
+                ):
+                    self._flush(session)
+                update = session.analyzer.poll()
+                if update is not None:
+                    session.emit('live_analysis', update)
+
+    def run_reaper(self):
+        """
+        Call sweep() every flush_interval until close(); run in a background thread.
+        """
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f'Error sweeping live sessions: {str(e)}')
+
+    def close(self):
+        self._stopped.set()
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            self._close(session)
+
+    def stats(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            counters = dict(self._counters)
+        for session in sessions:
+            counters['bytes_received'] += session.bytes_received
+            counters['bytes_sent'] += session.bytes_sent
+            counters['bytes_dropped'] += session.bytes_dropped
+            counters['sends'] += session.sends
+        return {
+            'active_sessions': len(sessions),
+            'queued_bytes': sum(session.queued_bytes for session in sessions),
+            'max_sessions': self.max_sessions,
+            **counters,
+        }
+
+    def _flush(self, session):
+        with session.lock:
+            session.flush_requested = True
+            session.wakeup.notify()
+
+    def _run_sender(self, session):
+        """
+        Forward the session's audio in arrival order until it is closed and drained.
+        """
+        while True:
+            with session.lock:
+                while not (
+                    session.closing
+                    or session.flush_requested
+                    or len(session.buffer) >= self.coalesce_bytes
+                ):
+                    session.wakeup.wait()
+                data = bytes(session.buffer)
+                session.buffer.clear()
+                session.buffered_since = None
+                session.flush_requested = False
+                session.in_flight = len(data)
+                if not data and session.closing:
+                    return
+            if not data:
+                continue
+            try:
+                session.connection.send(data)
+            except Exception as e:
+                logger.error(f'Error sending audio for session {session.sid}: {str(e)}')
+                session.bytes_dropped += len(data)
+            else:
+                session.bytes_sent += len(data)
+                session.sends += 1
+            with session.lock:
+                session.in_flight = 0
+
+    def _close(self, session):
+        # The sender forwards what is still buffered before it exits
+        with session.lock:
+            session.closing = True
+            session.wakeup.notify()
+        session.sender.join(self.close_timeout)
+        if session.sender.is_alive():
+            # Stuck in connection.send; it exits once that returns, and the
+            # disconnect below usually makes it return
+            with session.lock:
+                session.bytes_dropped += len(session.buffer)
+                session.buffer.clear()
+            logger.warning(
+                f'Sender of live session {session.sid} did not finish within '
+                f'{self.close_timeout}s; dropping its remaining audio'
+            )
+        try:
+            self.disconnect(session.connection)
+        except Exception as e:
+            logger.error(f'Error closing live session {session.sid}: {str(e)}')
+
+        # Deliver whatever the analyzer's throttle held back
+        update = session.analyzer.flush()
+        if update is not None:
+            session.emit('live_analysis', update)
+
+        with self._lock:
+            self._counters['finished'] += 1
+            self._counters['bytes_received'] += session.bytes_received
+            self._counters['bytes_sent'] += session.bytes_sent
+            self._counters['bytes_dropped'] += session.bytes_dropped
+            self._counters['sends'] += session.sends
@@ -1,123 +1,445 @@
+import collections
 import json
+import logging
+import os
+import threading
+import time
 
-from anthropic import Anthropic
+from modules import clients, prompt_builder
+from modules.metrics import timed
 
+logger = logging.getLogger(__name__)
 
-def analyze_with_llm(integrated_data):
-    client = Anthropic()
-    #print(integrated_data)
+MODEL = "claude-3-5-sonnet-20240620"
+TEMPERATURE = 0.7
+# Output budget; the JSON analysis is usually a few hundred tokens
+MAX_TOKENS = int(os.getenv('LLM_MAX_OUTPUT_TOKENS', '1000'))
+# Estimated prompt tokens allowed before the transcript is shortened
+INPUT_TOKEN_BUDGET = int(os.getenv('LLM_INPUT_TOKEN_BUDGET', '4000'))
 
+# Message Batches API limit on requests per batch
+MAX_BATCH_REQUESTS = 100000
+BATCH_POLL_INTERVAL = 60.0
+
+_usage_lock = threading.Lock()
+_usage = collections.Counter()
+
+class LLMAnalysisError(Exception):
+    """
+    Raised when an LLM analysis cannot be produced: bad input, a failed call
+    or a response that does not match the analysis schema.
+    """
+
+    def __init__(self, message, raw_response=None):
+        super().__init__(message)
+        self.raw_response = raw_response
+
+
+class LLMAnalysis:
+    """
+    Validated LLM analysis of a call.
+
+    to_dict and from_dict use the keys of prompt_builder.ANALYSIS_TOOL, which
+    are also what is stored with results.
+    """
+
+    # (attribute, key) pairs
+    FIELDS = (
+        ("tone", "tone_analysis"),
+        ("sentiment", "sentiment_analysis"),
+        ("empathy_level", "empathy_level"),
+        ("key_points", "key_points"),
+        ("improvement_areas", "improvement_areas"),
+    )
+    LIST_FIELDS = {"key_points", "improvement_areas"}
+
+    __slots__ = tuple(attribute for attribute, _ in FIELDS)
+
+    def __init__(self, tone, sentiment, empathy_level, key_points, improvement_areas):
+        self.tone = tone
+        self.sentiment = sentiment
+        self.empathy_level = empathy_level
+        self.key_points = key_points
+        self.improvement_areas = improvement_areas
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        :param data: Dict with the ANALYSIS_TOOL keys; extra keys are ignored
+        :raises LLMAnalysisError: If a field is missing or has the wrong type
+        """
+        if not isinstance(data, dict):
+            raise LLMAnalysisError("LLM analysis is not an object", raw_response=data)
+        values = {}
+        for attribute, key in cls.FIELDS:
+            value = data.get(key)
+            if attribute in cls.LIST_FIELDS:
+                valid = isinstance(value, list) and all(
+                    isinstance(item, str) for item in value
+                )
+            else:
+                valid = isinstance(value, str)
+            if not valid:
+                expected = (
+                    "a list of strings" if attribute in cls.LIST_FIELDS else "a string"
+                )
+                raise LLMAnalysisError(
+                    f"LLM analysis field '{key}' must be {expected}", raw_response=data
+                )
+            values[attribute] = value
+        return cls(**values)
+
+    def to_dict(self):
+        return {key: getattr(self, attribute) for attribute, key in self.FIELDS}
+
+    def __eq__(self, other):
+        return isinstance(other, LLMAnalysis) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"LLMAnalysis({self.to_dict()!r})"
+
+
+def analyze_with_llm(
+    integrated_data, transcript=None, schema=None, token_budget=None, on_field=None
+):
+    """
+    :param integrated_data: Dict of audio and text features, or a JSON string
+    :param transcript: Optional transcript, shortened to fit the token budget
+    :param schema: Field schema for prompt_builder.compact
+    :param token_budget: Estimated input token limit, INPUT_TOKEN_BUDGET by default
+    :param on_field: Optional ``on_field(key, value)`` callback. The response
+        is then streamed and each analysis field is passed on, unvalidated, as
+        soon as it is complete. After a retried call fields may arrive again.
+    :return: LLMAnalysis
+    :raises LLMAnalysisError: On any failure
+    """
+    request = _build_request(integrated_data, transcript, schema, token_budget)
+    client = clients.get_anthropic_client()
+    start = time.perf_counter()
+    try:
+        with timed('llm'):
+            if on_field is None:
+                response = clients.call_with_retries(
+                    clients.ANTHROPIC, client.messages.create, **request
+                )
+            else:
+                response = clients.call_with_retries(
+                    clients.ANTHROPIC, _stream, client, request, on_field
+                )
+    except Exception as e:
+        raise LLMAnalysisError(f"An error occurred: {str(e)}") from e
+    _record_usage(response, _estimate_tokens(request), time.perf_counter() - start)
+    return _parse_response(response)
+
+async def analyze_with_llm_async(
+    integrated_data, transcript=None, schema=None, token_budget=None, on_field=None
+):
+    """
+    Async counterpart of analyze_with_llm.
+    """
+    request = _build_request(integrated_data, transcript, schema, token_budget)
+    client = clients.get_async_anthropic_client()
+    start = time.perf_counter()
+    try:
+        with timed('llm'):
+            if on_field is None:
+                response = await clients.acall_with_retries(
+                    clients.ANTHROPIC, client.messages.create, **request
+                )
+            else:
+                response = await clients.acall_with_retries(
+                    clients.ANTHROPIC, _astream, client, request, on_field
+                )
+    except Exception as e:
+        raise LLMAnalysisError(f"An error occurred: {str(e)}") from e
+    _record_usage(response, _estimate_tokens(request), time.perf_counter() - start)
+    return _parse_response(response)
+
+def _stream(client, request, on_field):
+    fields = FieldStream(on_field)
+    with client.messages.stream(**request) as stream:
+        for event in stream:
+            if event.type == "input_json":
+                fields.feed(event.partial_json)
+        return stream.get_final_message()
+
+async def _astream(client, request, on_field):
+    fields = FieldStream(on_field)
+    async with client.messages.stream(**request) as stream:
+        async for event in stream:
+            if event.type == "input_json":
+                fields.feed(event.partial_json)
+        return await stream.get_final_message()
+
+
+class FieldStream:
+    """
+    Incremental parser for a streamed JSON object that reports each top-level
+    field once its value is complete.
+
+    :param on_field: Callable ``on_field(key, value)``
+    """
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, on_field):
+        self.on_field = on_field
+        self.buffer = ""
+        self.position = None
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        if self.position is None:
+            start = self.buffer.find("{")
+            if start < 0:
+                return
+            self.position = start + 1
+        while self._next_field():
+            pass
+
+    def _skip(self, position, separators=" \t\r\n"):
+        while position < len(self.buffer) and self.buffer[position] in separators:
+            position += 1
+        return position
+
+    def _next_field(self):
+        position = self._skip(self.position, " \t\r\n,")
+        try:
+            key, position = self._decoder.raw_decode(self.buffer, position)
+            position = self._skip(position)
+            if self.buffer[position:position + 1] != ":":
+                return False
+            value, end = self._decoder.raw_decode(self.buffer, self._skip(position + 1))
+        except (json.JSONDecodeError, IndexError):
+            return False
+        # A number is only known to be complete once the next field or the
+        # end of the object follows it
+        if self.buffer[self._skip(end):self._skip(end) + 1] not in (",", "}"):
+            return False
+        self.position = end
+        self.on_field(key, value)
+        return True
+
+
+def _build_request(integrated_data, transcript=None, schema=None, token_budget=None):
     # Ensure integrated_data is a dictionary
     if isinstance(integrated_data, str):
         try:
             integrated_data = json.loads(integrated_data)
-        except json.JSONDecodeError:
-            return {"error": "Invalid JSON string provided"}
-
-    # Convert integrated_data to a formatted JSON string for the prompt
-    data_str = json.dumps(integrated_data, indent=2)
-    #print("data_str " + data_str)
-
-    #prompt = "you are an expert in audio analysis and text analysis. your task is to analyze the following data and provide insights and suggestions for improvement"
-
-    prompt = f"""
-    You are an AI assistant specialized in analyzing communication data, including both audio and text features. Please analyze the following integrated data from an audio recording and its transcript:
-
-{data_str}
-
-Before you begin your analysis, here's an explanation of some of the audio features:
-Audio features:
-1. MFCCs (Mel-frequency cepstral coefficients): Represent the short-term power spectrum of a sound.
-2. Spectral Centroid: Indicates where the "center of mass" of the spectrum is.
-3. Spectral Rolloff: Represents the frequency below which a certain percentage of the total spectral energy lies.
-4. Tempo: The speed or pace of the speech.
-5. Pitch mean and variability: Reflect the average pitch and how much it varies.
-6. Energy mean and variability: Reflect the overall loudness and its changes.
-7. Speech rate: The number of syllables per second.
-8. Pauses: The number and duration of pauses.
-9. Voice quality (HNR): Harmonics-to-Noise Ratio.
-10. Formants: Frequencies that characterize different vowel sounds.
-
-Text features:
-1. Sentiment analysis: Measures the overall sentiment (positive, negative, neutral) of the text.
-2. Word count and unique words: Indicate the length and vocabulary diversity of the speech.
-3. Top words: Most frequently used words in the speech.
-4. Emotion analysis: Counts of words associated with different emotions.
-5. Readability scores: Indicate the complexity and readability of the text.
-6. Sentence analysis: Provides insights into sentence structure and complexity.
-7. Named entities: Identifies and categorizes named entities mentioned in the speech.
-8. Lexical diversity: Measures the variety of words used relative to the total word count.
-
-Carefully review the data above and follow these steps:
-
-1. Analyze the speaker's tone:
-   - Consider the choice of words, sentence structure, and any audio cues provided.
-   - Determine if the tone is formal, informal, friendly, serious, enthusiastic, etc.
-
-2. Assess the speaker's sentiment:
-   - Evaluate whether the sentiment is positive, negative, or neutral.
-   - Look for emotional indicators in the language used and any mentioned audio cues.
-
-3. Gauge the level of empathy:
-   - Identify instances where the speaker shows understanding or consideration for others' feelings.
-   - Assess how well the speaker relates to or acknowledges the listener's perspective.
-
-4. Identify key points:
-   - Extract the main ideas or arguments presented by the speaker.
-   - Focus on recurring themes or emphasized information.
-
-5. Act as a speech and communication coach and suggest speech areas for improvement:
-   - Based on your analysis, identify aspects of the speaker's communication that could be enhanced.
-   - Consider elements such as clarity, tone, phonetic content, and most cruitically emotional intelligence.
-
-After completing your analysis, format your response as a JSON object with the following structure:
-
-{{
-  "tone_analysis": "String describing the overall tone",
-  "sentiment_analysis": "String describing the sentiment",
-  "empathy_level": "String describing the level of empathy displayed by the speaker",
-  "key_points": ["Array of strings, each representing a key point"],
-  "improvement_areas": ["Array of strings, each suggesting an area for improvement"]
-}}
-
-Ensure that your analysis is thorough and based solely on the provided data. Do not make assumptions beyond what is explicitly stated or strongly implied in the input. If certain aspects are unclear or cannot be determined from the given information, indicate this in your analysis.
-"""
+        except json.JSONDecodeError as e:
+            raise LLMAnalysisError("Invalid JSON string provided") from e
 
-    try:
-        response = client.messages.create(
-            model="claude-3-5-sonnet-20240620",
-              max_tokens=1000,
-              temperature=0.7,
-              messages=[{
-                  "role": "user",
-                  "content": [
-                      {
-                          "type": "text",
-                          "text": prompt
-                      }
-                  ]
-              }])
-
-        # Extract the text content from the response
-        response_text = response.content[0].text
-        print("response: " + response_text)
+    prompt = prompt_builder.build_prompt(
+        integrated_data,
+        transcript,
+        schema,
+        INPUT_TOKEN_BUDGET if token_budget is None else token_budget,
+    )
 
-        # Find the JSON object within the response text
-        json_start = response_text.find('{')
-        json_end = response_text.rfind('}') + 1
-        json_str = response_text[json_start:json_end]
+    return {
+        "model": MODEL,
+        "max_tokens": MAX_TOKENS,
+        # Sent as a raw body field: newer SDK releases no longer accept it as
+        # a keyword argument, but the API does
+        "extra_body": {"temperature": TEMPERATURE},
+        "tools": [prompt_builder.ANALYSIS_TOOL],
+        "tool_choice": {"type": "tool", "name": prompt_builder.ANALYSIS_TOOL["name"]},
+        # The tool and instructions are the same on every call; marking them
+        # lets the API reuse the processed prefix instead of billing it in
+        # full. Prefixes under the model's minimum cacheable length are sent
+        # uncached.
+        "system": [{
+            "type": "text",
+            "text": prompt_builder.system_prompt(schema),
+            "cache_control": {"type": "ephemeral"}
+        }],
+        "messages": [{
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": prompt
+                }
+            ]
+        }]
+    }
 
-        # Parse the JSON string
-        analysis = json.loads(json_str)
-        return json_str
+def _estimate_tokens(params):
+    texts = [block["text"] for block in params["system"]] + [
+        block["text"] for block in params["messages"][0]["content"]
+    ]
+    texts += [json.dumps(tool) for tool in params.get("tools", [])]
+    return sum(prompt_builder.count_tokens(text) for text in texts)
 
+def _record_usage(response, estimated=None, latency=None):
+    # Batch results come without an estimate or a per-request latency
+    usage = getattr(response, "usage", None)
+    counts = {
+        name: getattr(usage, name, 0) or 0
+        for name in (
+            "input_tokens",
+            "output_tokens",
+            "cache_creation_input_tokens",
+            "cache_read_input_tokens",
+        )
+    }
+    logger.info(
+        f"LLM {'call' if latency is not None else 'batch result'}: "
+        f"{counts['input_tokens']} input tokens"
+        + (f" (estimated {estimated})" if estimated is not None else "")
+        + ", "
+        f"{counts['cache_read_input_tokens']} read from cache, "
+        f"{counts['cache_creation_input_tokens']} written to cache, "
+        f"{counts['output_tokens']} output tokens"
+        + (f", {latency:.2f}s" if latency is not None else "")
+    )
+    with _usage_lock:
+        _usage.update(counts)
+        if estimated is not None:
+            _usage["estimated_input_tokens"] += estimated
+        if latency is not None:
+            _usage["calls"] += 1
+            _usage["latency_seconds"] += latency
+        else:
+            _usage["batch_results"] += 1
 
-    except json.JSONDecodeError:
-        # Handle case where the response is not valid JSON
-        return json.dumps({
-            "error": "Failed to parse LLM response",
-            "raw_response": response.content[0].text
-        })
-    except Exception as e:
-        # Handle any other exceptions
-        return {"error": f"An error occurred: {str(e)}"}
+def usage_stats():
+    """
+    :return: Totals of LLM calls, batch results, tokens and latency since startup.
+        ``input_tokens`` excludes tokens read from or written to the prompt cache.
+    """
+    with _usage_lock:
+        stats = dict(_usage)
+    calls = stats.get("calls", 0)
+    return {
+        "calls": calls,
+        "batch_results": stats.get("batch_results", 0),
+        "input_tokens": stats.get("input_tokens", 0),
+        "cache_creation_input_tokens": stats.get("cache_creation_input_tokens", 0),
+        "cache_read_input_tokens": stats.get("cache_read_input_tokens", 0),
+        "output_tokens": stats.get("output_tokens", 0),
+        "estimated_input_tokens": stats.get("estimated_input_tokens", 0),
+        "avg_latency_seconds": stats.get("latency_seconds", 0.0) / calls
+        if calls
+        else 0.0,
+    }
+
+def submit_batch(payloads, schema=None, token_budget=None):
+    """
+    Queue many analyses through the Message Batches API, e.g. for nightly
+    re-scoring. Batches cost less than individual calls and finish within 24
+    hours; fetch the results with collect_batch.
+
+    :param payloads: Iterable of (custom_id, integrated_data, transcript)
+        tuples. A custom_id is up to 64 letters, digits, ``_`` or ``-`` and
+        must be unique within the batch.
+    :return: Batch id
+    """
+    requests = [
+        {
+            "custom_id": custom_id,
+            "params": _batch_params(
+                _build_request(integrated_data, transcript, schema, token_budget)
+            ),
+        }
+        for custom_id, integrated_data, transcript in payloads
+    ]
+    if not requests:
+        raise ValueError("No requests to submit")
+    if len(requests) > MAX_BATCH_REQUESTS:
+        raise ValueError(
+            f"A batch takes at most {MAX_BATCH_REQUESTS} requests, got {len(requests)}"
+        )
+
+    client = clients.get_anthropic_client()
+    batch = clients.call_with_retries(
+        clients.ANTHROPIC, client.messages.batches.create, requests=requests
+    )
+    logger.info(f"Submitted LLM batch {batch.id} with {len(requests)} requests")
+    return batch.id
+
+def _batch_params(request):
+    # Batch requests carry the Messages API body as-is, so fields the SDK
+    # would send through extra_body go inline
+    params = {key: value for key, value in request.items() if key != "extra_body"}
+    params.update(request.get("extra_body", {}))
+    return params
+
+def collect_batch(batch_id, poll_interval=BATCH_POLL_INTERVAL, timeout=None):
+    """
+    Wait for a batch to end and yield its results.
+
+    :param batch_id: Id returned by submit_batch
+    :param poll_interval: Seconds between status checks
+    :param timeout: Seconds to wait before raising TimeoutError, None to wait
+        until the batch ends
+    :return: Generator of (custom_id, analysis) in no particular order, where
+        analysis is an LLMAnalysis, or an LLMAnalysisError if that request failed
+    """
+    client = clients.get_anthropic_client()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        batch = clients.call_with_retries(
+            clients.ANTHROPIC, client.messages.batches.retrieve, batch_id
+        )
+        if batch.processing_status == "ended":
+            break
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError(
+                f"LLM batch {batch_id} still {batch.processing_status} after {timeout}s"
+            )
+        time.sleep(poll_interval)
+
+    logger.info(
+        f"LLM batch {batch_id} ended: {batch.request_counts.succeeded} succeeded, "
+        f"{batch.request_counts.errored} errored"
+    )
+    for entry in clients.call_with_retries(
+        clients.ANTHROPIC, client.messages.batches.results, batch_id
+    ):
+        result = entry.result
+        if result.type == "succeeded":
+            _record_usage(result.message)
+            try:
+                yield entry.custom_id, _parse_response(result.message)
+            except LLMAnalysisError as e:
+                yield entry.custom_id, e
+        elif result.type == "errored":
+            error = getattr(result.error, "error", result.error)
+            yield (
+                entry.custom_id,
+                LLMAnalysisError(
+                    f"An error occurred: {getattr(error, 'message', error)}"
+                ),
+            )
+        else:
+            # canceled or expired
+            yield entry.custom_id, LLMAnalysisError(f"Request {result.type}")
+
+def _parse_response(response):
+    """
+    :return: LLMAnalysis from the record_analysis tool call, or from a JSON
+        object in the text when the model answered in prose
+    """
+    for block in response.content:
+        if (
+            block.type == "tool_use"
+            and block.name == prompt_builder.ANALYSIS_TOOL["name"]
+        ):
+            # Tool arguments arrive already parsed
+            return LLMAnalysis.from_dict(block.input)
+
+    response_text = "".join(
+        block.text for block in response.content if block.type == "text"
+    )
+    logger.debug(f"LLM response: {response_text}")
+    try:
+        # Find the JSON object within the response text
+        json_start = response_text.find('{')
+        json_end = response_text.rfind('}') + 1
+        data = json.loads(response_text[json_start:json_end])
+    except json.JSONDecodeError as e:
+        raise LLMAnalysisError(
+            "Failed to parse LLM response", raw_response=response_text
+        ) from e
+    return LLMAnalysis.from_dict(data)
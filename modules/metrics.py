@@ -0,0 +1,346 @@
+"""
+Process-wide latency histograms and counters, exported in the Prometheus
+text exposition format.
+
+Processing code wraps its stages in ``timed(stage)``. Each stage feeds one
+shared histogram, labelled by stage, and an error counter. A measurement
+costs two clock reads, a dict lookup, a bisect over the buckets and a short
+locked update, a few microseconds at most, so timers stay on in production.
+
+Timings can also be collected per request: inside ``collect()`` every timed
+stage adds its duration to the dict it yields, including stages run by a
+Pipeline on other threads. Work done in other processes (analyze_texts with
+``n_process`` > 1) is not recorded.
+"""
+import bisect
+import contextvars
+import functools
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the latency histogram buckets: from
+# sub-millisecond text analysis steps to transcribing hour-long recordings
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    300.0,
+)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    Base of Counter and Histogram: one child per label set, created on first
+    use. Hot paths can keep the child from ``labels()`` and skip the lookup.
+    """
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def labels(self, *values):
+        """
+        :param values: One value per label name, in order
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(
+                    f'{self.name} takes labels {", ".join(self.labelnames)}'
+                )
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _label_values(self, labels):
+        return tuple(labels[name] for name in self.labelnames)
+
+    def _items(self):
+        with self._lock:
+            children = sorted(self._children.items())
+        return [
+            (tuple(zip(self.labelnames, values, strict=True)), child)
+            for values, child in children
+        ]
+
+
+class _CounterChild:
+    __slots__ = ('_lock', 'value')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1, **labels):
+        self.labels(*self._label_values(labels)).inc(amount)
+
+    def value(self, **labels):
+        return self.labels(*self._label_values(labels)).value
+
+    def samples(self):
+        """
+        :return: List of (name, labels, value), labels as (name, value) pairs
+        """
+        return [
+            (f'{self.name}_total', labels, child.value)
+            for labels, child in self._items()
+        ]
+
+
+class _HistogramChild:
+    __slots__ = ('_lock', 'buckets', 'counts', 'sum')
+
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        # One count per bucket, plus one for +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value, **labels):
+        self.labels(*self._label_values(labels)).observe(value)
+
+    def snapshot(self, **labels):
+        """
+        :return: Dict with ``count`` and ``sum`` of the observations for ``labels``
+        """
+        counts, total = self.labels(*self._label_values(labels)).snapshot()
+        return {'count': sum(counts), 'sum': total}
+
+    def samples(self):
+        samples = []
+        for labels, child in self._items():
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts, strict=True):
+                cumulative += count
+                samples.append(
+                    (
+                        f'{self.name}_bucket',
+                        labels + (('le', _format_value(bound)),),
+                        cumulative,
+                    )
+                )
+            samples.append((f'{self.name}_sum', labels, total))
+            samples.append((f'{self.name}_count', labels, cumulative))
+        return samples
+
+
+class Registry:
+    """
+    Metrics by name, plus stats callbacks whose numeric values are exported
+    as gauges each time the registry is rendered.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._stats = {}
+
+    def _get_or_create(self, cls, name, *args):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args)
+            elif not isinstance(metric, cls):
+                raise ValueError(
+                    f'Metric {name} is already registered as a {metric.type}'
+                )
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """
+        :param name: Metric name without the ``_total`` suffix
+        :return: The Counter registered under ``name``, created if needed
+        """
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        :return: The Histogram registered under ``name``, created if needed
+        """
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets)
+
+    def register_stats(self, prefix, documentation, stats):
+        """
+        Export a component's ``stats()`` dict, e.g. JobQueue.stats.
+
+        :param prefix: Prepended to each key to form the gauge names. A
+            callback registered again under the same prefix replaces the old one.
+        :param stats: Callable returning a flat dict; non-numeric values are skipped
+        """
+        with self._lock:
+            self._stats[prefix] = (documentation, stats)
+
+    def render(self):
+        """
+        :return: Every metric in the Prometheus text exposition format
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+            stats = sorted(self._stats.items())
+
+        lines = []
+        for name, metric in metrics:
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            for sample, labels, value in metric.samples():
+                lines.append(f'{sample}{_format_labels(labels)} {_format_value(value)}')
+
+        for prefix, (documentation, stats_fn) in stats:
+            # One failing component must not take the whole scrape down
+            try:
+                values = stats_fn()
+            except Exception as e:
+                logger.error(f'Error collecting {prefix} stats: {str(e)}')
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f'{prefix}_{key}'
+                lines.append(f'# HELP {name} {documentation}: {key}')
+                lines.append(f'# TYPE {name} gauge')
+                lines.append(f'{name} {_format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'empathy_stage_duration_seconds', 'Time spent in each processing stage', ['stage']
+)
+STAGE_ERRORS = REGISTRY.counter(
+    'empathy_stage_errors', 'Processing stages that raised an exception', ['stage']
+)
+
+_breakdown = contextvars.ContextVar('metrics_breakdown', default=None)
+
+
+def record(stage, seconds, error=False):
+    """
+    Record one run of ``stage`` that took ``seconds``.
+    """
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    if error:
+        STAGE_ERRORS.labels(stage).inc()
+    breakdown = _breakdown.get()
+    if breakdown is not None:
+        breakdown[stage] = breakdown.get(stage, 0.0) + seconds
+
+
+class timed:
+    """
+    Time a stage, as a context manager or a function decorator.
+
+    :param stage: Stage label, dotted for sub-stages, e.g. ``audio.tempo``
+    """
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.stage, time.perf_counter() - self.start, error=exc_type is not None)
+
+    def __call__(self, fn):
+        stage = self.stage
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+@contextmanager
+def collect():
+    """
+    Collect the timings of the stages run in this context.
+
+    Stages submitted to an executor are included when they run in a copy of
+    this context, as Pipeline stages do.
+
+    :return: Context manager yielding a dict of stage to total seconds
+    """
+    breakdown = {}
+    token = _breakdown.set(breakdown)
+    try:
+        yield breakdown
+    finally:
+        _breakdown.reset(token)
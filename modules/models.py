@@ -0,0 +1,159 @@
+"""
+Shared NLP models and corpora, loaded on first use.
+
+Nothing is loaded, or downloaded, when this module is imported. Each
+resource is built by the first thread that needs it while concurrent
+callers wait, so a worker only pays for the models it actually uses.
+Missing NLTK data is downloaded on first use unless NLTK_AUTO_DOWNLOAD is
+off; deployments can fetch it ahead of time with ``python -m modules.models``.
+
+Call warm_up() to load everything before serving requests. preload() does
+the same and then freezes the garbage collector, for servers that load the
+app once and fork workers from it: the workers then share the loaded models
+copy-on-write instead of each holding its own copy.
+"""
+import gc
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Fetch missing NLTK corpora on first use instead of failing
+NLTK_AUTO_DOWNLOAD = os.getenv('NLTK_AUTO_DOWNLOAD', '1').lower() in (
+    '1',
+    'true',
+    'yes',
+)
+
+SPACY_MODEL = 'en_core_web_sm'
+
+# NLTK data used by text analysis: (path for nltk.data.find, package name)
+NLTK_RESOURCES = [
+    ('corpora/stopwords', 'stopwords'),
+    ('sentiment/vader_lexicon.zip', 'vader_lexicon'),
+]
+
+_UNSET = object()
+
+class LazyResource:
+    """
+    Value built by ``loader`` on the first get().
+
+    :param name: Name used in log messages
+    :param loader: Callable taking no arguments
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._value = _UNSET
+
+    @property
+    def loaded(self):
+        return self._value is not _UNSET
+
+    def get(self):
+        value = self._value
+        if value is _UNSET:
+            with self._lock:
+                if self._value is _UNSET:
+                    start = time.perf_counter()
+                    self._value = self._loader()
+                    logger.info(
+                        f'Loaded {self.name} in {time.perf_counter() - start:.2f}s'
+                    )
+                value = self._value
+        return value
+
+def _ensure_nltk_data(path, package):
+    import nltk
+
+    try:
+        nltk.data.find(path)
+    except LookupError as e:
+        if not NLTK_AUTO_DOWNLOAD:
+            raise LookupError(
+                f'NLTK data {package!r} is missing; run python -m modules.models to '
+                'download it'
+            ) from e
+        logger.info(f'Downloading NLTK data: {package}')
+        nltk.download(package, quiet=True)
+
+def _load_nlp():
+    import spacy
+
+    # Only the pipes analyze_text uses: tokenizer and NER, with the statistical
+    # sentence recognizer standing in for the much slower dependency parser
+    nlp = spacy.load(SPACY_MODEL, exclude=['tagger', 'attribute_ruler', 'lemmatizer'])
+    if 'senter' in nlp.component_names and 'parser' in nlp.pipe_names:
+        nlp.disable_pipe('parser')
+        nlp.enable_pipe('senter')
+    return nlp
+
+def _load_stop_words():
+    _ensure_nltk_data(*NLTK_RESOURCES[0])
+    from nltk.corpus import stopwords
+
+    return frozenset(stopwords.words('english'))
+
+def _load_sentiment_analyzer():
+    _ensure_nltk_data(*NLTK_RESOURCES[1])
+    from nltk.sentiment import SentimentIntensityAnalyzer
+
+    from modules.sentiment import SentimentEngine
+
+    # Only the lexicon is kept; scoring is done by the vectorized engine
+    return SentimentEngine(SentimentIntensityAnalyzer().lexicon)
+
+nlp = LazyResource('spaCy pipeline', _load_nlp)
+stop_words = LazyResource('stop words', _load_stop_words)
+sentiment_analyzer = LazyResource('VADER sentiment analyzer', _load_sentiment_analyzer)
+
+def warm_up(audio=True):
+    """
+    Load every model and run the analyses once on a tiny input, so the first
+    request pays neither for loading nor for librosa's JIT compilation.
+
+    :param audio: Also warm up audio feature extraction
+    """
+    start = time.perf_counter()
+    from modules.text_analysis import analyze_text
+    analyze_text('Thank you for calling. I understand how frustrating this has been.')
+
+    if audio:
+        import numpy as np
+
+        from modules.audio_features import extract_features
+        sr = 22050
+        t = np.arange(sr) / sr
+        extract_features((0.1 * np.sin(2 * np.pi * 220 * t)).astype(np.float32), sr)
+
+    logger.info(f'Warm-up completed in {time.perf_counter() - start:.2f}s')
+
+def preload(audio=True):
+    """
+    Warm up, then move everything allocated so far out of the garbage
+    collector's reach. Call in the parent process before forking workers:
+    otherwise the first collection in each worker writes to every object
+    header and copies the pages the models live on.
+    """
+    warm_up(audio=audio)
+    gc.collect()
+    gc.freeze()
+
+def download():
+    """
+    Download the NLTK data used by text analysis. The spaCy model is a
+    package: ``python -m spacy download en_core_web_sm``.
+    """
+    import nltk
+
+    for _, package in NLTK_RESOURCES:
+        nltk.download(package, quiet=True)
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    download()
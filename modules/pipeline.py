@@ -0,0 +1,162 @@
+"""
+A small DAG executor for multi-stage processing such as the upload pipeline.
+
+Each stage names the stages (or initial inputs) it depends on and receives
+their results as keyword arguments. Stages whose dependencies are done are
+submitted to a thread pool together, so independent work overlaps and the
+total time approaches that of the longest dependency chain.
+"""
+import contextvars
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+COMPLETED = 'completed'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+class Stage:
+    def __init__(self, name, fn, deps, optional):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.optional = optional
+
+
+class Pipeline:
+    """
+    Stages are added in dependency order: every dependency must be an input
+    name or an earlier stage, which also rules out cycles.
+
+    :param inputs: Names of the values passed to run()
+    """
+
+    def __init__(self, inputs=()):
+        self.inputs = tuple(inputs)
+        self.stages = {}
+
+    def add(self, name, fn, deps=(), optional=False):
+        """
+        :param name: Stage name, also the keyword its result is passed as
+        :param fn: Callable taking the results of ``deps`` as keyword arguments
+        :param deps: Names of inputs and earlier stages this stage needs
+        :param optional: If the stage fails, log it and pass None to its
+            dependents instead of failing the run
+        :return: self, for chaining
+        """
+        if name in self.stages or name in self.inputs:
+            raise ValueError(f'Duplicate stage name: {name}')
+        unknown = [
+            dep for dep in deps if dep not in self.stages and dep not in self.inputs
+        ]
+        if unknown:
+            raise ValueError(
+                f'Stage {name} depends on unknown stages: {", ".join(unknown)}'
+            )
+        self.stages[name] = Stage(name, fn, deps, optional)
+        return self
+
+    def run(self, executor, on_stage=None, **inputs):
+        """
+        Run every stage, each as soon as its dependencies are done.
+
+        :param executor: concurrent.futures executor the stages run on. With
+            a single worker the stages run one at a time, in insertion order.
+        :param on_stage: Optional callable ``on_stage(name, status)`` called
+            when a stage starts (status None) and when it finishes
+        :param inputs: Values for the pipeline's inputs
+        :return: Tuple of (results, timings). ``results`` maps input and stage
+            names to values. ``timings`` maps stage names to dicts with
+            ``start`` (seconds after the run began), ``seconds`` and ``status``.
+        :raises: The exception of the first required stage that fails; stages
+            not yet started are skipped
+        """
+        missing = set(self.inputs) - set(inputs)
+        if missing:
+            raise ValueError(f'Missing pipeline inputs: {", ".join(sorted(missing))}')
+
+        results = dict(inputs)
+        timings = {}
+        pending = dict(self.stages)
+        running = {}
+        started = time.perf_counter()
+
+        def call(stage, kwargs):
+            begin = time.perf_counter()
+            try:
+                return stage.fn(**kwargs)
+            finally:
+                timings[stage.name] = {
+                    'start': begin - started,
+                    'seconds': time.perf_counter() - begin,
+                }
+
+        def notify(name, status):
+            if on_stage is not None:
+                on_stage(name, status)
+
+        try:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    if all(dep in results for dep in stage.deps):
+                        del pending[name]
+                        notify(name, None)
+                        # Each stage sees the caller's context variables,
+                        # e.g. a metrics.collect() breakdown
+                        future = executor.submit(
+                            contextvars.copy_context().run,
+                            call,
+                            stage,
+                            {dep: results[dep] for dep in stage.deps},
+                        )
+                        running[future] = stage
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        results[stage.name] = future.result()
+                        timings[stage.name]['status'] = COMPLETED
+                    elif stage.optional:
+                        logger.error(
+                            f'Optional stage {stage.name} failed: {str(error)}'
+                        )
+                        results[stage.name] = None
+                        timings[stage.name]['status'] = FAILED
+                    else:
+                        timings[stage.name]['status'] = FAILED
+                        notify(stage.name, FAILED)
+                        raise error
+                    notify(stage.name, timings[stage.name]['status'])
+        finally:
+            # Stages left after a failure never run; ones already running are
+            # waited for so they do not outlive the run
+            for future, stage in running.items():
+                if future.cancel():
+                    timings[stage.name] = {
+                        'start': None,
+                        'seconds': 0.0,
+                        'status': SKIPPED,
+                    }
+            wait(running)
+            for future, stage in running.items():
+                if not future.cancelled():
+                    timings[stage.name]['status'] = (
+                        FAILED if future.exception() else COMPLETED
+                    )
+            for name in pending:
+                timings[name] = {'start': None, 'seconds': 0.0, 'status': SKIPPED}
+
+        return results, timings
+
+
+def run_sequential(pipeline, **inputs):
+    """
+    Run ``pipeline`` one stage at a time, e.g. to compare against a parallel run.
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return pipeline.run(executor, **inputs)
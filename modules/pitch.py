@@ -0,0 +1,244 @@
+"""
+Pitch features from one fundamental frequency (f0) per frame.
+
+librosa.piptrack keeps every spectral peak of every frame in two
+(frequency bins x frames) matrices. Here each frame is reduced to a single
+f0, or to nothing if it is unvoiced, as soon as it is computed. Frames are
+processed in blocks of PITCH_BLOCK_FRAMES, so temporary memory is bounded
+and no per-frame f0 series is kept. The mean and standard deviation come
+from running sums.
+
+PITCH_METHOD picks the estimator:
+
+- ``spectral`` (default): harmonic summation over the magnitude spectrogram
+  the other spectral features already share. It costs no extra transform
+  and is accurate to within about 0.2 Hz on steady tones.
+- ``yin``: the YIN estimator on audio resampled to PITCH_YIN_SR. It is
+  more precise and does not depend on the STFT framing. It costs a
+  resampling pass and one FFT per frame; a lower rate is faster.
+"""
+import os
+
+import numpy as np
+import soxr
+
+PITCH_METHOD = os.getenv('PITCH_METHOD', 'spectral')
+PITCH_YIN_SR = int(os.getenv('PITCH_YIN_SR', '11025'))
+
+# Range of speaking voices
+PITCH_FMIN = 65.0
+PITCH_FMAX = 400.0
+PITCH_BLOCK_FRAMES = 512
+
+# Harmonic summation: candidate spacing, harmonics summed, and how far the
+# best candidate's harmonics must stand above the frame's average magnitude
+SPECTRAL_STEP_HZ = 2.0
+N_HARMONICS = 5
+SPECTRAL_VOICING = 4.0
+
+# YIN frame (about 46 ms), hop (about 23 ms) and aperiodicity threshold
+YIN_FRAME_SECONDS = 0.0464
+YIN_HOP_SECONDS = 0.0232
+YIN_THRESHOLD = 0.15
+
+
+class PitchStats:
+    """Running count, mean and standard deviation of voiced f0 values."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def add(self, f0):
+        f0 = np.asarray(f0, dtype=np.float64)
+        self.count += len(f0)
+        self.total += float(f0.sum())
+        self.total_sq += float(np.square(f0).sum())
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def std(self):
+        if not self.count:
+            return 0.0
+        return float(np.sqrt(max(self.total_sq / self.count - self.mean() ** 2, 0.0)))
+
+
+def spectral_f0(magnitude, sr, n_fft):
+    """
+    :param magnitude: Magnitude spectrogram block, (1 + n_fft // 2, frames)
+    :return: f0 of each voiced frame, in Hz
+    """
+    n_bins = magnitude.shape[0]
+    candidates = np.arange(PITCH_FMIN, PITCH_FMAX, SPECTRAL_STEP_HZ)
+    # Fractional bin of each harmonic of each candidate, linearly interpolated
+    positions = np.minimum(
+        np.outer(np.arange(1, N_HARMONICS + 1), candidates) * n_fft / sr, n_bins - 1.001
+    ).ravel()
+    low = positions.astype(np.intp)
+    weight = (positions - low)[:, None]
+    harmonics = magnitude[low] * (1 - weight) + magnitude[low + 1] * weight
+    scores = harmonics.reshape(N_HARMONICS, len(candidates), -1).sum(axis=0)
+
+    best = np.argmax(scores, axis=0)
+    frames = np.arange(scores.shape[1])
+    # Mean magnitude at the best candidate's harmonics over the mean across
+    # the band they span: near 1 for noise, large for a harmonic voice
+    band = magnitude[:int(np.ceil(N_HARMONICS * PITCH_FMAX * n_fft / sr)) + 1]
+    clarity = scores[best, frames] / N_HARMONICS / np.maximum(band.mean(axis=0), 1e-10)
+    voiced = clarity > SPECTRAL_VOICING
+
+    # Parabolic refinement between neighbouring candidates
+    inner = np.clip(best, 1, len(candidates) - 2)
+    left, centre, right = (
+        scores[inner - 1, frames],
+        scores[inner, frames],
+        scores[inner + 1, frames],
+    )
+    curvature = left - 2 * centre + right
+    shift = np.where(
+        (best == inner) & (curvature < 0),
+        0.5 * (left - right) / np.where(curvature < 0, curvature, -1),
+        0,
+    )
+    return (candidates[best] + shift * SPECTRAL_STEP_HZ)[voiced]
+
+
+def yin_f0(frames, sr):
+    """
+    :param frames: Block of time-domain frames, (frame_length, frames)
+    :param sr: Sampling rate of the frames
+    :return: f0 of each voiced frame, in Hz
+    """
+    frame_length = frames.shape[0]
+    window = frame_length // 2
+    tau_min = max(1, int(np.floor(sr / PITCH_FMAX)))
+    tau_max = min(window - 1, int(np.ceil(sr / PITCH_FMIN)))
+    frames = frames.T.astype(np.float64)
+
+    # Difference function d(tau) = E(0) + E(tau) - 2 r(tau), with the cross
+    # correlation r from one FFT per frame
+    n = 1 << int(np.ceil(np.log2(frame_length + window)))
+    spectrum = np.fft.rfft(frames, n=n, axis=1)
+    head = np.fft.rfft(frames[:, :window], n=n, axis=1)
+    correlation = np.fft.irfft(np.conj(head) * spectrum, n=n, axis=1)[:, :tau_max + 2]
+    energy = np.concatenate(
+        [np.zeros((len(frames), 1)), np.cumsum(frames**2, axis=1)], axis=1
+    )
+    lags = np.arange(tau_max + 2)
+    shifted_energy = energy[:, lags + window] - energy[:, lags]
+    difference = np.maximum(energy[:, [window]] + shifted_energy - 2 * correlation, 0)
+
+    # Cumulative mean normalized difference
+    cumulative = np.cumsum(difference[:, 1:], axis=1)
+    normalized = np.ones_like(difference)
+    normalized[:, 1:] = difference[:, 1:] * lags[1:] / np.maximum(cumulative, 1e-12)
+
+    # First dip below the threshold that is a local minimum
+    search = normalized[:, tau_min:tau_max + 1]
+    trough = np.zeros_like(search, dtype=bool)
+    trough[:, 1:-1] = (search[:, 1:-1] <= search[:, :-2]) & (
+        search[:, 1:-1] < search[:, 2:]
+    )
+    candidates = trough & (search < YIN_THRESHOLD)
+    voiced = candidates.any(axis=1) & (energy[:, window] > 1e-8)
+    tau = np.argmax(candidates, axis=1) + tau_min
+
+    rows = np.flatnonzero(voiced)
+    tau = tau[rows]
+    left, centre, right = (
+        normalized[rows, tau - 1],
+        normalized[rows, tau],
+        normalized[rows, tau + 1],
+    )
+    curvature = left - 2 * centre + right
+    shift = np.where(
+        curvature > 0, 0.5 * (left - right) / np.where(curvature > 0, curvature, 1), 0
+    )
+    return sr / (tau + shift)
+
+
+class PitchTracker:
+    """
+    Accumulates pitch statistics from audio or spectrogram blocks.
+
+    With the spectral method, call push_spectrum() with each block of the
+    shared magnitude spectrogram. With yin, call push_samples() with the
+    audio; it is resampled and framed here. The other call is ignored, so a
+    caller can feed both and switch methods through configuration.
+
+    :param sr: Sampling rate of the audio
+    :param n_fft: FFT size of the spectrogram blocks
+    :param method: ``spectral`` or ``yin``; defaults to PITCH_METHOD
+    """
+
+    def __init__(self, sr, n_fft, method=None):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.method = method or PITCH_METHOD
+        if self.method not in ('spectral', 'yin'):
+            raise ValueError(f'Unknown pitch method: {self.method}')
+        self.stats = PitchStats()
+
+        self.yin_frame = int(round(YIN_FRAME_SECONDS * PITCH_YIN_SR))
+        self.yin_hop = int(round(YIN_HOP_SECONDS * PITCH_YIN_SR))
+        self._resampler = None
+        self._buffer = np.zeros(0, dtype=np.float32)
+
+    def push_spectrum(self, magnitude):
+        if self.method != 'spectral':
+            return
+        for start in range(0, magnitude.shape[1], PITCH_BLOCK_FRAMES):
+            self.stats.add(
+                spectral_f0(
+                    magnitude[:, start : start + PITCH_BLOCK_FRAMES],
+                    self.sr,
+                    self.n_fft,
+                )
+            )
+
+    def push_samples(self, samples):
+        if self.method != 'yin':
+            return
+        # About one block of frames at a time, so a whole recording is never
+        # resampled at once
+        step = PITCH_BLOCK_FRAMES * int(round(YIN_HOP_SECONDS * self.sr))
+        for start in range(0, len(samples), step):
+            chunk = np.asarray(samples[start:start + step], dtype=np.float32)
+            self._push_resampled(self._resample(chunk), last=False)
+
+    def _resample(self, samples, last=False):
+        if self.sr == PITCH_YIN_SR:
+            return samples
+        if self._resampler is None:
+            self._resampler = soxr.ResampleStream(
+                self.sr, PITCH_YIN_SR, 1, dtype='float32', quality='HQ'
+            )
+        return self._resampler.resample_chunk(samples, last=last)
+
+    def _push_resampled(self, samples, last):
+        self._buffer = np.concatenate([self._buffer, samples])
+        # Whole blocks of frames, and at the end whatever frames are left;
+        # the overlap into the next frame stays buffered
+        while len(self._buffer) >= self.yin_frame:
+            n_frames = 1 + (len(self._buffer) - self.yin_frame) // self.yin_hop
+            if n_frames < PITCH_BLOCK_FRAMES and not last:
+                break
+            n_frames = min(n_frames, PITCH_BLOCK_FRAMES)
+            span = (n_frames - 1) * self.yin_hop + self.yin_frame
+            frames = np.lib.stride_tricks.sliding_window_view(
+                self._buffer[:span], self.yin_frame
+            )[:: self.yin_hop]
+            self.stats.add(yin_f0(frames.T, PITCH_YIN_SR))
+            self._buffer = self._buffer[n_frames * self.yin_hop:]
+
+    def finish(self):
+        """
+        :return: Mean and standard deviation of f0 over voiced frames, in Hz
+        """
+        if self.method == 'yin':
+            self._push_resampled(
+                self._resample(np.zeros(0, dtype=np.float32), last=True), last=True
+            )
+        return self.stats.mean(), self.stats.std()
@@ -0,0 +1,379 @@
+"""
+Builds compact LLM analysis prompts that fit a token budget.
+
+The prompt is split in two. The system prompt holds the role, feature notes
+and analysis steps; it only depends on the schema, so it is identical across
+calls and sent as a cacheable prefix. The user message holds the per-call
+data: feature values rounded to a few significant digits with low-value
+fields dropped according to the schema, serialized without indentation, and
+optionally the transcript, cut down to evenly spaced excerpts that fit
+whatever budget the rest of the prompt leaves.
+"""
+import itertools
+import json
+import math
+import re
+
+# Conservative characters per token for English prose and compact JSON. The
+# exact count comes back in the response usage, so this estimate only has to
+# keep requests under budget.
+CHARS_PER_TOKEN = 3.5
+
+# Significant digits kept for numeric fields the schema does not mention
+DEFAULT_PRECISION = 3
+
+# Transcripts over budget are cut into excerpts of about this many tokens
+EXCERPT_TOKENS = 150
+
+# Per field: significant digits to keep (applied to every number inside
+# lists and dicts as well), True to pass the value through unchanged, None to
+# drop the field, or a nested schema for a dict
+DEFAULT_SCHEMA = {
+    'audio_features': {
+        'tempo': 3,
+        'spectral_centroid': 3,
+        'spectral_rolloff': 3,
+        'pitch_mean': 3,
+        'pitch_variability': 2,
+        'energy_mean': 2,
+        'energy_variability': 2,
+        'speech_rate': 2,
+        'articulation_rate': 2,
+        'speaking_ratio': 2,
+        'pause_count': True,
+        'pause_duration_mean': 2,
+        'pause_duration_median': 2,
+        'pause_duration_p90': 2,
+        'voice_quality_hnr': 2,
+        # Per-coefficient averages mean little to the model and make up most
+        # of the serialized features
+        'mfccs': None,
+        'chroma': None,
+        'formants': None,
+    },
+    'text_features': {
+        'sentiment': 2,
+        'word_count': True,
+        'unique_words': True,
+    },
+    'top_words': True,
+}
+
+SYSTEM_PREAMBLE = """You are an AI assistant specialized in analyzing communication data, including both audio and text features. You will be given integrated data from an audio recording and, when available, its transcript.
+"""
+
+PROMPT_HEADER = """Please analyze the following integrated data from an audio recording and its transcript:
+
+{data_str}
+"""
+
+TRANSCRIPT_SECTION = """
+Transcript{note}:
+{transcript}
+"""
+
+# Explanations of the features, each included unless the schema drops all of
+# its fields
+FEATURE_NOTES = [
+    (
+        ('mfccs',),
+        'MFCCs (Mel-frequency cepstral coefficients): Represent the short-term power '
+        'spectrum of a sound.',
+    ),
+    (
+        ('spectral_centroid',),
+        'Spectral Centroid: Indicates where the "center of mass" of the spectrum is.',
+    ),
+    (
+        ('spectral_rolloff',),
+        'Spectral Rolloff: Represents the frequency below which a certain percentage '
+        'of the total spectral energy lies.',
+    ),
+    (('tempo',), 'Tempo: The speed or pace of the speech.'),
+    (
+        ('pitch_mean', 'pitch_variability'),
+        'Pitch mean and variability: Reflect the average pitch and how much it varies.',
+    ),
+    (
+        ('energy_mean', 'energy_variability'),
+        'Energy mean and variability: Reflect the overall loudness and its changes.',
+    ),
+    (
+        ('speech_rate', 'articulation_rate'),
+        'Speech rate and articulation rate: Syllables per minute, over the whole '
+        'recording and over speaking time only.',
+    ),
+    (('speaking_ratio',), 'Speaking ratio: The fraction of the recording with speech.'),
+    (
+        (
+            'pause_count',
+            'pause_duration_mean',
+            'pause_duration_median',
+            'pause_duration_p90',
+        ),
+        'Pauses: The number of silences between speech and their mean, median and 90th '
+        'percentile duration in seconds.',
+    ),
+    (('voice_quality_hnr',), 'Voice quality (HNR): Harmonics-to-Noise Ratio.'),
+    (('formants',), 'Formants: Frequencies that characterize different vowel sounds.'),
+    (
+        ('sentiment',),
+        'Sentiment analysis: Measures the overall sentiment (positive, negative, '
+        'neutral) of the text.',
+    ),
+    (
+        ('word_count', 'unique_words'),
+        'Word count and unique words: Indicate the length and vocabulary diversity of '
+        'the speech.',
+    ),
+    (('top_words',), 'Top words: Most frequently used words in the speech.'),
+    (
+        ('emotion_analysis',),
+        'Emotion analysis: Counts of words associated with different emotions.',
+    ),
+    (
+        ('readability_scores',),
+        'Readability scores: Indicate the complexity and readability of the text.',
+    ),
+    (
+        ('sentence_analysis',),
+        'Sentence analysis: Provides insights into sentence structure and complexity.',
+    ),
+    (
+        ('named_entities',),
+        'Named entities: Identifies and categorizes named entities mentioned in the '
+        'speech.',
+    ),
+    (
+        ('lexical_diversity',),
+        'Lexical diversity: Measures the variety of words used relative to the total '
+        'word count.',
+    ),
+]
+
+INSTRUCTIONS = """
+Carefully review the data provided and follow these steps:
+
+1. Analyze the speaker's tone:
+   - Consider the choice of words, sentence structure, and any audio cues provided.
+   - Determine if the tone is formal, informal, friendly, serious, enthusiastic, etc.
+
+2. Assess the speaker's sentiment:
+   - Evaluate whether the sentiment is positive, negative, or neutral.
+   - Look for emotional indicators in the language used and any mentioned audio cues.
+
+3. Gauge the level of empathy:
+   - Identify instances where the speaker shows understanding or consideration for others' feelings.
+   - Assess how well the speaker relates to or acknowledges the listener's perspective.
+
+4. Identify key points:
+   - Extract the main ideas or arguments presented by the speaker.
+   - Focus on recurring themes or emphasized information.
+
+5. Act as a speech and communication coach and suggest speech areas for improvement:
+   - Based on your analysis, identify aspects of the speaker's communication that could be enhanced.
+   - Consider elements such as clarity, tone, phonetic content, and most critically emotional intelligence.
+
+After completing your analysis, record it with the record_analysis tool.
+
+Ensure that your analysis is thorough and based solely on the provided data. Do not make assumptions beyond what is explicitly stated or strongly implied in the input. If certain aspects are unclear or cannot be determined from the given information, indicate this in your analysis.
+"""
+
+# Forced tool use makes the model return the analysis as schema-shaped JSON
+# arguments instead of prose with JSON somewhere inside it
+ANALYSIS_TOOL = {
+    'name': 'record_analysis',
+    'description': "Record the analysis of the speaker's communication.",
+    'input_schema': {
+        'type': 'object',
+        'properties': {
+            'tone_analysis': {'type': 'string', 'description': 'The overall tone'},
+            'sentiment_analysis': {'type': 'string', 'description': 'The sentiment'},
+            'empathy_level': {
+                'type': 'string',
+                'description': 'The level of empathy displayed by the speaker',
+            },
+            'key_points': {
+                'type': 'array',
+                'items': {'type': 'string'},
+                'description': 'Each key point',
+            },
+            'improvement_areas': {
+                'type': 'array',
+                'items': {'type': 'string'},
+                'description': 'Each suggested area for improvement',
+            },
+        },
+        'required': [
+            'tone_analysis',
+            'sentiment_analysis',
+            'empathy_level',
+            'key_points',
+            'improvement_areas',
+        ],
+    },
+}
+
+# Bump when the prompt text, schema or ANALYSIS_TOOL changes so cached LLM
+# analyses are recomputed
+PROMPT_VERSION = '1'
+
+SENTENCE_PATTERN = re.compile(r'[^.!?]+[.!?]*\s*')
+
+
+def count_tokens(text):
+    """
+    Estimate the number of tokens ``text`` takes up in a prompt.
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def quantize(value, digits):
+    """
+    Round every float in ``value`` to ``digits`` significant digits.
+
+    :param value: Number, or list or dict of them (nested)
+    :return: Value of the same shape; whole results become ints
+    """
+    if isinstance(value, dict):
+        return {k: quantize(v, digits) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [quantize(v, digits) for v in value]
+    if isinstance(value, float) and math.isfinite(value):
+        rounded = float(f'{value:.{digits}g}')
+        return int(rounded) if rounded.is_integer() else rounded
+    return value
+
+
+def compact(data, schema=None):
+    """
+    Apply a schema to the integrated data.
+
+    :param data: Dict of features, e.g. from integrate_data
+    :param schema: See DEFAULT_SCHEMA. Fields the schema does not mention are
+        kept at DEFAULT_PRECISION.
+    :return: New dict with fields dropped and numbers rounded
+    """
+    schema = DEFAULT_SCHEMA if schema is None else schema
+    result = {}
+    for key, value in data.items():
+        rule = schema.get(key, DEFAULT_PRECISION)
+        if rule is None:
+            continue
+        if isinstance(rule, dict):
+            result[key] = (
+                compact(value, rule)
+                if isinstance(value, dict)
+                else quantize(value, DEFAULT_PRECISION)
+            )
+        elif rule is True:
+            result[key] = value
+        else:
+            result[key] = quantize(value, rule)
+    return result
+
+
+def _dropped_fields(schema):
+    dropped = set()
+    for key, rule in schema.items():
+        if rule is None:
+            dropped.add(key)
+        elif isinstance(rule, dict):
+            dropped |= _dropped_fields(rule)
+    return dropped
+
+
+def feature_notes(schema=None):
+    """
+    :return: Numbered explanations of the features the schema sends
+    """
+    dropped = _dropped_fields(DEFAULT_SCHEMA if schema is None else schema)
+    notes = [note for fields, note in FEATURE_NOTES if not dropped.issuperset(fields)]
+    lines = '\n'.join(f'{i}. {note}' for i, note in enumerate(notes, 1))
+    return f'\nThe features are:\n{lines}\n'
+
+
+def system_prompt(schema=None):
+    """
+    Static part of the prompt: role, feature notes and analysis steps.
+    """
+    return SYSTEM_PREAMBLE + feature_notes(schema) + INSTRUCTIONS
+
+
+def fit_transcript(transcript, max_tokens):
+    """
+    Cut a transcript down to at most ``max_tokens``.
+
+    A transcript that fits is returned whole. Otherwise it is split into
+    excerpts of whole sentences, and evenly spaced excerpts, always including
+    the first and last, are kept with an omission marker between gaps.
+
+    :return: Tuple of (text, whether it was shortened)
+    """
+    transcript = transcript.strip()
+    if count_tokens(transcript) <= max_tokens:
+        return transcript, False
+
+    excerpts = []
+    current = ''
+    for sentence in SENTENCE_PATTERN.findall(transcript):
+        if current and count_tokens(current + sentence) > EXCERPT_TOKENS:
+            excerpts.append(current.strip())
+            current = ''
+        current += sentence
+    if current.strip():
+        excerpts.append(current.strip())
+
+    marker = '\n[...]\n'
+    # Each kept excerpt costs its own tokens plus a possible marker
+    cost = max(count_tokens(e) for e in excerpts) + count_tokens(marker)
+    keep = min(len(excerpts), max_tokens // cost)
+    if keep <= 0:
+        # Not even one excerpt fits; keep what does of the opening
+        return transcript[:max(0, int(max_tokens * CHARS_PER_TOKEN))], True
+    if keep == 1:
+        indices = [0]
+    else:
+        step = (len(excerpts) - 1) / (keep - 1)
+        indices = sorted({round(i * step) for i in range(keep)})
+
+    parts = [excerpts[indices[0]]]
+    for previous, index in itertools.pairwise(indices):
+        parts.append(marker if index > previous + 1 else '\n')
+        parts.append(excerpts[index])
+    return ''.join(parts), True
+
+
+def build_prompt(data, transcript=None, schema=None, token_budget=None):
+    """
+    Build the user message for ``data``, to be sent after system_prompt.
+
+    :param data: Dict of integrated audio and text features
+    :param transcript: Optional transcript to include, shortened to fit
+    :param schema: Field schema, see DEFAULT_SCHEMA
+    :param token_budget: Maximum estimated input tokens, system prompt and
+        tool definition included, or None for no limit
+    :return: Prompt text
+    """
+    data_str = json.dumps(
+        compact(data, schema), separators=(',', ':'), ensure_ascii=False
+    )
+    prompt = PROMPT_HEADER.format(data_str=data_str)
+
+    if transcript:
+        if token_budget is None:
+            text, shortened = transcript.strip(), False
+        else:
+            overhead = count_tokens(
+                system_prompt(schema)
+                + json.dumps(ANALYSIS_TOOL)
+                + prompt
+                + TRANSCRIPT_SECTION.format(note=' (excerpts)', transcript='')
+            )
+            text, shortened = fit_transcript(transcript, token_budget - overhead)
+        if text:
+            prompt += TRANSCRIPT_SECTION.format(
+                note=' (excerpts)' if shortened else '', transcript=text
+            )
+
+    return prompt
@@ -1,15 +1,43 @@
-from deepgram import DeepgramClient, LiveTranscriptionEvents, LiveOptions
-import os
+from deepgram import LiveTranscriptionEvents, LiveOptions
+import logging
+from modules import clients
 
-DEEPGRAM_API_KEY = os.getenv('DEEPGRAM_API_KEY')
+logger = logging.getLogger(__name__)
 
-def start_realtime_transcription(websocket):
-    deepgram = DeepgramClient(DEEPGRAM_API_KEY)
+def start_realtime_transcription(emit, analyzer=None, client=None):
+    """
+    Open a Deepgram live transcription connection.
+
+    :param emit: Callable ``emit(event, data)`` that delivers an event to the client
+    :param analyzer: Optional LiveAnalyzer fed with every finalized segment;
+        its throttled updates are emitted as ``live_analysis``
+    :param client: DeepgramClient to use; defaults to the shared client
+    :return: The Deepgram connection
+    :raises ConnectionError: If the connection could not be opened
+    """
+    deepgram = client or clients.get_deepgram_client()
     dg_connection = deepgram.listen.live.v("1")
 
     def on_message(self, result, **kwargs):
-        transcript = result.channel.alternatives[0].transcript
-        websocket.send(transcript)
+        try:
+            alternative = result.channel.alternatives[0]
+            transcript = alternative.transcript
+            if not transcript:
+                return
+            emit('transcript', {'transcript': transcript, 'is_final': result.is_final})
+
+            if analyzer is not None and result.is_final:
+                words = [
+                    (word.start, word.end)
+                    for word in getattr(alternative, 'words', None) or []
+                ]
+                update = analyzer.add_segment(
+                    transcript, result.start, result.start + result.duration, words
+                )
+                if update is not None:
+                    emit('live_analysis', update)
+        except Exception as e:
+            logger.error(f'Error handling live transcript: {str(e)}')
 
     dg_connection.on(LiveTranscriptionEvents.Transcript, on_message)
 
@@ -19,8 +47,9 @@ def start_realtime_transcription(websocket):
         smart_format=True,
     )
 
-    dg_connection.start(options)
+    if not dg_connection.start(options):
+        raise ConnectionError('Failed to connect to Deepgram')
     return dg_connection
 
 def stop_realtime_transcription(dg_connection):
-    dg_connection.finish()
\ No newline at end of file
+    dg_connection.finish()
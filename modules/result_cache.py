@@ -0,0 +1,128 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from sqlalchemy import func
+
+from modules.database import CacheEntry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def make_version(*parts):
+    """
+    Build a short version tag from the settings that determine a cached result,
+    e.g. transcription options and the analyzer version.
+    """
+    encoded = json.dumps(parts, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def make_key(content_hash, version):
+    return f'{content_hash}:{version}'
+
+
+class ResultCache:
+    """
+    Content-addressed cache of upload results in the ``result_cache`` table.
+
+    Entries expire ``ttl_seconds`` after they are written. When the stored
+    payloads exceed ``max_bytes`` the least recently read entries are evicted.
+
+    :param db: SQLAlchemy session
+    :param ttl_seconds: Lifetime of an entry
+    :param max_bytes: Upper bound on the total JSON size of stored payloads
+    """
+
+    def __init__(
+        self, db, ttl_seconds=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES
+    ):
+        self.db = db
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self.db.get(CacheEntry, key)
+            if entry is not None and entry.created_at < now - self.ttl_seconds:
+                self.db.delete(entry)
+                self.db.commit()
+                self._counters['evictions'] += 1
+                entry = None
+
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+
+            entry.last_accessed = now
+            payload = entry.payload
+            self.db.commit()
+            self._counters['hits'] += 1
+            return payload
+
+    def put(self, key, payload):
+        now = time.time()
+        size = len(json.dumps(payload, default=str))
+        with self._lock:
+            entry = self.db.get(CacheEntry, key)
+            if entry is None:
+                entry = CacheEntry(key=key)
+                self.db.add(entry)
+            entry.payload = payload
+            entry.size = size
+            entry.created_at = now
+            entry.last_accessed = now
+            self.db.commit()
+            self._counters['writes'] += 1
+            self._evict(now)
+
+    def stats(self):
+        with self._lock:
+            entries, total_bytes = self.db.query(
+                func.count(CacheEntry.key), func.coalesce(func.sum(CacheEntry.size), 0)
+            ).one()
+            lookups = self._counters['hits'] + self._counters['misses']
+            return {
+                **self._counters,
+                'hit_ratio': self._counters['hits'] / lookups if lookups else 0.0,
+                'entries': entries,
+                'bytes': int(total_bytes),
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+            }
+
+    def _evict(self, now):
+        expired = (
+            self.db.query(CacheEntry)
+            .filter(CacheEntry.created_at < now - self.ttl_seconds)
+            .delete()
+        )
+
+        total_bytes = self.db.query(
+            func.coalesce(func.sum(CacheEntry.size), 0)
+        ).scalar()
+        stale = []
+        if total_bytes > self.max_bytes:
+            for key, size in self.db.query(CacheEntry.key, CacheEntry.size).order_by(
+                CacheEntry.last_accessed
+            ):
+                if total_bytes <= self.max_bytes:
+                    break
+                stale.append(key)
+                total_bytes -= size
+            self.db.query(CacheEntry).filter(CacheEntry.key.in_(stale)).delete()
+
+        # Always end the transaction: the DELETE above opened one even if it
+        # matched nothing, and SQLite holds the write lock until it ends
+        self.db.commit()
+        if expired or stale:
+            self._counters['evictions'] += expired + len(stale)
+            logger.info(f'Evicted {expired + len(stale)} cached results')
@@ -0,0 +1,369 @@
+"""
+VADER sentiment scores for many sentences at once.
+
+Gives the same per-sentence scores as NLTK's SentimentIntensityAnalyzer,
+but computes them with array operations over all sentences of a batch.
+Tokens are mapped once to ids in a batch vocabulary. Each distinct token is
+looked up in the lexicon, booster and negation lists once, and the
+result is cached across batches. VADER's rules then run as array operations
+over every token of the batch: capitals, the three preceding modifiers,
+"never so", "least" and "but". Sentence sums come from np.bincount.
+
+Scripted calls repeat many sentences, so scores are also kept in an LRU
+cache keyed by sentence text.
+"""
+import collections
+import functools
+import os
+import string
+import threading
+
+import numpy as np
+from nltk.sentiment.vader import VaderConstants
+
+SENTIMENT_CACHE_SIZE = int(os.getenv('SENTIMENT_CACHE_SIZE', '65536'))
+TOKEN_CACHE_SIZE = 65536
+
+C = VaderConstants
+NORMALIZE_ALPHA = 15
+# Words that can be part of a multi-word idiom or booster; the few tokens
+# near one go through the idiom rules one at a time
+IDIOM_WORDS = frozenset(
+    word
+    for phrase in (*C.SPECIAL_CASE_IDIOMS, *C.BOOSTER_DICT)
+    if ' ' in phrase
+    for word in phrase.split()
+)
+
+_PUNCTUATION = frozenset(string.punctuation)
+_PUNC_LIST = frozenset(C.PUNC_LIST)
+
+# Per-token lexicon and rule lookups; see SentimentEngine._token_features
+_FEATURES = (
+    'valence',
+    'in_lexicon',
+    'upper',
+    'booster',
+    'negation',
+    'least',
+    'at_or_very',
+    'never',
+    'so_or_this',
+    'but',
+    'kind',
+    'of',
+    'idiom',
+)
+
+
+class SentenceScores(
+    collections.namedtuple(
+        'SentenceScores', 'compound pos neu neg pos_sum neg_sum neu_count'
+    )
+):
+    """
+    Scores of a list of sentences, one array per field. compound, pos, neu and
+    neg are polarity_scores(), rounded as NLTK rounds them. pos_sum,
+    neg_sum and neu_count are the unrounded sums they are the shares of.
+    """
+
+    def row(self, index):
+        return {
+            'neg': float(self.neg[index]),
+            'neu': float(self.neu[index]),
+            'pos': float(self.pos[index]),
+            'compound': float(self.compound[index]),
+        }
+
+
+@functools.lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def normalize_token(token):
+    """
+    Strip one of VADER's punctuation marks from either end of a token, as
+    SentiText does, when what remains is a word of two or more characters.
+    """
+    stripped = token.lstrip(string.punctuation)
+    if token[:len(token) - len(stripped)] in _PUNC_LIST and _is_word(stripped):
+        return stripped
+    stripped = token.rstrip(string.punctuation)
+    if token[len(stripped):] in _PUNC_LIST and _is_word(stripped):
+        return stripped
+    return token
+
+
+def _is_word(text):
+    return len(text) > 1 and not _PUNCTUATION.intersection(text)
+
+
+class SentimentEngine:
+    """
+    :param lexicon: Dict of lowercase word to valence, e.g.
+        ``SentimentIntensityAnalyzer().lexicon``
+    :param cache_size: Sentences whose scores are kept; 0 disables the cache
+    """
+
+    def __init__(self, lexicon, cache_size=SENTIMENT_CACHE_SIZE):
+        self.lexicon = lexicon
+        self.cache_size = cache_size
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._token_features = functools.lru_cache(maxsize=TOKEN_CACHE_SIZE)(
+            self._token_features
+        )
+
+    def polarity_scores(self, text):
+        """
+        :return: Dict of neg, neu, pos and compound, as
+            SentimentIntensityAnalyzer.polarity_scores
+        """
+        return self.score([text]).row(0)
+
+    def score(self, texts):
+        """
+        :param texts: List of sentences
+        :return: SentenceScores of the sentences, in order
+        """
+        rows = np.zeros((len(texts), len(SentenceScores._fields)))
+        missing = {}
+        with self._lock:
+            for index, text in enumerate(texts):
+                cached = self._cache.get(text)
+                if cached is None:
+                    missing.setdefault(text, []).append(index)
+                else:
+                    self._cache.move_to_end(text)
+                    rows[index] = cached
+            self.hits += len(texts) - sum(map(len, missing.values()))
+            self.misses += len(missing)
+
+        if missing:
+            unique = list(missing)
+            scored = self._score(unique)
+            for text, row in zip(unique, scored, strict=True):
+                rows[missing[text]] = row
+            if self.cache_size:
+                with self._lock:
+                    for text, row in zip(unique, scored, strict=True):
+                        self._cache[text] = row
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+        return SentenceScores(*rows.T)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._cache),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def _token_features(self, token):
+        lower = token.lower()
+        valence = self.lexicon.get(lower)
+        return (
+            valence or 0.0,
+            valence is not None,
+            token.isupper(),
+            C.BOOSTER_DICT.get(lower, 0.0),
+            lower in C.NEGATE or "n't" in lower,
+            lower == 'least',
+            lower in ('at', 'very'),
+            token == 'never',
+            token in ('so', 'this'),
+            lower == 'but',
+            lower == 'kind',
+            lower == 'of',
+            token in IDIOM_WORDS,
+        )
+
+    def _score(self, texts):
+        # Tokens of every sentence, back to back, with a vocabulary id each
+        sentences = [
+            [normalize_token(t) for t in text.split() if len(t) > 1] for text in texts
+        ]
+        vocabulary = {}
+        ids = np.array(
+            [
+                vocabulary.setdefault(t, len(vocabulary))
+                for tokens in sentences
+                for t in tokens
+            ],
+            dtype=np.intp,
+        )
+        columns = np.array(
+            [self._token_features(t) for t in vocabulary], dtype=np.float64
+        ).reshape(-1, len(_FEATURES))
+        feature = dict(zip(_FEATURES, columns.T, strict=True))
+        for name in _FEATURES[1:]:
+            if name != 'booster':
+                feature[name] = feature[name].astype(bool)
+
+        lengths = np.array([len(tokens) for tokens in sentences], dtype=np.intp)
+        sentence = np.repeat(np.arange(len(texts)), lengths)
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.intp)
+        position = np.arange(len(ids)) - starts[sentence]
+
+        # NLTK looks up each token's context at the first occurrence of the
+        # same token in its sentence
+        _, first_index, inverse = np.unique(
+            sentence * max(len(vocabulary), 1) + ids,
+            return_index=True,
+            return_inverse=True,
+        )
+        first = first_index[inverse.ravel()]
+        i = first - starts[sentence]
+
+        def at(offset, name):
+            # Feature of the token ``offset`` after the first occurrence, if in
+            # the sentence
+            index = first + offset
+            inside = (i + offset >= 0) & (i + offset < lengths[sentence])
+            values = feature[name][ids[np.clip(index, 0, max(len(ids) - 1, 0))]]
+            return np.where(inside, values, False if values.dtype == bool else 0.0)
+
+        upper_counts = np.bincount(
+            sentence, weights=feature['upper'][ids], minlength=len(texts)
+        )
+        cap_diff = ((upper_counts > 0) & (upper_counts < lengths))[sentence]
+
+        skipped = (at(0, 'kind') & at(1, 'of')) | (at(0, 'booster') != 0)
+        scored = at(0, 'in_lexicon') & ~skipped
+        valence = at(0, 'valence')
+        capitals = at(0, 'upper') & cap_diff
+        valence = np.where(
+            capitals,
+            np.where(valence > 0, valence + C.C_INCR, valence - C.C_INCR),
+            valence,
+        )
+
+        # The three preceding words, nearest first
+        for distance, damping in ((1, 1.0), (2, 0.95), (3, 0.9)):
+            applies = (i >= distance) & ~at(-distance, 'in_lexicon')
+            booster = at(-distance, 'booster')
+            scalar = np.where(valence < 0, -booster, booster)
+            scalar = np.where(
+                (booster != 0) & at(-distance, 'upper') & cap_diff,
+                np.where(valence > 0, scalar + C.C_INCR, scalar - C.C_INCR),
+                scalar,
+            )
+            if damping != 1.0:
+                scalar = np.where(scalar != 0, scalar * damping, scalar)
+            valence = np.where(applies, valence + scalar, valence)
+
+            negated = at(-distance, 'negation')
+            if distance == 1:
+                factor = np.where(negated, C.N_SCALAR, 1.0)
+            elif distance == 2:
+                never_so = at(-2, 'never') & at(-1, 'so_or_this')
+                factor = np.where(never_so, 1.5, np.where(negated, C.N_SCALAR, 1.0))
+            else:
+                never_so = (at(-3, 'never') & at(-2, 'so_or_this')) | at(
+                    -1, 'so_or_this'
+                )
+                factor = np.where(never_so, 1.25, np.where(negated, C.N_SCALAR, 1.0))
+            valence = np.where(applies, valence * factor, valence)
+
+            if distance == 3:
+                near_idiom = np.zeros(len(ids), dtype=bool)
+                for offset in range(-3, 3):
+                    near_idiom |= at(offset, 'idiom')
+                for index in np.flatnonzero(applies & scored & near_idiom):
+                    tokens = sentences[sentence[index]]
+                    valence[index] = _idioms_check(valence[index], tokens, i[index])
+
+        least = (
+            (i >= 1)
+            & ~at(-1, 'in_lexicon')
+            & at(-1, 'least')
+            & ((i == 1) | ~at(-2, 'at_or_very'))
+        )
+        valence = np.where(least, valence * C.N_SCALAR, valence)
+        valence = np.where(scored, valence, 0.0)
+
+        # Words before the first "but" of a sentence count half, words after it
+        # half again
+        is_but = feature['but'][ids]
+        first_but = np.full(len(texts), np.iinfo(np.intp).max)
+        np.minimum.at(first_but, sentence[is_but], position[is_but])
+        but = first_but[sentence]
+        valence = valence * np.where(
+            but == np.iinfo(np.intp).max,
+            1.0,
+            np.where(position < but, 0.5, np.where(position > but, 1.5, 1.0)),
+        )
+
+        totals = np.bincount(sentence, weights=valence, minlength=len(texts))
+        pos_sum = np.bincount(
+            sentence,
+            weights=np.where(valence > 0, valence + 1, 0.0),
+            minlength=len(texts),
+        )
+        neg_sum = np.bincount(
+            sentence,
+            weights=np.where(valence < 0, valence - 1, 0.0),
+            minlength=len(texts),
+        )
+        neu_count = np.bincount(sentence, weights=valence == 0, minlength=len(texts))
+
+        # Emphasis from up to four exclamation marks, or two or more question marks
+        exclamations = np.minimum([text.count('!') for text in texts], 4) * 0.292
+        questions = np.array([text.count('?') for text in texts])
+        emphasis = exclamations + np.where(
+            questions > 3, 0.96, np.where(questions > 1, questions * 0.18, 0.0)
+        )
+
+        totals = np.where(
+            totals > 0,
+            totals + emphasis,
+            np.where(totals < 0, totals - emphasis, totals),
+        )
+        compound = totals / np.sqrt(totals * totals + NORMALIZE_ALPHA)
+        more_positive, more_negative = pos_sum > -neg_sum, pos_sum < -neg_sum
+        pos_sum = np.where(more_positive, pos_sum + emphasis, pos_sum)
+        neg_sum = np.where(more_negative, neg_sum - emphasis, neg_sum)
+        total = pos_sum - neg_sum + neu_count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            shares = np.abs(np.stack([pos_sum, neg_sum, neu_count]) / total)
+
+        has_tokens = lengths > 0
+        return [
+            (
+                round(float(compound[k]), 4),
+                round(float(shares[0, k]), 3),
+                round(float(shares[2, k]), 3),
+                round(float(shares[1, k]), 3),
+                pos_sum[k],
+                -neg_sum[k],
+                neu_count[k],
+            )
+            if has_tokens[k]
+            else (0.0,) * 7
+            for k in range(len(texts))
+        ]
+
+
+def _idioms_check(valence, tokens, i):
+    # SentimentIntensityAnalyzer._idioms_check, for one token
+    sequences = [
+        f'{tokens[i - 1]} {tokens[i]}',
+        f'{tokens[i - 2]} {tokens[i - 1]} {tokens[i]}',
+        f'{tokens[i - 2]} {tokens[i - 1]}',
+        f'{tokens[i - 3]} {tokens[i - 2]} {tokens[i - 1]}',
+        f'{tokens[i - 3]} {tokens[i - 2]}',
+    ]
+    for sequence in sequences:
+        if sequence in C.SPECIAL_CASE_IDIOMS:
+            valence = C.SPECIAL_CASE_IDIOMS[sequence]
+            break
+    if len(tokens) - 1 > i and f'{tokens[i]} {tokens[i + 1]}' in C.SPECIAL_CASE_IDIOMS:
+        valence = C.SPECIAL_CASE_IDIOMS[f'{tokens[i]} {tokens[i + 1]}']
+    if (
+        len(tokens) - 1 > i + 1
+        and f'{tokens[i]} {tokens[i + 1]} {tokens[i + 2]}' in C.SPECIAL_CASE_IDIOMS
+    ):
+        valence = C.SPECIAL_CASE_IDIOMS[f'{tokens[i]} {tokens[i + 1]} {tokens[i + 2]}']
+    if sequences[4] in C.BOOSTER_DICT or sequences[2] in C.BOOSTER_DICT:
+        valence = valence + C.B_DECR
+    return valence
@@ -1,113 +1,348 @@
-import nltk
-import spacy
-from nltk.corpus import stopwords
-from nltk.probability import FreqDist
-from nltk.sentiment import SentimentIntensityAnalyzer
-from nltk.tokenize import sent_tokenize, word_tokenize
-from textstat import textstat
+import collections
+import functools
+import itertools
+import multiprocessing
+import operator
+import numpy as np
+from modules import models
 from modules.logger import setup_logger
+from modules.metrics import timed
 
 # Setup logging
 logger = setup_logger('text_analysis_logger', 'logs/text_analysis.log')
 
-nltk.download('punkt', quiet=True)
-nltk.download('stopwords', quiet=True)
-nltk.download('vader_lexicon', quiet=True)
+# The spaCy pipeline, stop words and VADER analyzer are loaded on first use
+# by modules.models; these names are kept for code that imports them from here
+_MODELS = {
+    'nlp': models.nlp,
+    'stop_words': models.stop_words,
+    'sia': models.sentiment_analyzer,
+}
 
-nlp = spacy.load('en_core_web_sm')
+def __getattr__(name):
+    if name in _MODELS:
+        return _MODELS[name].get()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Bump when analyze_text output changes so cached results are recomputed
+ANALYZER_VERSION = '5'
 
 def analyze_text(transcript):
     try:
         logger.info('Starting text analysis')
 
+        # Parse once; every feature is derived from this Doc
+        with timed('text.parse'):
+            doc = models.nlp.get()(transcript)
+        features = _analyze_batch([doc])[0]
+
+        logger.info('Completed text analysis')
+        return features
+    except Exception as e:
+        logger.error(f'Error during text analysis: {str(e)}')
+        raise
+
+def analyze_texts(transcripts, batch_size=64, n_process=1):
+    """
+    Analyze many transcripts, yielding one analyze_text feature dict per
+    transcript, in input order.
+
+    Transcripts are consumed lazily and at most a few batches are in flight,
+    so memory stays bounded for arbitrarily long inputs. With ``n_process`` > 1
+    whole batches (parse, sentiment and readability) are spread over a process
+    pool rather than only the spaCy parse.
+
+    :param transcripts: Iterable of transcript strings
+    :param batch_size: Transcripts per batch
+    :param n_process: Number of worker processes
+    """
+    if n_process <= 1:
+        docs = models.nlp.get().pipe(transcripts, batch_size=batch_size)
+        while True:
+            with timed('text.parse'):
+                batch = list(itertools.islice(docs, batch_size))
+            if not batch:
+                return
+            yield from _analyze_batch(batch)
+
+    # Load in the parent so the forked workers share the models
+    for resource in _MODELS.values():
+        resource.get()
+    transcripts_iter = iter(transcripts)
+    chunks = iter(lambda: list(itertools.islice(transcripts_iter, batch_size)), [])
+    with multiprocessing.Pool(n_process) as pool:
+        in_flight = collections.deque()
+        for chunk in chunks:
+            in_flight.append(pool.apply_async(_analyze_chunk, (chunk,)))
+            # Keep every worker busy without reading the whole input ahead
+            if len(in_flight) >= 2 * n_process:
+                yield from in_flight.popleft().get()
+        while in_flight:
+            yield from in_flight.popleft().get()
+
+def _analyze_chunk(transcripts):
+    return _analyze_batch(
+        list(models.nlp.get().pipe(transcripts, batch_size=len(transcripts)))
+    )
+
+def _analyze_batch(docs):
+    # Each sub-analysis runs over the whole batch and is timed as a text.* stage
+    with timed('text.tokens'):
         # Tokenize and remove stopwords
-        stop_words = set(stopwords.words('english'))
-        words = [w.lower() for w in word_tokenize(transcript) if w.isalnum()]
-        filtered_words = [w for w in words if w not in stop_words]
-
-        # Perform sentiment analysis
-        sia = SentimentIntensityAnalyzer()
-        sentiment_scores = sia.polarity_scores(transcript)
-
-        # Count word frequency
-        word_freq = FreqDist(filtered_words)
-
-        # Readability and complexity metrics
-        readability_scores = {
-            "flesch_reading_ease": textstat.flesch_reading_ease(transcript),
-            "flesch_kincaid_grade": textstat.flesch_kincaid_grade(transcript),
-            "gunning_fog": textstat.gunning_fog(transcript)
-        }
+        stop_words = models.stop_words.get()
+        words = [
+            [token.lower_ for token in doc if token.text.isalnum()] for doc in docs
+        ]
+        filtered = [
+            [w for w in doc_words if w not in stop_words] for doc_words in words
+        ]
+        top_words = [
+            dict(collections.Counter(doc_filtered).most_common(10))
+            for doc_filtered in filtered
+        ]
+
+    with timed('text.sentences'):
+        sentences = [_sentences(doc) for doc in docs]
+        structures = [_sentence_structure(doc_sentences) for doc_sentences in sentences]
 
-        # Sentence structure analysis
-        sentence_analysis = analyze_sentence_structure(transcript)
+    with timed('text.sentiment'):
+        # Every sentence of the batch is scored in one pass; each document's
+        # sentiment and emotion counts are aggregated from its sentences
+        scores = models.sentiment_analyzer.get().score(
+            [sent.text for doc_sentences in sentences for sent in doc_sentences]
+        )
+        doc_index = np.repeat(
+            np.arange(len(docs)), [len(doc_sentences) for doc_sentences in sentences]
+        )
+        doc_scores = _document_sentiment(scores, doc_index, len(docs))
+        emotions = _emotion_counts_batch(scores.compound, doc_index, len(docs))
 
-        # Named Entity Recognition
-        ner_analysis = analyze_named_entities(transcript)
+    with timed('text.readability'):
+        readability = _readability_batch(
+            words, [len(doc_sentences) for doc_sentences in sentences]
+        )
 
-        # Lexical diversity
-        lexical_diversity = len(set(filtered_words)) / len(filtered_words) if filtered_words else 0
+    with timed('text.entities'):
+        entities = [analyze_named_entities(doc) for doc in docs]
 
-        # Emotion analysis using VADER
-        emotion_analysis = analyze_emotions(transcript)
+    results = []
+    for i in range(len(docs)):
+        filtered_words = filtered[i]
+        results.append(
+            {
+                "sentiment": doc_scores[i],
+                "word_count": len(words[i]),
+                "unique_words": len(set(filtered_words)),
+                "top_words": top_words[i],
+                "emotion_analysis": emotions[i],
+                "readability_scores": readability[i],
+                "sentence_analysis": structures[i],
+                "named_entities": entities[i],
+                "lexical_diversity": len(set(filtered_words)) / len(filtered_words)
+                if filtered_words
+                else 0,
+            }
+        )
+    return results
 
-        features = {
-            "sentiment": sentiment_scores,
-            "word_count": len(words),
-            "unique_words": len(set(filtered_words)),
-            "top_words": dict(word_freq.most_common(10)),
-            "emotion_analysis": emotion_analysis,
-            "readability_scores": readability_scores,
-            "sentence_analysis": sentence_analysis,
-            "named_entities": ner_analysis,
-            "lexical_diversity": lexical_diversity
+def _document_sentiment(scores, doc_index, n_docs):
+    # compound is the mean of the sentence compounds; pos, neu and neg are
+    # shares of the sentences' summed positive, neutral and negative weight
+    counts = np.bincount(doc_index, minlength=n_docs)
+    compound = np.bincount(doc_index, weights=scores.compound, minlength=n_docs)
+    weights = np.stack([np.bincount(doc_index, weights=w, minlength=n_docs)
+                        for w in (scores.neg_sum, scores.neu_count, scores.pos_sum)])
+    totals = weights.sum(axis=0)
+    return [
+        {
+            "neg": round(float(weights[0, i] / totals[i]), 3) if totals[i] else 0.0,
+            "neu": round(float(weights[1, i] / totals[i]), 3) if totals[i] else 0.0,
+            "pos": round(float(weights[2, i] / totals[i]), 3) if totals[i] else 0.0,
+            "compound": round(float(compound[i] / counts[i]), 4) if counts[i] else 0.0,
         }
+        for i in range(n_docs)
+    ]
 
-        logger.info('Completed text analysis')
-        return features
-    except Exception as e:
-        logger.error(f'Error during text analysis: {str(e)}')
-        raise
+def _as_doc(text):
+    # The analyzers accept raw text or an already-parsed Doc
+    return models.nlp.get()(text) if isinstance(text, str) else text
+
+def _sentences(doc):
+    return [sent for sent in doc.sents if sent.text.strip()]
+
+EMOTION_BUCKETS = ("very_positive", "positive", "neutral", "negative", "very_negative")
+# A compound falls in the first bucket whose test it passes, else the last:
+# 0.5 and 0.1 count as the higher bucket, -0.1 and -0.5 as the lower one
+EMOTION_THRESHOLDS = (
+    (operator.ge, 0.5),
+    (operator.ge, 0.1),
+    (operator.gt, -0.1),
+    (operator.gt, -0.5),
+)
+
+def emotion_bucket(compound):
+    thresholds = zip(EMOTION_BUCKETS, EMOTION_THRESHOLDS, strict=False)
+    for bucket, (compare, bound) in thresholds:
+        if compare(compound, bound):
+            return bucket
+    return EMOTION_BUCKETS[-1]
+
+def _emotion_counts_batch(compounds, doc_index, n_docs):
+    # Bucket index of each compound, in EMOTION_BUCKETS order, counted per document
+    compounds = np.asarray(compounds, dtype=float)
+    buckets = np.select(
+        [compare(compounds, bound) for compare, bound in EMOTION_THRESHOLDS],
+        range(len(EMOTION_THRESHOLDS)),
+        len(EMOTION_THRESHOLDS),
+    )
+    counts = np.bincount(
+        doc_index * len(EMOTION_BUCKETS) + buckets,
+        minlength=n_docs * len(EMOTION_BUCKETS),
+    ).reshape(n_docs, len(EMOTION_BUCKETS))
+    return [dict(zip(EMOTION_BUCKETS, map(int, row), strict=True)) for row in counts]
 
 def analyze_emotions(text):
-    sia = SentimentIntensityAnalyzer()
-    sentences = sent_tokenize(text)
-    emotion_counts = {
-        "very_positive": 0,
-        "positive": 0,
-        "neutral": 0,
-        "negative": 0,
-        "very_negative": 0
-    }
+    sentences = _sentences(_as_doc(text))
+    compounds = (
+        models.sentiment_analyzer.get()
+        .score([sent.text for sent in sentences])
+        .compound
+    )
+    return _emotion_counts_batch(compounds, np.zeros(len(sentences), dtype=int), 1)[0]
 
-    for sentence in sentences:
-        scores = sia.polarity_scores(sentence)
-        compound = scores['compound']
-        if compound >= 0.5:
-            emotion_counts["very_positive"] += 1
-        elif 0.1 <= compound < 0.5:
-            emotion_counts["positive"] += 1
-        elif -0.1 < compound < 0.1:
-            emotion_counts["neutral"] += 1
-        elif -0.5 < compound <= -0.1:
-            emotion_counts["negative"] += 1
-        else:
-            emotion_counts["very_negative"] += 1
-
-    return emotion_counts
+def _sentence_structure(sentences):
+    lengths = [sum(1 for token in sent if not token.is_space) for sent in sentences]
+    return {
+        "sentence_count": len(lengths),
+        "avg_sentence_length": sum(lengths) / len(lengths) if lengths else 0,
+        "complex_sentence_ratio": sum(1 for length in lengths if length > 20)
+        / len(lengths)
+        if lengths
+        else 0,
+    }
 
 def analyze_sentence_structure(text):
-    sentences = sent_tokenize(text)
-    return {
-        "sentence_count": len(sentences),
-        "avg_sentence_length": sum(len(word_tokenize(sent)) for sent in sentences) / len(sentences) if sentences else 0,
-        "complex_sentence_ratio": sum(1 for sent in sentences if len(word_tokenize(sent)) > 20) / len(sentences) if sentences else 0
+    return _sentence_structure(_sentences(_as_doc(text)))
+
+@functools.lru_cache(maxsize=65536)
+def _syllable_count(word):
+    # textstat takes seconds to import; only pay for it once readability is needed
+    from textstat import textstat
+    # Pyphen finds no hyphenation point in "a" or "I"; every word has a syllable
+    return max(1, textstat.syllable_count(word))
+
+def analyze_readability(words, sentence_count):
+    """
+    Flesch reading ease, Flesch-Kincaid grade and Gunning fog from
+    already-tokenized words, so the text is not re-tokenized per metric.
+
+    :param words: List of word tokens
+    :param sentence_count: Number of sentences the words came from
+    :return: Dict of readability scores
+    """
+    return _readability_batch([words], [sentence_count])[0]
+
+def _readability_batch(word_lists, sentence_counts):
+    # Syllables are counted once per distinct word in the batch, then the
+    # per-document sums and formulas are computed as arrays
+    vocabulary = {}
+    token_ids = [
+        vocabulary.setdefault(w, len(vocabulary)) for words in word_lists for w in words
+    ]
+    syllables = np.array([_syllable_count(w) for w in vocabulary], dtype=float)[
+        np.array(token_ids, dtype=int)
+    ]
+
+    word_counts = np.array([len(words) for words in word_lists], dtype=float)
+    sentence_counts = np.array(sentence_counts, dtype=float)
+    doc_index = np.repeat(np.arange(len(word_lists)), word_counts.astype(int))
+    syllable_totals = np.bincount(
+        doc_index, weights=syllables, minlength=len(word_lists)
+    )
+    polysyllables = np.bincount(
+        doc_index, weights=syllables >= 3, minlength=len(word_lists)
+    )
+
+    valid = (word_counts > 0) & (sentence_counts > 0)
+    words_per_sentence = np.divide(
+        word_counts, sentence_counts, out=np.zeros_like(word_counts), where=valid
+    )
+    syllables_per_word = np.divide(
+        syllable_totals, word_counts, out=np.zeros_like(word_counts), where=valid
+    )
+    polysyllable_ratio = np.divide(
+        polysyllables, word_counts, out=np.zeros_like(word_counts), where=valid
+    )
+
+    scores = {
+        "flesch_reading_ease": 206.835
+        - 1.015 * words_per_sentence
+        - 84.6 * syllables_per_word,
+        "flesch_kincaid_grade": 0.39 * words_per_sentence
+        + 11.8 * syllables_per_word
+        - 15.59,
+        "gunning_fog": 0.4 * (words_per_sentence + 100 * polysyllable_ratio),
     }
+    return [
+        {
+            name: round(float(values[i]), 2) if valid[i] else 0.0
+            for name, values in scores.items()
+        }
+        for i in range(len(word_lists))
+    ]
 
 def analyze_named_entities(text):
-    doc = nlp(text)
-    entities = [(ent.text, ent.label_) for ent in doc.ents]
-    return {
-        "named_entity_count": len(entities),
-        "entity_types": {ent_type: entities.count(ent_type) for ent_type in set(ent[1] for ent in entities)}
-    }
+    stats = EntityStats()
+    stats.update(_as_doc(text))
+    return stats.to_dict()
+
+class EntityStats:
+    """
+    Named-entity statistics that can be updated one transcript segment at a
+    time, so a live session never has to re-parse what it has already seen.
+
+    :param top_n: Number of most frequent entities reported per label
+    """
+
+    def __init__(self, top_n=5):
+        self.top_n = top_n
+        self.label_counts = collections.Counter()
+        # label -> Counter of entity text
+        self.entity_counts = collections.defaultdict(collections.Counter)
+
+    def update(self, doc):
+        """
+        Add the entities of a parsed segment.
+
+        :param doc: spaCy Doc or Span
+        """
+        for ent in doc.ents:
+            self.label_counts[ent.label_] += 1
+            self.entity_counts[ent.label_][ent.text.strip()] += 1
+        return self
+
+    def merge(self, other):
+        self.label_counts.update(other.label_counts)
+        for label, counts in other.entity_counts.items():
+            self.entity_counts[label].update(counts)
+        return self
+
+    def frequency(self, entity, label=None):
+        if label is not None:
+            return (
+                self.entity_counts[label][entity] if label in self.entity_counts else 0
+            )
+        return sum(counts[entity] for counts in self.entity_counts.values())
+
+    def top_entities(self, label, n=None):
+        counts = self.entity_counts.get(label)
+        return counts.most_common(n or self.top_n) if counts else []
+
+    def to_dict(self):
+        return {
+            "named_entity_count": sum(self.label_counts.values()),
+            "entity_types": dict(self.label_counts),
+            "top_entities": {
+                label: dict(self.top_entities(label)) for label in self.label_counts
+            },
+        }
@@ -0,0 +1,222 @@
+"""
+Voice activity detection and the pause and speech-rate features built on it.
+
+Audio is segmented from its per-frame RMS envelope, which feature extraction
+computes anyway. Each frame's level in dB is compared against a threshold
+set by the recording's own noise floor and peak. Runs of speech frames
+become segments: gaps shorter than MIN_PAUSE_SECONDS are bridged, and
+bursts shorter than MIN_SPEECH_SECONDS are dropped. Syllables are counted
+as prominent level peaks inside speech.
+
+Segments are kept as ``(n, 2)`` arrays of start and end times, and all
+features come from them by array operations. activity_features() turns the
+segments into pause counts, pause-duration statistics, speaking ratio and
+rate per minute. The same function serves recorded audio and live sessions,
+whose segments are the word timings returned with the transcript
+(interval_features()).
+"""
+import numpy as np
+import scipy.signal
+
+# Gaps shorter than this are part of the speech around them, not pauses
+MIN_PAUSE_SECONDS = 0.25
+# Speech segments shorter than this are clicks or noise bursts
+MIN_SPEECH_SECONDS = 0.1
+
+# A frame is speech if it is NOISE_MARGIN_DB above the noise floor (the
+# NOISE_PERCENTILE of frame levels) and within TOP_DB of the loudest frame
+NOISE_PERCENTILE = 10
+NOISE_MARGIN_DB = 6.0
+TOP_DB = 40.0
+# Level floor, as in librosa.amplitude_to_db
+AMIN = 1e-5
+
+# A syllable nucleus is a level peak standing out this far from the dips on
+# either side, at most one per MIN_SYLLABLE_SECONDS
+SYLLABLE_PROMINENCE_DB = 2.0
+MIN_SYLLABLE_SECONDS = 0.1
+
+
+def frame_levels(rms):
+    """
+    :param rms: Per-frame RMS amplitude
+    :return: Per-frame level in dB, as float32
+    """
+    return (20 * np.log10(np.maximum(np.asarray(rms, dtype=np.float32), AMIN))).astype(
+        np.float32
+    )
+
+
+def speech_threshold(levels):
+    """
+    :param levels: Per-frame levels in dB
+    :return: Level in dB above which a frame is speech
+    """
+    noise_floor = np.percentile(levels, NOISE_PERCENTILE)
+    return max(noise_floor + NOISE_MARGIN_DB, float(np.max(levels)) - TOP_DB)
+
+
+def runs(mask):
+    """
+    :param mask: Boolean array
+    :return: ``(n, 2)`` array of the start and end (exclusive) index of each
+        run of True values
+    """
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], mask.view(np.int8), [0]])))
+    return edges.reshape(-1, 2)
+
+
+def clean_segments(segments, min_pause, min_speech):
+    """
+    Bridge gaps shorter than ``min_pause`` and then drop segments shorter
+    than ``min_speech``.
+
+    :param segments: ``(n, 2)`` array of sorted, non-overlapping segments
+    :return: ``(m, 2)`` array of segments, in the same units
+    """
+    if len(segments) == 0:
+        return segments
+    keep_gap = segments[1:, 0] - segments[:-1, 1] >= min_pause
+    segments = np.stack([segments[np.concatenate([[True], keep_gap]), 0],
+                         segments[np.concatenate([keep_gap, [True]]), 1]], axis=1)
+    return segments[segments[:, 1] - segments[:, 0] >= min_speech]
+
+
+def activity_features(segments, duration, units=None):
+    """
+    Pause and rate features from speech segments.
+
+    :param segments: ``(n, 2)`` array of speech start and end times, in seconds
+    :param duration: Seconds the segments were taken from
+    :param units: Syllables, or words, spoken; speech_rate and
+        articulation_rate are in these units per minute
+    :return: Dict of JSON-serializable features
+    """
+    segments = np.asarray(segments, dtype=np.float64).reshape(-1, 2)
+    pauses = segments[1:, 0] - segments[:-1, 1]
+    speaking = float(np.sum(segments[:, 1] - segments[:, 0]))
+    features = {
+        'pause_count': int(len(pauses)),
+        'pause_duration_mean': float(np.mean(pauses)) if len(pauses) else 0.0,
+        'pause_duration_median': float(np.median(pauses)) if len(pauses) else 0.0,
+        'pause_duration_p90': float(np.percentile(pauses, 90)) if len(pauses) else 0.0,
+        'speaking_ratio': speaking / duration if duration > 0 else 0.0,
+    }
+    if units is not None:
+        features['speech_rate'] = units / duration * 60 if duration > 0 else 0.0
+        features['articulation_rate'] = units / speaking * 60 if speaking > 0 else 0.0
+    return features
+
+
+class VoiceActivityDetector:
+    """
+    Segments audio into speech and silence from its RMS envelope.
+
+    Frames can be pushed in blocks of any size as they are computed. Only
+    their levels are kept, four bytes per frame (under 1 MB per hour at the
+    default hop), and segmentation runs over all of them at once, so the
+    result does not depend on how the audio was split.
+
+    :param sr: Sampling rate of the audio
+    :param hop_length: Samples between frames
+    """
+
+    def __init__(self, sr, hop_length):
+        self.sr = sr
+        self.hop_length = hop_length
+        self._levels = np.zeros(1024, dtype=np.float32)
+        self._n_frames = 0
+
+    @property
+    def levels(self):
+        return self._levels[:self._n_frames]
+
+    def push(self, rms):
+        """
+        :param rms: RMS amplitude of the next frames
+        """
+        levels = frame_levels(rms)
+        end = self._n_frames + len(levels)
+        if end > len(self._levels):
+            grown = np.zeros(max(end, 2 * len(self._levels)), dtype=np.float32)
+            grown[:self._n_frames] = self.levels
+            self._levels = grown
+        self._levels[self._n_frames:end] = levels
+        self._n_frames = end
+
+    def segments(self):
+        """
+        :return: ``(n, 2)`` int array of the start and end (exclusive) frame
+            of each speech segment
+        """
+        levels = self.levels
+        if len(levels) == 0:
+            return np.zeros((0, 2), dtype=np.int64)
+        segments = runs(levels > speech_threshold(levels))
+        frames_per_second = self.sr / self.hop_length
+        return clean_segments(
+            segments,
+            MIN_PAUSE_SECONDS * frames_per_second,
+            MIN_SPEECH_SECONDS * frames_per_second,
+        )
+
+    def syllable_count(self, segments):
+        """
+        :param segments: Result of segments()
+        :return: Number of syllable nuclei inside the segments
+        """
+        if len(segments) == 0:
+            return 0
+        distance = max(1, int(round(MIN_SYLLABLE_SECONDS * self.sr / self.hop_length)))
+        peaks, _ = scipy.signal.find_peaks(
+            self.levels, prominence=SYLLABLE_PROMINENCE_DB, distance=distance
+        )
+        # Segments are sorted, so a peak is inside one if it is before the
+        # end of the last segment starting at or before it
+        index = np.searchsorted(segments[:, 0], peaks, side='right') - 1
+        inside = (index >= 0) & (peaks < segments[np.maximum(index, 0), 1])
+        return int(np.count_nonzero(inside))
+
+    def features(self, n_samples=None):
+        """
+        :param n_samples: Length of the audio; defaults to the frames' span
+        :return: activity_features() of the audio pushed so far, with the
+            speech rate in syllables per minute
+        """
+        segments = self.segments()
+        duration = (
+            n_samples if n_samples is not None else self._n_frames * self.hop_length
+        ) / self.sr
+        seconds = np.minimum(segments * (self.hop_length / self.sr), duration)
+        return activity_features(seconds, duration, units=self.syllable_count(segments))
+
+
+def analyze_activity(rms, sr, hop_length, n_samples=None):
+    """
+    :return: VoiceActivityDetector.features() for one RMS envelope
+    """
+    detector = VoiceActivityDetector(sr, hop_length)
+    detector.push(rms)
+    return detector.features(n_samples)
+
+
+def interval_features(intervals, units=None):
+    """
+    activity_features() of speech given as time intervals, such as the word
+    timings of a live transcript. Intervals may touch or overlap; the span
+    from the first start to the last end is the duration.
+
+    :param intervals: ``(n, 2)`` array of start and end times in seconds, sorted
+        by start
+    :param units: Words spoken in the intervals
+    """
+    intervals = np.asarray(intervals, dtype=np.float64).reshape(-1, 2)
+    if len(intervals) == 0:
+        return activity_features(intervals, 0.0, units)
+    # Running maximum of the ends, so an interval nested in an earlier one
+    # does not open a gap
+    intervals = np.stack(
+        [intervals[:, 0], np.maximum.accumulate(intervals[:, 1])], axis=1
+    )
+    segments = clean_segments(intervals, MIN_PAUSE_SECONDS, 0.0)
+    return activity_features(segments, intervals[-1, 1] - intervals[0, 0], units)
@@ -1,23 +1,332 @@
-from flask import jsonify, request, render_template
+from flask import Response, jsonify, request, render_template, url_for
 from flask_socketio import SocketIO
-from modules.text_analysis import analyze_text
-from modules import realtime_transcription, file_transcription, feedback_generation, database
+from werkzeug.utils import secure_filename
+from modules.text_analysis import analyze_text, ANALYZER_VERSION
+from modules.data_integration import integrate_data
+from modules import (
+    file_transcription,
+    feedback_generation,
+    database,
+    audio_storage,
+    result_cache,
+)
+from modules import llm_integration, metrics, models, prompt_builder
+from modules.jobs import JobQueue, QueueFullError, COMPLETED, FAILED
+from modules.live_sessions import LiveSessionManager, SessionLimitError
+from modules.pipeline import Pipeline
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import base64
+import functools
+import json
 import logging
+import os
+import uuid
 
 logger = logging.getLogger(__name__)
 
 # List of allowed audio file extensions
 ALLOWED_EXTENSIONS = {'wav', 'mp3', 'ogg', 'flac', 'm4a', 'mp4'}
 
+# Upload processing pool: concurrent jobs, and queued-plus-running jobs
+# accepted before /upload starts answering 503
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', '2'))
+UPLOAD_QUEUE_LIMIT = int(os.getenv('UPLOAD_QUEUE_LIMIT', '16'))
+# Threads shared by the stages of all running uploads
+PIPELINE_WORKERS = int(os.getenv('PIPELINE_WORKERS', str(UPLOAD_WORKERS * 3)))
+
+# Largest accepted upload, in bytes
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', str(1024 * 1024 * 1024)))
+
+# Analyze uploads with the LLM before generating feedback. Needs
+# ANTHROPIC_API_KEY; fields are streamed to the client as they arrive.
+LLM_ANALYSIS_ENABLED = os.getenv('LLM_ANALYSIS_ENABLED', '').lower() in (
+    '1',
+    'true',
+    'yes',
+)
+
+# Results cached by audio content hash, scoped to the transcription and
+# analysis settings that produced them (see result_cache_version)
+RESULT_CACHE_TTL_SECONDS = int(
+    os.getenv('RESULT_CACHE_TTL_SECONDS', str(result_cache.DEFAULT_TTL_SECONDS))
+)
+RESULT_CACHE_MAX_BYTES = int(
+    os.getenv('RESULT_CACHE_MAX_BYTES', str(result_cache.DEFAULT_MAX_BYTES))
+)
+
+# Concurrent live transcription sessions, and seconds without audio before
+# a session is closed
+LIVE_MAX_SESSIONS = int(os.getenv('LIVE_MAX_SESSIONS', '500'))
+LIVE_IDLE_TIMEOUT_SECONDS = float(os.getenv('LIVE_IDLE_TIMEOUT_SECONDS', '30'))
+
+# Default and largest page size of GET /results
+RESULTS_PAGE_SIZE = 50
+RESULTS_PAGE_MAX = 500
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def parse_time(value):
+    """
+    :param value: Epoch seconds, or an ISO 8601 date or time (UTC if no offset is given)
+    :return: Epoch seconds
+    """
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+@functools.lru_cache(maxsize=None)
+def result_cache_version():
+    """
+    :return: Version of the settings behind a cached result: transcription
+        options, analyzer versions and, with LLM analysis enabled, the model
+        and prompt
+    """
+    # Deferred to the first upload like the rest of the audio analysis, as
+    # importing modules.audio_features loads librosa
+    from modules.audio_features import AUDIO_FEATURES_VERSION
+    return result_cache.make_version(
+        file_transcription.TRANSCRIPTION_OPTIONS,
+        ANALYZER_VERSION,
+        AUDIO_FEATURES_VERSION,
+        *(
+            (
+                llm_integration.MODEL,
+                prompt_builder.PROMPT_VERSION,
+                llm_integration.INPUT_TOKEN_BUDGET,
+            )
+            if LLM_ANALYSIS_ENABLED
+            else ()
+        ),
+    )
+
+def encode_cursor(cursor):
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+def decode_cursor(token):
+    created_at, result_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+    return float(created_at), int(result_id)
+
+def build_upload_pipeline(report, db, filename):
+    """
+    Stages of an upload. Transcription and audio analysis start together as
+    soon as the file is stored; text analysis follows the transcript, and the
+    LLM (when enabled) gets both.
+
+    :param report: Job progress callback, used to stream LLM fields
+    """
+    def transcribe(file_path, mimetype):
+        with open(file_path, 'rb') as f:
+            transcript = file_transcription.transcribe_file(f, mimetype=mimetype)
+        if not transcript:
+            logger.error("Received empty transcript")
+            raise ValueError('Failed to transcribe the file')
+        logger.info("Transcription completed")
+        return transcript
+
+    def extract_audio_features(file_path, content_hash):
+        # librosa and scipy take over a second to import; the app loads
+        # without them and they are imported on the first upload, or up
+        # front by models.warm_up
+        from modules.audio_analysis import analyze_audio
+        return analyze_audio(file_path, content_hash=content_hash)
+
+    def analyze_with_llm(integrated_data, transcript):
+        if not LLM_ANALYSIS_ENABLED:
+            return None
+        return llm_integration.analyze_with_llm(
+            integrated_data, transcript,
+            on_field=lambda key, value: report('llm_analysis', None, {key: value})
+        )
+
+    def generate_feedback(llm_analysis, text_features):
+        # Without an LLM analysis, feedback is generated from the text features
+        return feedback_generation.generate_feedback(llm_analysis or text_features)
+
+    def save(transcript, feedback):
+        return database.save_result(db, filename, transcript, feedback)
+
+    return (
+        Pipeline(inputs=['file_path', 'mimetype', 'content_hash'])
+        .add('transcript', transcribe, ['file_path', 'mimetype'])
+        .add(
+            'audio_features',
+            extract_audio_features,
+            ['file_path', 'content_hash'],
+            optional=True,
+        )
+        .add(
+            'text_features', lambda transcript: analyze_text(transcript), ['transcript']
+        )
+        .add('integrated_data', integrate_data, ['audio_features', 'text_features'])
+        .add(
+            'llm_analysis',
+            analyze_with_llm,
+            ['integrated_data', 'transcript'],
+            optional=True,
+        )
+        .add('feedback', generate_feedback, ['llm_analysis', 'text_features'])
+        .add('result_id', save, ['transcript', 'feedback'])
+    )
+
+def process_upload(
+    report,
+    db,
+    cache,
+    cache_key,
+    executor,
+    file_path,
+    filename,
+    mimetype,
+    breakdown=False,
+    content_hash=None,
+):
+    """
+    :param content_hash: sha256 of the stored file, which keys its decoded audio
+    :param breakdown: Include the time spent in each metrics stage (e.g.
+        ``audio.tempo``, ``llm``) in the result as ``timing_breakdown``
+    """
+    pipeline = build_upload_pipeline(report, db, filename)
+    finished = []
+
+    def on_stage(name, status):
+        # Progress is the share of stages finished so far
+        if status is not None:
+            finished.append(name)
+        report(name, len(finished) / len(pipeline.stages))
+
+    try:
+        with metrics.collect() as stage_seconds, metrics.timed('upload'):
+            results, timings = pipeline.run(
+                executor,
+                on_stage=on_stage,
+                file_path=file_path,
+                mimetype=mimetype,
+                content_hash=content_hash,
+            )
+    finally:
+        # The stored upload is only needed while the pipeline runs
+        try:
+            os.remove(file_path)
+        except OSError as e:
+            logger.warning(f'Could not remove {file_path}: {str(e)}')
+    llm_analysis = (
+        results['llm_analysis'].to_dict() if results['llm_analysis'] else None
+    )
+
+    try:
+        cache.put(
+            cache_key,
+            {
+                'transcript': results['transcript'],
+                'text_features': results['text_features'],
+                'audio_features': results['audio_features'],
+                'analysis': results['feedback'],
+                'llm_analysis': llm_analysis,
+            },
+        )
+    except Exception as e:
+        logger.error(f'Error caching result: {str(e)}')
+
+    stage_times = ', '.join(
+        f"{name} {t['seconds']:.2f}s" for name, t in timings.items()
+    )
+    logger.info(f'Successfully processed file: {filename} ({stage_times})')
+    result = {
+        'transcript': results['transcript'],
+        'audio_features': results['audio_features'],
+        'analysis': results['feedback'],
+        'llm_analysis': llm_analysis,
+        'result_id': results['result_id'],
+        'cache': 'miss',
+        'timings': timings
+    }
+    if breakdown:
+        result['timing_breakdown'] = stage_seconds
+    return result
+
 def init_routes(app, socketio, db):
+    jobs = JobQueue(max_workers=UPLOAD_WORKERS, max_pending=UPLOAD_QUEUE_LIMIT)
+    stages = ThreadPoolExecutor(
+        max_workers=PIPELINE_WORKERS, thread_name_prefix='upload-stage'
+    )
+    cache = result_cache.ResultCache(
+        db, ttl_seconds=RESULT_CACHE_TTL_SECONDS, max_bytes=RESULT_CACHE_MAX_BYTES
+    )
+    live = LiveSessionManager(
+        max_sessions=LIVE_MAX_SESSIONS, idle_timeout=LIVE_IDLE_TIMEOUT_SECONDS
+    )
+    socketio.start_background_task(live.run_reaper)
+    # Threads do not survive a fork; workers forked from a preloaded app
+    # (e.g. gunicorn --preload) start their own reaper
+    os.register_at_fork(
+        after_in_child=lambda: socketio.start_background_task(live.run_reaper)
+    )
+
+    metrics.REGISTRY.register_stats('empathy_jobs', 'Upload job queue', jobs.stats)
+    metrics.REGISTRY.register_stats('empathy_result_cache', 'Result cache', cache.stats)
+    metrics.REGISTRY.register_stats(
+        'empathy_live', 'Live transcription sessions', live.stats
+    )
+    metrics.REGISTRY.register_stats(
+        'empathy_llm', 'LLM usage', llm_integration.usage_stats
+    )
+
+    def sentiment_cache_stats():
+        # Reported once text analysis has loaded the engine, never loading it
+        return (
+            models.sentiment_analyzer.get().stats()
+            if models.sentiment_analyzer.loaded
+            else {}
+        )
+
+    metrics.REGISTRY.register_stats(
+        'empathy_sentiment_cache', 'Sentence sentiment cache', sentiment_cache_stats
+    )
+
+    def job_notifier(sid):
+        # Push job progress to the uploading client's Socket.IO session
+        def notify(job):
+            event = {COMPLETED: 'job_completed', FAILED: 'job_failed'}.get(
+                job.status, 'job_progress'
+            )
+            socketio.emit(event, job.to_dict(), room=sid)
+        return notify
+
+    def lookup_cached_result(cache_key):
+        # A broken cache must never fail an upload; treat errors as a miss
+        try:
+            return cache.get(cache_key)
+        except Exception as e:
+            logger.error(f'Error reading result cache: {str(e)}')
+            return None
+
+    @app.teardown_appcontext
+    def remove_session(_exc):
+        # Release this request's database session back to the pool
+        db.remove()
+
     @app.route('/')
     def index():
         return render_template('index.html')
 
+    # Werkzeug rejects larger request bodies before they are read
+    app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+
+    @app.errorhandler(413)
+    def upload_too_large(_e):
+        logger.warning('Upload rejected: file too large')
+        return jsonify(
+            {'error': f'File too large (limit {MAX_UPLOAD_BYTES} bytes)'}
+        ), 413
+
     @app.route('/upload', methods=['POST'])
     def upload_file():
         if 'file' not in request.files:
@@ -30,61 +339,188 @@ def init_routes(app, socketio, db):
             return jsonify({'error': 'No selected file'}), 400
 
         if file and allowed_file(file.filename):
+            # Clients pass timings=1 for a per-stage timing breakdown
+            breakdown = request.form.get('timings', '').lower() in ('1', 'true', 'yes')
             try:
-                # Send file directly to Deepgram
-                transcript = file_transcription.transcribe_file(file)
-                logger.info("Transcription completed")
+                # Spool to disk in chunks, hashing on the way; the upload is
+                # never held in memory as a whole
+                stored_name = f'{uuid.uuid4().hex}_{secure_filename(file.filename)}'
+                file_path, content_hash, _ = audio_storage.save_stream(
+                    file.stream, stored_name, max_bytes=MAX_UPLOAD_BYTES
+                )
 
-                if not transcript:
-                    logger.error("Received empty transcript")
-                    return jsonify({'error': 'Failed to transcribe the file'}), 500
-
-                # Perform text analysis
-                text_features = analyze_text(transcript)
-
-                # Generate feedback
-                feedback = feedback_generation.generate_feedback(text_features)
-
-                # Save results to database
-                result_id = database.save_result(db, file.filename, transcript, feedback)
-
-                logger.info(f'Successfully processed file: {file.filename}')
-                return jsonify({
-                    'transcript': transcript,
-                    'analysis': feedback,
-                    'result_id': result_id
-                })
+                cache_key = result_cache.make_key(content_hash, result_cache_version())
+                cached = lookup_cached_result(cache_key)
+                if cached is not None:
+                    os.remove(file_path)
+                    with metrics.collect() as stage_seconds:
+                        result_id = database.save_result(
+                            db, file.filename, cached['transcript'], cached['analysis']
+                        )
+                    logger.info(f'Served cached result for file: {file.filename}')
+                    result = {
+                        'transcript': cached['transcript'],
+                        'audio_features': cached.get('audio_features'),
+                        'analysis': cached['analysis'],
+                        'llm_analysis': cached.get('llm_analysis'),
+                        'result_id': result_id,
+                        'cache': 'hit'
+                    }
+                    if breakdown:
+                        result['timing_breakdown'] = stage_seconds
+                    return jsonify(result)
+            except audio_storage.UploadTooLargeError:
+                return upload_too_large(None)
             except Exception as e:
-                logger.error(f'Error processing file: {str(e)}')
+                logger.error(f'Error storing file: {str(e)}')
                 return jsonify({'error': 'An error occurred processing the file'}), 500
+
+            # Clients pass their Socket.IO session id to receive progress events
+            sid = request.form.get('sid')
+            try:
+                job = jobs.submit(
+                    process_upload,
+                    db,
+                    cache,
+                    cache_key,
+                    stages,
+                    file_path,
+                    file.filename,
+                    file.content_type,
+                    breakdown,
+                    content_hash,
+                    on_update=job_notifier(sid) if sid else None,
+                )
+            except QueueFullError:
+                os.remove(file_path)
+                logger.warning('Upload rejected: job queue is full')
+                return (
+                    jsonify({'error': 'Server is busy, please retry later'}),
+                    503,
+                    {'Retry-After': '30'},
+                )
+
+            logger.info(f'Queued job {job.id} for file: {file.filename}')
+            return jsonify({
+                'job_id': job.id,
+                'status_url': url_for('job_status', job_id=job.id)
+            }), 202
         else:
             return jsonify({'error': 'File type not allowed'}), 400
 
+    @app.route('/jobs/<job_id>')
+    def job_status(job_id):
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job.to_dict())
+
+    @app.route('/jobs/metrics')
+    def job_metrics():
+        return jsonify(jobs.stats())
+
+    @app.route('/live/metrics')
+    def live_metrics():
+        return jsonify(live.stats())
+
+    @app.route('/cache/metrics')
+    def cache_metrics():
+        return jsonify(cache.stats())
+
+    @app.route('/results')
+    def list_results():
+        # Query parameters: fields (comma separated), since, until, filename,
+        # limit, and cursor from the previous page
+        fields = request.args.get('fields')
+        fields = tuple(fields.split(',')) if fields else database.DEFAULT_LIST_FIELDS
+        try:
+            since = request.args.get('since')
+            until = request.args.get('until')
+            cursor = request.args.get('cursor')
+            limit = int(request.args.get('limit', RESULTS_PAGE_SIZE))
+            if not 1 <= limit <= RESULTS_PAGE_MAX:
+                raise ValueError(f'limit must be between 1 and {RESULTS_PAGE_MAX}')
+            page, next_cursor = database.list_results(
+                db, fields=fields, filename=request.args.get('filename'), limit=limit,
+                since=parse_time(since) if since else None,
+                until=parse_time(until) if until else None,
+                after=decode_cursor(cursor) if cursor else None
+            )
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'Invalid query: {str(e)}'}), 400
+        return jsonify({
+            'results': page,
+            'next_cursor': encode_cursor(next_cursor) if next_cursor else None
+        })
+
+    @app.route('/results/<int:result_id>')
+    def get_result(result_id):
+        result = database.get_result(db, result_id)
+        if result is None:
+            return jsonify({'error': 'Result not found'}), 404
+        return jsonify(
+            {field: getattr(result, field) for field in database.RESULT_FIELDS}
+        )
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
     @socketio.on('start_transcription')
     def handle_start_transcription():
+        sid = request.sid
         try:
-            dg_connection = realtime_transcription.start_realtime_transcription(request.sid)
-            socketio.emit('transcription_started', room=request.sid)
-            logger.info(f'Started real-time transcription for session: {request.sid}')
+            def emit(event, data):
+                socketio.emit(event, data, room=sid)
+
+            live.start(sid, emit)
+            socketio.emit('transcription_started', room=sid)
+            logger.info(f'Started real-time transcription for session: {sid}')
+        except SessionLimitError as e:
+            logger.warning(str(e))
+            socketio.emit(
+                'transcription_error',
+                {'error': 'Too many live sessions, try again later'},
+                room=sid,
+            )
         except Exception as e:
             logger.error(f'Error starting transcription: {str(e)}')
-            socketio.emit('transcription_error', {'error': 'Failed to start transcription'}, room=request.sid)
+            socketio.emit(
+                'transcription_error',
+                {'error': 'Failed to start transcription'},
+                room=sid,
+            )
 
     @socketio.on('audio_stream')
     def handle_audio_stream(audio_chunk):
-        try:
-            # Send audio chunk to Deepgram
-            dg_connection.send(audio_chunk)
-            logger.debug('Processed audio chunk')
-        except Exception as e:
-            logger.error(f'Error processing audio stream: {str(e)}')
+        if not live.send(request.sid, audio_chunk):
+            logger.debug(f'Audio chunk not accepted for session: {request.sid}')
 
     @socketio.on('stop_transcription')
     def handle_stop_transcription():
+        sid = request.sid
         try:
-            realtime_transcription.stop_realtime_transcription(dg_connection)
-            socketio.emit('transcription_stopped', room=request.sid)
-            logger.info(f'Stopped real-time transcription for session: {request.sid}')
+            if not live.finish(sid):
+                socketio.emit(
+                    'transcription_error',
+                    {'error': 'No transcription in progress'},
+                    room=sid,
+                )
+                return
+            socketio.emit('transcription_stopped', room=sid)
+            logger.info(f'Stopped real-time transcription for session: {sid}')
         except Exception as e:
             logger.error(f'Error stopping transcription: {str(e)}')
-            socketio.emit('transcription_error', {'error': 'Failed to stop transcription'}, room=request.sid)
\ No newline at end of file
+            socketio.emit(
+                'transcription_error',
+                {'error': 'Failed to stop transcription'},
+                room=sid,
+            )
+
+    @socketio.on('disconnect')
+    def handle_disconnect():
+        if live.finish(request.sid):
+            logger.info(
+                'Closed real-time transcription for disconnected session: '
+                f'{request.sid}'
+            )
@@ -0,0 +1,62 @@
+import librosa
+import numpy as np
+import pytest
+
+from modules.audio_features import FeatureEngine, extract_features
+
+
+@pytest.fixture
+def speech_signal():
+    sr = 22050
+    t = np.arange(3 * sr) / sr
+    rng = np.random.default_rng(0)
+    # Amplitude-modulated harmonic tone with a noise floor
+    y = 0.3 * np.sin(2 * np.pi * 150 * t) * (
+        0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)
+    ) + 0.01 * rng.standard_normal(len(t))
+    return y.astype(np.float32), sr
+
+def test_shared_stft_matches_direct_librosa_calls(speech_signal):
+    y, sr = speech_signal
+    engine = FeatureEngine(y, sr)
+
+    np.testing.assert_allclose(
+        engine.spectral_centroid(), librosa.feature.spectral_centroid(y=y, sr=sr)[0]
+    )
+    np.testing.assert_allclose(
+        engine.spectral_rolloff(), librosa.feature.spectral_rolloff(y=y, sr=sr)[0]
+    )
+    np.testing.assert_allclose(
+        engine.mfccs(),
+        librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13),
+        rtol=1e-5,
+        atol=1e-4,
+    )
+    np.testing.assert_allclose(engine.chroma(), librosa.feature.chroma_stft(y=y, sr=sr))
+    np.testing.assert_allclose(
+        engine.onset_envelope, librosa.onset.onset_strength(y=y, sr=sr)
+    )
+
+    y_harm, y_perc = engine.hpss
+    np.testing.assert_allclose(y_harm, librosa.effects.harmonic(y), atol=1e-7)
+    np.testing.assert_allclose(y_perc, librosa.effects.percussive(y), atol=1e-7)
+
+def test_stft_is_computed_once(speech_signal, monkeypatch):
+    y, sr = speech_signal
+    calls = []
+    original_stft = librosa.stft
+
+    def counting_stft(*args, **kwargs):
+        calls.append(1)
+        return original_stft(*args, **kwargs)
+
+    # librosa reaches stft through several namespaces internally
+    monkeypatch.setattr(librosa, 'stft', counting_stft)
+    monkeypatch.setattr(librosa.core, 'stft', counting_stft)
+    monkeypatch.setattr(librosa.core.spectrum, 'stft', counting_stft)
+
+    features = extract_features(y, sr)
+
+    assert len(calls) == 1
+    assert len(features['mfccs']) == 13
+    assert len(features['chroma']) == 12
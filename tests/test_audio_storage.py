@@ -0,0 +1,199 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+
+import librosa
+import numpy as np
+import pytest
+import soundfile as sf
+
+from modules import audio_storage, audio_streaming
+
+
+@pytest.fixture(autouse=True)
+def storage_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_storage, 'AUDIO_STORAGE_DIR', str(tmp_path / 'audio'))
+    monkeypatch.setattr(audio_storage, 'PCM_CACHE_DIR', None)
+    return tmp_path / 'audio'
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    calls = []
+    read_blocks = audio_streaming.read_blocks
+
+    def counting_read_blocks(file_path, sr):
+        calls.append(file_path)
+        return read_blocks(file_path, sr=sr)
+
+    monkeypatch.setattr(audio_streaming, 'read_blocks', counting_read_blocks)
+    return calls
+
+
+def write_tone(path, seconds, sr=44100, frequency=220):
+    t = np.arange(int(seconds * sr)) / sr
+    stereo = np.stack(
+        [np.sin(2 * np.pi * frequency * t), np.sin(2 * np.pi * 2 * frequency * t)],
+        axis=1,
+    )
+    sf.write(str(path), (0.3 * stereo).astype(np.float32), sr, subtype='FLOAT')
+    return str(path)
+
+
+def pcm_artifacts():
+    return [
+        name
+        for name in os.listdir(audio_storage.pcm_cache_dir())
+        if name.endswith('.f32')
+    ]
+
+
+@pytest.mark.usefixtures('storage_dir')
+def test_save_stream_copies_and_hashes_in_chunks():
+    data = os.urandom(5 * 1024 + 3)
+    reads = []
+
+    class Stream(io.BytesIO):
+        def read(self, size=-1):
+            reads.append(size)
+            return super().read(size)
+
+    file_path, digest, size = audio_storage.save_stream(
+        Stream(data), 'call.wav', chunk_size=1024
+    )
+
+    with open(file_path, 'rb') as f:
+        assert f.read() == data
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert size == len(data)
+    assert set(reads) == {1024}
+
+
+def test_save_stream_enforces_max_bytes(storage_dir):
+    with pytest.raises(audio_storage.UploadTooLargeError):
+        audio_storage.save_stream(
+            io.BytesIO(b'x' * 2048), 'big.wav', max_bytes=2047, chunk_size=512
+        )
+
+    assert os.listdir(storage_dir) == []
+
+
+def test_load_pcm_decodes_once(tmp_path, decodes):
+    path = write_tone(tmp_path / 'call.wav', 2.0)
+    copy = tmp_path / 'copy.wav'
+    shutil.copyfile(path, copy)
+
+    first = audio_storage.load_pcm(path)
+    second = audio_storage.load_pcm(str(copy))
+
+    assert decodes == [path]
+    assert isinstance(second, np.memmap) and not second.flags.writeable
+    np.testing.assert_array_equal(first, second)
+    # Downmixed and resampled like librosa.load
+    expected, _ = librosa.load(path, sr=audio_storage.PCM_SAMPLE_RATE)
+    np.testing.assert_allclose(second, expected, atol=1e-4)
+    assert pcm_artifacts() == [f'{audio_storage.file_hash(path)}_22050.f32']
+
+
+def test_least_recently_used_pcm_is_evicted(tmp_path, monkeypatch, decodes):
+    paths = [
+        write_tone(tmp_path / f'{name}.wav', 1.0, frequency=f)
+        for name, f in (('a', 200), ('b', 300), ('c', 400))
+    ]
+    artifact_bytes = audio_storage.PCM_SAMPLE_RATE * 4
+    monkeypatch.setattr(audio_storage, 'PCM_CACHE_MAX_BYTES', int(2.5 * artifact_bytes))
+
+    artifacts = []
+    for age, path in zip((200, 100), paths[:2], strict=True):
+        audio_storage.load_pcm(path)
+        artifacts.append(
+            os.path.join(
+                audio_storage.pcm_cache_dir(),
+                f'{audio_storage.file_hash(path)}_22050.f32',
+            )
+        )
+        os.utime(artifacts[-1], (0, age))
+    # Reading a again makes b the least recently used
+    audio_storage.load_pcm(paths[0])
+    audio_storage.load_pcm(paths[2])
+
+    assert os.path.exists(artifacts[0]) and not os.path.exists(artifacts[1])
+    assert len(pcm_artifacts()) == 2
+    assert decodes == paths
+
+
+def test_concurrent_eviction_never_breaks_a_load(tmp_path):
+    paths = [
+        write_tone(tmp_path / f'{f}.wav', 0.2, frequency=f) for f in (200, 300, 400)
+    ]
+    errors = []
+
+    def load():
+        try:
+            for i in range(30):
+                assert len(audio_storage.load_pcm(paths[i % 3])) == int(
+                    0.2 * audio_storage.PCM_SAMPLE_RATE
+                )
+        except Exception as e:
+            errors.append(e)
+
+    def evict():
+        for _ in range(200):
+            if os.path.isdir(audio_storage.pcm_cache_dir()):
+                audio_storage.evict_pcm(max_bytes=0)
+
+    threads = [threading.Thread(target=load) for _ in range(4)] + [
+        threading.Thread(target=evict)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+
+
+def hold_pcm_cache_lock(locked, release):
+    with audio_storage._pcm_cache_lock():
+        locked.set()
+        release.wait(10)
+
+
+def test_cache_lock_is_held_across_processes():
+    context = multiprocessing.get_context('fork')
+    locked, release = context.Event(), context.Event()
+    holder = context.Process(target=hold_pcm_cache_lock, args=(locked, release))
+    holder.start()
+    assert locked.wait(10)
+
+    evictor = threading.Thread(target=audio_storage.evict_pcm)
+    evictor.start()
+    # Eviction waits for the other process to release the lock
+    evictor.join(0.2)
+    assert evictor.is_alive()
+    release.set()
+    evictor.join(10)
+    holder.join(10)
+
+    assert not evictor.is_alive() and holder.exitcode == 0
+
+
+def test_eviction_deletes_stale_partial_artifacts(tmp_path):
+    path = write_tone(tmp_path / 'call.wav', 0.2)
+    audio_storage.load_pcm(path)
+    directory = audio_storage.pcm_cache_dir()
+    stale, fresh = os.path.join(directory, 'a.part'), os.path.join(directory, 'b.part')
+    for partial in (stale, fresh):
+        with open(partial, 'wb') as f:
+            f.write(b'\0' * 16)
+    old = time.time() - audio_storage.PCM_PARTIAL_MAX_AGE_SECONDS - 1
+    os.utime(stale, (old, old))
+
+    assert audio_storage.evict_pcm() == 0
+
+    assert not os.path.exists(stale)
+    assert os.path.exists(fresh)
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+from modules import audio_storage
+from modules.audio_analysis import analyze_audio
+from modules.audio_features import extract_features
+from modules.audio_streaming import StreamingFeatureAccumulator
+
+
+@pytest.fixture
+def speech_signal():
+    sr = 22050
+    t = np.arange(6 * sr) / sr
+    rng = np.random.default_rng(0)
+    # Harmonic "syllables" separated by quiet gaps, over a noise floor
+    voiced = np.sin(2 * np.pi * 140 * t) + 0.5 * np.sin(2 * np.pi * 280 * t)
+    gate = (np.sin(2 * np.pi * 1.5 * t) > -0.3).astype(float)
+    y = 0.3 * voiced * gate + 0.005 * rng.standard_normal(len(t))
+    return y.astype(np.float32), sr
+
+def assert_features_close(expected, actual, rtol):
+    assert expected.keys() == actual.keys()
+    for key in expected:
+        np.testing.assert_allclose(actual[key], expected[key], rtol=rtol, err_msg=key)
+
+def test_streaming_matches_in_memory_features(speech_signal):
+    y, sr = speech_signal
+    expected = extract_features(y, sr)
+
+    # Small, uneven pushes and blocks exercise every carry-over path
+    accumulator = StreamingFeatureAccumulator(sr=sr, block_frames=40)
+    for start in range(0, len(y), 7919):
+        accumulator.push(y[start:start + 7919])
+    actual = accumulator.finish()
+
+    # librosa's Burg LPC runs in float32; compare formants against float64
+    expected_formants = extract_features(y.astype(np.float64), sr)['formants']
+    np.testing.assert_allclose(actual.pop('formants'), expected_formants, rtol=1e-6)
+    expected.pop('formants')
+    assert_features_close(expected, actual, rtol=1e-3)
+
+@pytest.mark.parametrize('pcm_cache_bytes', [0, 1024 ** 3])
+def test_analyze_audio_streaming_mode(
+    speech_signal, tmp_path, monkeypatch, pcm_cache_bytes
+):
+    monkeypatch.setattr(audio_storage, 'AUDIO_STORAGE_DIR', str(tmp_path / 'audio'))
+    monkeypatch.setattr(audio_storage, 'PCM_CACHE_MAX_BYTES', pcm_cache_bytes)
+    y, sr = speech_signal
+    file_path = str(tmp_path / 'call.wav')
+    sf.write(file_path, y, sr, subtype='FLOAT')
+
+    in_memory = analyze_audio(file_path)
+    streamed = analyze_audio(file_path, streaming=True)
+
+    in_memory.pop('formants')
+    streamed.pop('formants')
+    assert_features_close(in_memory, streamed, rtol=1e-3)
@@ -0,0 +1,134 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+from modules import batch_analysis, database
+from modules.batch_analysis import batch_key, find_jobs, run_batch
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'results.db'}")
+    return database.get_db()
+
+@pytest.fixture
+def call_directory(tmp_path):
+    directory = tmp_path / 'calls'
+    (directory / 'team_a').mkdir(parents=True)
+    sr = 22050
+    t = np.arange(2 * sr) / sr
+    for name in ['call_1.wav', 'team_a/call_2.wav']:
+        sf.write(str(directory / name), 0.3 * np.sin(2 * np.pi * 150 * t), sr)
+    (directory / 'notes.md').write_text('not a call')
+    return directory
+
+def test_find_jobs_pairs_by_stem(tmp_path):
+    (tmp_path / 'call.wav').write_bytes(b'')
+    (tmp_path / 'call.txt').write_text('hello')
+    (tmp_path / 'other.txt').write_text('hi')
+
+    jobs = find_jobs(str(tmp_path))
+
+    assert jobs == [
+        ('call', str(tmp_path / 'call.wav'), str(tmp_path / 'call.txt')),
+        ('other', None, str(tmp_path / 'other.txt')),
+    ]
+
+def test_run_batch_saves_results_and_resumes(call_directory, db):
+    stats = run_batch(str(call_directory), db=db, workers=2, commit_every=1)
+
+    assert stats['processed'] == 2
+    assert stats['failed'] == 0
+    assert stats['audio_seconds'] == pytest.approx(4.0)
+    assert database.get_processed_filenames(
+        db, ['call_1', 'team_a/call_2', 'call_3'], batch_key()
+    ) == {'call_1', 'team_a/call_2'}
+    row = db.query(database.Result).filter(database.Result.filename == 'call_1').one()
+    assert len(row.analysis['audio_features']['mfccs']) == 13
+
+    rerun = run_batch(str(call_directory), db=db, workers=2)
+
+    assert rerun['processed'] == 0
+    assert rerun['skipped'] == 2
+    assert db.query(database.Result).count() == 2
+
+def test_resume_is_scoped_to_the_batch_key(call_directory, db, monkeypatch):
+    # An upload of the same file name is not a batch result
+    database.save_result(db, 'call_1', 'hello', {})
+
+    runs = [
+        run_batch(str(call_directory), db=db, workers=1),
+        run_batch(str(call_directory), db=db, workers=1, run_id='2026-10-18'),
+        run_batch(str(call_directory), db=db, workers=1, rescore=True),
+    ]
+    # A new analyzer version re-scores every call
+    monkeypatch.setattr('modules.audio_features.AUDIO_FEATURES_VERSION', 'bumped')
+    runs.append(run_batch(str(call_directory), db=db, workers=1))
+
+    assert [stats['processed'] for stats in runs] == [2, 2, 2, 2]
+    assert db.query(database.Result).count() == 9
+
+def test_streaming_defaults_to_analyze_audio_choice(monkeypatch):
+    from modules import audio_analysis
+
+    calls = []
+    monkeypatch.setattr(
+        audio_analysis,
+        'analyze_audio',
+        lambda _path, streaming: calls.append(streaming) or {},
+    )
+    monkeypatch.setattr('librosa.get_duration', lambda **_kwargs: 1.0)
+    job = ('call', 'call.wav', None)
+
+    batch_analysis._init_worker(False, None)
+    batch_analysis._analyze_job(job)
+    batch_analysis._init_worker(False, True)
+    batch_analysis._analyze_job(job)
+
+    assert calls == [None, True]
+
+def test_llm_batch_results_are_stored(call_directory, db, monkeypatch):
+    from benchmarks.stub_api import LLM_ANALYSIS, StubAPIServer
+    from modules import clients
+    from modules.batch_analysis import collect_llm_batch
+
+    with StubAPIServer() as stub:
+        monkeypatch.setenv('ANTHROPIC_API_KEY', 'test')
+        monkeypatch.setenv('ANTHROPIC_BASE_URL', stub.url)
+        clients.reset_clients()
+
+        stats = run_batch(str(call_directory), db=db, workers=2, llm_batch=True)
+        collected = collect_llm_batch(stats['llm_batch_id'], db=db, poll_interval=0.01)
+        clients.reset_clients()
+
+    assert collected == {'updated': 2, 'failed': 0}
+    for row in db.query(database.Result):
+        assert row.analysis['llm_analysis'] == LLM_ANALYSIS
+        assert 'audio_features' in row.analysis
+
+def test_failed_llm_batch_requests_keep_existing_analysis(
+    call_directory, db, monkeypatch
+):
+    from benchmarks.stub_api import LLM_ANALYSIS, StubAPIServer
+    from modules import clients, llm_integration
+    from modules.batch_analysis import collect_llm_batch
+
+    with StubAPIServer() as stub:
+        monkeypatch.setenv('ANTHROPIC_API_KEY', 'test')
+        monkeypatch.setenv('ANTHROPIC_BASE_URL', stub.url)
+        clients.reset_clients()
+
+        stats = run_batch(str(call_directory), db=db, workers=2, llm_batch=True)
+        collect_llm_batch(stats['llm_batch_id'], db=db, poll_interval=0.01)
+        # Re-analyze both results; one request fails
+        rows = db.query(database.Result).order_by(database.Result.id).all()
+        stub.batch_errors = {f'result-{rows[0].id}'}
+        batch_id = llm_integration.submit_batch(
+            (f'result-{row.id}', row.analysis, row.transcript) for row in rows
+        )
+        collected = collect_llm_batch(batch_id, db=db, poll_interval=0.01)
+        clients.reset_clients()
+
+    assert collected == {'updated': 1, 'failed': 1}
+    for row in db.query(database.Result):
+        assert row.analysis['llm_analysis'] == LLM_ANALYSIS
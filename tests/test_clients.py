@@ -0,0 +1,106 @@
+import asyncio
+import io
+import threading
+
+import pytest
+
+from benchmarks.stub_api import LLM_ANALYSIS, TRANSCRIPT, StubAPIServer
+from modules import clients, file_transcription, llm_integration
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    with StubAPIServer() as server:
+        monkeypatch.setenv('DEEPGRAM_API_KEY', 'test')
+        monkeypatch.setenv('DEEPGRAM_URL', server.url)
+        monkeypatch.setenv('ANTHROPIC_API_KEY', 'test')
+        monkeypatch.setenv('ANTHROPIC_BASE_URL', server.url)
+        monkeypatch.setenv('CLIENT_MAX_CONCURRENCY', '2')
+        # Keep retry backoff short
+        monkeypatch.setattr(clients, 'RETRY_BASE_DELAY', 0.01)
+        clients.reset_clients()
+        yield server
+        clients.reset_clients()
+
+
+def transcribe():
+    return file_transcription.transcribe_file(io.BytesIO(b'RIFF'), mimetype='audio/wav')
+
+
+def test_requests_reuse_pooled_connections(stub):
+    for _ in range(5):
+        assert transcribe() == TRANSCRIPT
+        assert (
+            llm_integration.analyze_with_llm({'word_count': 3}).to_dict()
+            == LLM_ANALYSIS
+        )
+
+    assert stub.requests == {'/v1/listen': 5, '/v1/messages': 5}
+    # One keep-alive connection per service
+    assert stub.connections == 2
+
+
+def test_rate_limited_requests_are_retried(stub):
+    stub.fail_next(2)
+    assert transcribe() == TRANSCRIPT
+    stub.fail_next(2)
+    assert llm_integration.analyze_with_llm({'word_count': 3}).to_dict() == LLM_ANALYSIS
+    assert stub.requests == {'/v1/listen': 3, '/v1/messages': 3}
+
+    # Client errors are not retried
+    stub.fail_next(1, status=400)
+    with pytest.raises(clients.DeepgramApiError):
+        transcribe()
+    assert stub.requests['/v1/listen'] == 4
+
+
+def test_concurrency_is_limited(stub):
+    stub.latency = 0.05
+    threads = [threading.Thread(target=transcribe) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert stub.requests['/v1/listen'] == 8
+    assert stub.max_in_flight == 2
+
+
+def test_async_clients(stub):
+    stub.latency = 0.05
+
+    async def run():
+        transcripts = [
+            file_transcription.transcribe_file_async(
+                io.BytesIO(b'RIFF'), mimetype='audio/wav'
+            )
+            for _ in range(4)
+        ]
+        analyses = [
+            llm_integration.analyze_with_llm_async({'word_count': 3}) for _ in range(4)
+        ]
+        return await asyncio.gather(*transcripts, *analyses)
+
+    results = asyncio.run(run())
+
+    assert results[:4] == [TRANSCRIPT] * 4
+    assert [r.to_dict() for r in results[4:]] == [LLM_ANALYSIS] * 4
+    assert stub.max_in_flight <= 4
+
+
+def test_files_are_streamed_and_resent_on_retry(stub, tmp_path):
+    path = tmp_path / 'call.wav'
+    path.write_bytes(b'\x01' * (3 * 1024 * 1024 + 17))
+    stub.fail_next(1)
+
+    with open(path, 'rb') as f:
+        assert file_transcription.transcribe_file(f, mimetype='audio/wav') == TRANSCRIPT
+    with open(path, 'rb') as f:
+        assert (
+            asyncio.run(
+                file_transcription.transcribe_file_async(f, mimetype='audio/wav')
+            )
+            == TRANSCRIPT
+        )
+
+    assert stub.body_sizes['/v1/listen'] == [path.stat().st_size] * 3
@@ -0,0 +1,47 @@
+import numpy as np
+
+from modules.data_integration import integrate_data
+
+TEXT_FEATURES = {
+    'sentiment': {'compound': np.float64(0.5)},
+    'word_count': 12,
+    'unique_words': 9,
+    'top_words': [('refund', 3)],
+    'readability': {'flesch_reading_ease': 62.8},
+}
+
+
+def test_without_audio_features_text_features_have_the_same_shape():
+    audio_features = {
+        'tempo': 120.0,
+        'spectral_centroid': 1500.0,
+        'spectral_rolloff': 3000.0,
+        'mfccs': np.zeros(13),
+        'pitch_mean': 150.0,
+        'pitch_variability': 20.0,
+        'energy_mean': 0.1,
+        'energy_variability': 0.02,
+        'speech_rate': 3.0,
+        'articulation_rate': 4.0,
+        'speaking_ratio': 0.7,
+        'pause_count': 4,
+        'pause_duration_mean': 0.5,
+        'pause_duration_median': 0.4,
+        'pause_duration_p90': 0.9,
+        'voice_quality_hnr': 12.0,
+        'formants': [500.0, 1500.0],
+        'chroma': [0.1] * 12,
+    }
+
+    with_audio = integrate_data(audio_features, TEXT_FEATURES)
+    without_audio = integrate_data(None, TEXT_FEATURES)
+
+    assert 'audio_features' not in without_audio
+    assert without_audio == {
+        key: value for key, value in with_audio.items() if key != 'audio_features'
+    }
+    assert without_audio['text_features'] == {
+        'sentiment': {'compound': 0.5},
+        'word_count': 12,
+        'unique_words': 9,
+    }
@@ -0,0 +1,189 @@
+import sqlite3
+import threading
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import inspect, text
+
+from modules import database
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'results.db'}")
+    db = database.get_db()
+    yield db
+    db.remove()
+
+
+def test_parallel_writers_share_one_registry(db):
+    writers, per_writer = 16, 25
+    ids, errors = [], []
+    start = threading.Barrier(writers)
+
+    def write(n):
+        start.wait()
+        try:
+            for i in range(per_writer):
+                ids.append(database.save_result(db, f'call_{n}_{i}', 'hello', {'n': n}))
+            database.save_results(
+                db, [{'filename': f'bulk_{n}', 'transcript': '', 'analysis': {}}]
+            )
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db.remove()
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(set(ids)) == writers * per_writer
+    assert db.query(database.Result).count() == writers * (per_writer + 1)
+    assert db.connection().execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+
+
+def test_bulk_insert_returns_ids_in_order(db):
+    ids = database.save_results(
+        db,
+        [
+            {'filename': f'call_{i}', 'transcript': str(i), 'analysis': {}}
+            for i in range(50)
+        ],
+    )
+
+    assert ids == sorted(ids) and len(ids) == 50
+    rows = {row.id: row for row in db.query(database.Result)}
+    assert [rows[i].transcript for i in ids] == [str(i) for i in range(50)]
+    assert all(row.created_at for row in rows.values())
+    assert database.save_results(db, []) == []
+
+
+def test_existing_database_is_migrated(tmp_path, monkeypatch):
+    path = tmp_path / 'old.db'
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            'CREATE TABLE results (id INTEGER PRIMARY KEY, filename VARCHAR, '
+            'transcript VARCHAR, analysis JSON)'
+        )
+        connection.execute(
+            'INSERT INTO results (filename, transcript, analysis) '
+            """VALUES ('old', 'hi', '{"score": 1}')"""
+        )
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{path}')
+
+    db = database.get_db()
+    database.save_result(db, 'new', 'hello', {})
+
+    columns = {
+        column['name'] for column in inspect(db.get_bind()).get_columns('results')
+    }
+    indexes = {index['name'] for index in inspect(db.get_bind()).get_indexes('results')}
+    assert {'created_at', 'batch_key'} <= columns
+    assert {
+        'ix_results_created_at_id',
+        'ix_results_filename_created_at_id',
+        'ix_results_batch_key_filename',
+    } <= indexes
+    # Rows from before batch keys never count as processed by a batch
+    assert database.get_processed_filenames(db, ['old', 'new'], 'run') == set()
+    # Rows written as text before compression still read back
+    old = database.get_result(db, 1)
+    assert (old.transcript, old.analysis, old.created_at) == ('hi', {'score': 1}, 0)
+    db.remove()
+
+    # Later starts leave created_at alone
+    with sqlite3.connect(path) as connection:
+        connection.execute("INSERT INTO results (filename) VALUES ('unstamped')")
+    database._migrate(db.get_bind())
+    with sqlite3.connect(path) as connection:
+        assert connection.execute(
+            "SELECT created_at FROM results WHERE filename = 'unstamped'"
+        ).fetchone() == (None,)
+
+
+def test_forked_processes_open_their_own_connections(db):
+    database.save_result(db, 'call', 'hello', {})
+    db.remove()
+    pool = db.get_bind().pool
+    assert pool.checkedin() == 1
+
+    database.dispose_engines()
+
+    assert db.get_bind().pool is not pool
+    assert db.get_bind().pool.checkedin() == 0
+    assert database.get_result(db, 1).filename == 'call'
+
+
+def test_text_columns_on_other_databases_are_refused():
+    engine = SimpleNamespace(dialect=SimpleNamespace(name='mysql'))
+
+    with pytest.raises(RuntimeError, match='transcript, analysis must be converted'):
+        database._convert_to_binary(engine, ['transcript', 'analysis'])
+
+
+@pytest.mark.parametrize('codec', ['none', 'zlib', 'zstd'])
+def test_large_values_are_stored_compressed(db, monkeypatch, codec):
+    monkeypatch.setattr(database, 'RESULT_COMPRESSION', codec)
+    transcript = 'Thank you for calling, how can I help you today? ' * 200
+    analysis = {'scores': list(range(500))}
+    result_id = database.save_result(db, 'call', transcript, analysis)
+    database.save_result(db, 'short', 'hi', {})
+
+    stored = dict(
+        db.connection()
+        .execute(text('SELECT filename, length(transcript) FROM results'))
+        .fetchall()
+    )
+    if codec == 'none':
+        assert stored['call'] > len(transcript)
+    else:
+        assert stored['call'] < len(transcript) / 10
+    assert stored['short'] == len('hi') + 1
+    db.expunge_all()
+    row = database.get_result(db, result_id)
+    assert (row.transcript, row.analysis) == (transcript, analysis)
+
+
+def test_list_results_pages_by_keyset(db):
+    database.save_results(
+        db,
+        [
+            {
+                'filename': f'call_{i % 3}',
+                'transcript': 'x' * 1000,
+                'analysis': {'i': i},
+            }
+            for i in range(25)
+        ],
+    )
+    database.save_result(db, 'latest', 'hello', {})
+
+    pages, cursor = [], None
+    while True:
+        page, cursor = database.list_results(db, limit=10, after=cursor)
+        pages.append(page)
+        if cursor is None:
+            break
+    ids = [row['id'] for page in pages for row in page]
+    assert [len(page) for page in pages] == [10, 10, 6]
+    assert ids == list(range(26, 0, -1))
+    assert set(pages[0][0]) == {'id', 'filename', 'created_at'}
+
+    page, cursor = database.list_results(
+        db, fields=('id', 'analysis'), filename='call_1', limit=100
+    )
+    assert cursor is None
+    assert [row['analysis']['i'] for row in page] == list(range(22, 0, -3))
+
+    latest, _ = database.list_results(db, since=db.get(database.Result, 26).created_at)
+    older, _ = database.list_results(
+        db, until=db.get(database.Result, 26).created_at, limit=100
+    )
+    assert [row['filename'] for row in latest] == ['latest']
+    assert len(older) == 25
+    with pytest.raises(ValueError):
+        database.list_results(db, fields=('id', 'password'))
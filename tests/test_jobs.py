@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+
+from modules.jobs import COMPLETED, FAILED, JobQueue, QueueFullError
+
+
+def wait_for(job, timeout=5):
+    deadline = time.time() + timeout
+    while job.status not in (COMPLETED, FAILED):
+        assert time.time() < deadline, 'job did not finish in time'
+        time.sleep(0.01)
+
+def test_job_reports_progress_and_result():
+    queue = JobQueue(max_workers=1)
+    updates = []
+
+    def work(report, value):
+        report('halfway', 0.5)
+        report('halfway', partial={'tone': 'calm'})
+        report('halfway', partial={'key_points': []})
+        return value * 2
+
+    job = queue.submit(
+        work,
+        21,
+        on_update=lambda j: updates.append(
+            (j.status, j.stage, j.progress, dict(j.partial))
+        ),
+    )
+    wait_for(job)
+
+    assert job.result == 42
+    assert queue.get(job.id).to_dict()['status'] == COMPLETED
+    assert ('running', 'halfway', 0.5, {}) in updates
+    assert ('running', 'halfway', 0.5, {'tone': 'calm', 'key_points': []}) in updates
+    assert updates[-1][0] == COMPLETED
+    queue.shutdown()
+
+def test_failed_job_records_error():
+    queue = JobQueue(max_workers=1)
+
+    def work(_report):
+        raise ValueError('boom')
+
+    job = queue.submit(work)
+    wait_for(job)
+
+    assert job.status == FAILED
+    assert job.error == 'boom'
+    assert queue.stats()['failed'] == 1
+    queue.shutdown()
+
+def test_queue_rejects_work_beyond_pending_limit():
+    queue = JobQueue(max_workers=1, max_pending=2)
+    started, release = threading.Event(), threading.Event()
+
+    def block(_report):
+        started.set()
+        release.wait()
+
+    blocked = [queue.submit(block) for _ in range(2)]
+    # The first job is only marked running once its worker picks it up
+    assert started.wait(5)
+
+    with pytest.raises(QueueFullError):
+        queue.submit(lambda _report: None)
+
+    stats = queue.stats()
+    assert stats['running'] == 1
+    assert stats['queue_depth'] == 1
+    assert stats['rejected'] == 1
+
+    release.set()
+    for job in blocked:
+        wait_for(job)
+    assert queue.stats()['queue_depth'] == 0
+    queue.shutdown()
@@ -0,0 +1,186 @@
+import itertools
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from modules import live_analysis, realtime_transcription
+from modules.live_analysis import LiveAnalyzer
+from modules.text_analysis import emotion_bucket, sia, stop_words
+from modules.voice_activity import interval_features
+
+SEGMENTS = [
+    ("Thank you for calling, how can I help?", 0.0, 2.5),
+    ("I'm really sorry about the delay. That should never happen.", 3.0, 6.0),
+    ("This is terrible and I am very angry!", 7.0, 9.0),
+    ("I understand, let me fix that for you right away.", 60.0, 63.0),
+    ("Great, thank you so much.", 64.0, 65.5),
+]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def expected_snapshot(segments, window_seconds):
+    # Recompute the window from scratch
+    words = [
+        w.lower()
+        for text, _, _ in segments
+        for w in live_analysis.WORD_PATTERN.findall(text)
+    ]
+    content = [w for w in words if w not in stop_words]
+    compounds = [
+        sia.polarity_scores(s)['compound']
+        for text, _, _ in segments
+        for s in live_analysis.SENTENCE_PATTERN.findall(text)
+        if s.strip()
+    ]
+    emotions = dict.fromkeys(
+        ['very_positive', 'positive', 'neutral', 'negative', 'very_negative'], 0
+    )
+    for c in compounds:
+        emotions[emotion_bucket(c)] += 1
+    span = segments[-1][2] - segments[0][1]
+    pauses = [
+        b[1] - a[2] for a, b in itertools.pairwise(segments) if b[1] - a[2] >= 0.25
+    ]
+    speaking = span - sum(pauses)
+    return {
+        'window_seconds': window_seconds,
+        'window_start': segments[0][1],
+        'window_end': segments[-1][2],
+        'word_count': len(words),
+        'sentiment': pytest.approx(sum(compounds) / len(compounds)),
+        'emotion_analysis': emotions,
+        'lexical_diversity': pytest.approx(len(set(content)) / len(content)),
+        'pause_count': len(pauses),
+        'pause_duration_mean': pytest.approx(np.mean(pauses) if pauses else 0.0),
+        'pause_duration_median': pytest.approx(np.median(pauses) if pauses else 0.0),
+        'pause_duration_p90': pytest.approx(
+            np.percentile(pauses, 90) if pauses else 0.0
+        ),
+        'speaking_ratio': pytest.approx(speaking / span),
+        'speech_rate': pytest.approx(len(words) / span * 60),
+        'articulation_rate': pytest.approx(len(words) / speaking * 60),
+    }
+
+
+def test_sliding_window_matches_recomputation():
+    analyzer = LiveAnalyzer(window_seconds=30, min_interval=0)
+
+    for i, (text, start, end) in enumerate(SEGMENTS):
+        update = analyzer.add_segment(text, start, end)
+        window = [s for s in SEGMENTS[:i + 1] if s[2] > end - 30]
+        assert update == expected_snapshot(window, 30)
+
+    # The first three segments have left the window
+    assert analyzer.snapshot()['window_start'] == 60.0
+
+
+def test_word_timing_features_match_interval_features():
+    rng = np.random.default_rng(0)
+    analyzer = LiveAnalyzer(window_seconds=20, min_interval=0)
+    segments, now = [], 0.0
+    for _ in range(40):
+        words = []
+        for _ in range(rng.integers(1, 8)):
+            now += rng.choice([0.05, 0.2, 0.3, 1.5])
+            words.append((now, now + 0.3))
+            now += 0.3
+        text = ' '.join(['word'] * len(words))
+        segments.append((words, analyzer.add_segment(text, words[0][0], now, words)))
+
+        window = [w for w, _ in segments if w[-1][1] > now - 20]
+        expected = interval_features(
+            [interval for w in window for interval in w],
+            units=sum(len(w) for w in window),
+        )
+        update = segments[-1][1]
+        assert {key: update[key] for key in expected} == pytest.approx(expected)
+
+
+def test_updates_are_throttled():
+    clock = FakeClock()
+    analyzer = LiveAnalyzer(min_interval=1.0, clock=clock)
+
+    assert analyzer.add_segment(*SEGMENTS[0]) is not None
+    clock.now = 0.5
+    assert analyzer.add_segment(*SEGMENTS[1]) is None
+    clock.now = 1.2
+    assert (
+        analyzer.add_segment(*SEGMENTS[2])['word_count']
+        == expected_snapshot(SEGMENTS[:3], 60)['word_count']
+    )
+    assert analyzer.flush() is None
+
+    clock.now = 1.5
+    assert analyzer.add_segment(*SEGMENTS[3]) is None
+    assert analyzer.flush()['window_end'] == 63.0
+
+
+def test_held_back_update_is_polled_after_min_interval():
+    clock = FakeClock()
+    analyzer = LiveAnalyzer(min_interval=1.0, clock=clock)
+
+    analyzer.add_segment(*SEGMENTS[0])
+    assert analyzer.poll() is None
+    clock.now = 0.5
+    assert analyzer.add_segment(*SEGMENTS[1]) is None
+    assert analyzer.poll() is None
+    clock.now = 1.0
+    assert analyzer.poll()['window_end'] == 6.0
+    assert analyzer.poll() is None
+
+
+def test_realtime_transcription_emits_transcripts_and_analysis(monkeypatch):
+    handlers = {}
+    connection = SimpleNamespace(
+        on=lambda event, fn: handlers.setdefault(event, fn), start=lambda _options: True
+    )
+    client = SimpleNamespace(
+        listen=SimpleNamespace(live=SimpleNamespace(v=lambda _version: connection))
+    )
+    monkeypatch.setattr(
+        realtime_transcription.clients, 'get_deepgram_client', lambda: client
+    )
+
+    events = []
+    analyzer = LiveAnalyzer(min_interval=0)
+    realtime_transcription.start_realtime_transcription(
+        lambda event, data: events.append((event, data)), analyzer
+    )
+    on_message = handlers[realtime_transcription.LiveTranscriptionEvents.Transcript]
+
+    def result(text, is_final, start=0.0, duration=2.0):
+        words = [
+            SimpleNamespace(start=0.1 + 0.3 * i, end=0.3 + 0.3 * i)
+            for i in range(len(text.split()))
+        ]
+        words[-1:] = [SimpleNamespace(start=1.5, end=1.9)] if words else []
+        alternative = SimpleNamespace(transcript=text, words=words)
+        return SimpleNamespace(
+            channel=SimpleNamespace(alternatives=[alternative]),
+            is_final=is_final,
+            start=start,
+            duration=duration,
+        )
+
+    on_message(None, result('Thank you for', False))
+    on_message(None, result('Thank you for calling.', True))
+    on_message(None, result('', True))
+
+    assert [event for event, _ in events] == [
+        'transcript',
+        'transcript',
+        'live_analysis',
+    ]
+    assert events[0][1] == {'transcript': 'Thank you for', 'is_final': False}
+    assert events[2][1]['word_count'] == 4
+    # The gap before the last word is a pause
+    assert events[2][1]['pause_count'] == 1
+    assert events[2][1]['pause_duration_mean'] == pytest.approx(0.6)
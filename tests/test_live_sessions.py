@@ -0,0 +1,195 @@
+import threading
+import time
+
+import pytest
+
+from modules.live_sessions import LiveSessionManager, SessionLimitError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeConnection:
+    def __init__(self):
+        self.sent = []
+        self.finished = False
+
+    def send(self, data):
+        self.sent.append(data)
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.001)
+
+
+def make_manager(**kwargs):
+    connections = []
+
+    def connect(_emit, _analyzer):
+        connections.append(FakeConnection())
+        return connections[-1]
+
+    def disconnect(connection):
+        connection.finished = True
+
+    clock = FakeClock()
+    manager = LiveSessionManager(
+        connect=connect, disconnect=disconnect, clock=clock, **kwargs
+    )
+    return manager, connections, clock
+
+
+def test_chunks_are_coalesced_in_order():
+    manager, connections, clock = make_manager(coalesce_bytes=10, flush_interval=0.1)
+    manager.start('a', lambda _event, _data: None)
+
+    for i in range(4):
+        manager.send('a', bytes([i]) * 3)
+    # Forwarded once 10 bytes are buffered; the tail only after flush_interval
+    wait_until(lambda: len(connections[0].sent) == 1)
+    assert connections[0].sent == [bytes([0, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3])]
+    for i in range(4, 7):
+        manager.send('a', bytes([i]) * 3)
+    manager.sweep()
+    assert manager.stats()['queued_bytes'] == 9
+    clock.now = 0.2
+    manager.sweep()
+    wait_until(lambda: len(connections[0].sent) == 2)
+    assert connections[0].sent[-1] == bytes([4, 4, 4, 5, 5, 5, 6, 6, 6])
+    manager.send('a', b'xy')
+
+    assert manager.finish('a')
+    assert connections[0].finished
+    assert not manager.finish('a')
+    stats = manager.stats()
+    assert stats['active_sessions'] == 0
+    assert stats['bytes_received'] == stats['bytes_sent'] == 23
+    assert connections[0].sent[-1] == b'xy'
+    assert stats['sends'] == 3
+
+
+def test_backpressure_drops_chunks_and_notifies():
+    manager, connections, clock = make_manager(coalesce_bytes=100, max_queued_bytes=10)
+    events = []
+    manager.start('a', lambda event, _data: events.append(event))
+
+    assert manager.send('a', b'x' * 8)
+    assert not manager.send('a', b'x' * 8)
+    assert not manager.send('a', b'x' * 8)
+    assert events == ['transcription_backpressure']
+
+    stats = manager.stats()
+    assert stats['queued_bytes'] == 8
+    assert stats['bytes_dropped'] == 16
+
+
+def test_slow_connection_does_not_block_senders():
+    manager, connections, clock = make_manager(coalesce_bytes=4, max_queued_bytes=10)
+    release = threading.Event()
+    events = []
+    manager.start('a', lambda event, _data: events.append(event))
+    connections[0].send = lambda _data: release.wait(5)
+
+    assert manager.send('a', b'x' * 8)
+    wait_until(lambda: not manager._sessions['a'].buffer)
+    # The 8 bytes being sent still count against max_queued_bytes
+    assert not manager.send('a', b'x' * 8)
+    assert events == ['transcription_backpressure']
+    assert manager.stats()['queued_bytes'] == 8
+
+    release.set()
+    wait_until(lambda: manager.stats()['bytes_sent'] == 8)
+    assert manager.send('a', b'x' * 8)
+
+
+def test_stalled_sender_does_not_block_closing():
+    manager, connections, clock = make_manager(
+        coalesce_bytes=4, idle_timeout=5, close_timeout=0.1
+    )
+    release = threading.Event()
+    manager.start('a', lambda _event, _data: None)
+    manager.start('b', lambda _event, _data: None)
+    connections[0].send = lambda _data: release.wait(5)
+    manager.send('a', b'x' * 4)
+    wait_until(lambda: manager._sessions['a'].in_flight)
+    manager.send('a', b'y' * 2)
+
+    clock.now = 10
+    manager.sweep()
+
+    # Both sessions are closed although a's sender is still stuck
+    assert manager.stats()['active_sessions'] == 0
+    assert connections[1].finished
+    assert manager.stats()['bytes_dropped'] == 2
+    release.set()
+
+
+def test_idle_sessions_time_out_and_limit_is_enforced():
+    manager, connections, clock = make_manager(max_sessions=2, idle_timeout=5)
+    events = []
+    manager.start('a', lambda event, data: events.append((event, data)))
+    manager.start('b', lambda _event, _data: None)
+    with pytest.raises(SessionLimitError):
+        manager.start('c', lambda _event, _data: None)
+    # Restarting an existing session replaces its connection
+    manager.start('b', lambda _event, _data: None)
+    assert connections[1].finished
+
+    clock.now = 3
+    manager.send('b', b'audio')
+    clock.now = 6
+    manager.sweep()
+
+    assert connections[0].finished and not connections[2].finished
+    assert events == [('transcription_stopped', {'reason': 'timeout'})]
+    stats = manager.stats()
+    assert stats['active_sessions'] == 1
+    assert stats['timed_out'] == 1
+    assert stats['rejected'] == 1
+
+
+def test_concurrent_sessions():
+    manager, connections, clock = make_manager(coalesce_bytes=64)
+    chunk = b'\x01' * 20
+
+    def stream(sid):
+        manager.start(sid, lambda _event, _data: None)
+        for _ in range(50):
+            manager.send(sid, chunk)
+        manager.finish(sid)
+
+    threads = [threading.Thread(target=stream, args=(f's{i}',)) for i in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(b''.join(c.sent) == chunk * 50 and c.finished for c in connections)
+    stats = manager.stats()
+    assert stats['started'] == stats['finished'] == 50
+    assert stats['bytes_sent'] == 50 * 50 * 20
+
+
+def test_sweep_sends_held_back_analysis():
+    updates = iter([None, {'word_count': 12}])
+    analyzer = type(
+        'FakeAnalyzer',
+        (),
+        {'poll': lambda _self: next(updates), 'flush': lambda _self: None},
+    )()
+    manager, connections, clock = make_manager(analyzer_factory=lambda: analyzer)
+    events = []
+    manager.start('a', lambda event, data: events.append((event, data)))
+
+    manager.sweep()
+    assert events == []
+    manager.sweep()
+    assert events == [('live_analysis', {'word_count': 12})]
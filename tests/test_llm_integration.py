@@ -0,0 +1,151 @@
+import asyncio
+import json
+
+import pytest
+
+from benchmarks.stub_api import LLM_ANALYSIS, StubAPIServer
+from modules import clients, llm_integration
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    with StubAPIServer() as server:
+        monkeypatch.setenv('ANTHROPIC_API_KEY', 'test')
+        monkeypatch.setenv('ANTHROPIC_BASE_URL', server.url)
+        monkeypatch.setattr(
+            llm_integration, '_usage', llm_integration.collections.Counter()
+        )
+        clients.reset_clients()
+        yield server
+        clients.reset_clients()
+
+
+def test_analysis_reports_usage(stub):
+    data = {
+        'audio_features': {'tempo': 123.046875, 'mfccs': [1.5] * 13},
+        'text_features': {'word_count': 3},
+    }
+
+    result = llm_integration.analyze_with_llm(data, transcript='Thank you for calling.')
+
+    assert result.to_dict() == LLM_ANALYSIS
+    prompt = json.loads(stub.bodies['/v1/messages'][0])['messages'][0]['content'][0][
+        'text'
+    ]
+    assert '"tempo":123' in prompt
+    assert 'mfccs' not in prompt
+    assert 'Thank you for calling.' in prompt
+
+    stats = llm_integration.usage_stats()
+    # The stub reports 100 input and 50 output tokens per call
+    assert stats['calls'] == 1
+    assert stats['input_tokens'] == 100
+    assert stats['output_tokens'] == 50
+    assert stats['estimated_input_tokens'] > 0
+    assert stats['avg_latency_seconds'] > 0
+
+
+def test_instructions_are_a_cached_system_prefix(stub):
+    for word_count in (3, 4):
+        llm_integration.analyze_with_llm({'text_features': {'word_count': word_count}})
+
+    first, second = (json.loads(body) for body in stub.bodies['/v1/messages'])
+    assert first['system'] == second['system']
+    assert first['system'][-1]['cache_control'] == {'type': 'ephemeral'}
+    assert 'Carefully review the data' in first['system'][0]['text']
+    assert 'Carefully review the data' not in first['messages'][0]['content'][0]['text']
+
+    stats = llm_integration.usage_stats()
+    assert stats['cache_creation_input_tokens'] > 0
+    assert stats['cache_read_input_tokens'] == stats['cache_creation_input_tokens']
+
+
+def test_batch_submit_and_collect(stub):
+    stub.batch_errors = {'call-2'}
+    payloads = [
+        (f'call-{i}', {'text_features': {'word_count': i}}, f'Transcript {i}.')
+        for i in range(3)
+    ]
+
+    batch_id = llm_integration.submit_batch(payloads)
+    results = dict(llm_integration.collect_batch(batch_id, poll_interval=0.01))
+
+    requests = json.loads(stub.bodies['/v1/messages/batches'][0])['requests']
+    assert [r['custom_id'] for r in requests] == ['call-0', 'call-1', 'call-2']
+    assert requests[0]['params']['temperature'] == llm_integration.TEMPERATURE
+    assert 'Transcript 0.' in requests[0]['params']['messages'][0]['content'][0]['text']
+
+    assert results['call-0'].to_dict() == results['call-1'].to_dict() == LLM_ANALYSIS
+    assert isinstance(results['call-2'], llm_integration.LLMAnalysisError)
+    assert llm_integration.usage_stats()['batch_results'] == 2
+
+    with pytest.raises(TimeoutError):
+        stub.batch_pending_polls = 100
+        list(
+            llm_integration.collect_batch(
+                llm_integration.submit_batch(payloads), poll_interval=0.01, timeout=0.05
+            )
+        )
+
+
+def test_analysis_is_forced_tool_use_validated_once(stub):
+    llm_integration.analyze_with_llm({'text_features': {'word_count': 3}})
+    request = json.loads(stub.bodies['/v1/messages'][0])
+    assert request['tool_choice'] == {'type': 'tool', 'name': 'record_analysis'}
+    assert request['tools'][0]['input_schema']['required'] == list(LLM_ANALYSIS)
+
+    stub.anthropic_tool_input = {**LLM_ANALYSIS, 'key_points': 'not a list'}
+    with pytest.raises(llm_integration.LLMAnalysisError) as error:
+        llm_integration.analyze_with_llm({'text_features': {'word_count': 3}})
+    assert 'key_points' in str(error.value)
+
+    # Prose answers still work when they contain the JSON object
+    stub.anthropic_text = 'Here is the analysis: ' + json.dumps(LLM_ANALYSIS)
+    assert (
+        llm_integration.analyze_with_llm({'text_features': {'word_count': 3}}).to_dict()
+        == LLM_ANALYSIS
+    )
+    stub.anthropic_text = 'Sorry, I cannot help with that.'
+    with pytest.raises(llm_integration.LLMAnalysisError) as error:
+        llm_integration.analyze_with_llm({'text_features': {'word_count': 3}})
+    assert error.value.raw_response == stub.anthropic_text
+
+    # Call failures surface the same way
+    stub.fail_next(1, status=400)
+    with pytest.raises(llm_integration.LLMAnalysisError):
+        llm_integration.analyze_with_llm({'text_features': {'word_count': 3}})
+    with pytest.raises(llm_integration.LLMAnalysisError):
+        llm_integration.analyze_with_llm('{not json')
+
+
+@pytest.mark.usefixtures('stub')
+def test_streamed_fields_arrive_before_the_result():
+    fields = []
+    result = llm_integration.analyze_with_llm(
+        {'text_features': {'word_count': 3}}, on_field=lambda *f: fields.append(f)
+    )
+
+    assert fields == list(LLM_ANALYSIS.items())
+    assert result.to_dict() == LLM_ANALYSIS
+
+    fields.clear()
+    result = asyncio.run(
+        llm_integration.analyze_with_llm_async(
+            {'word_count': 3}, on_field=lambda *f: fields.append(f)
+        )
+    )
+    assert fields == list(LLM_ANALYSIS.items())
+    assert result.to_dict() == LLM_ANALYSIS
+
+
+def test_field_stream_waits_for_complete_values():
+    fields = []
+    stream = llm_integration.FieldStream(lambda *f: fields.append(f))
+    text = json.dumps({'a': 'x, "y"', 'b': [1, {'c': '}'}], 'n': 12.5})
+
+    for char in text:
+        stream.feed(char)
+        # Every reported field is complete
+        assert all(value == json.loads(text)[key] for key, value in fields)
+
+    assert fields == list(json.loads(text).items())
@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from modules import metrics
+from modules.metrics import Registry, timed
+from modules.pipeline import Pipeline
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram(
+        'request_seconds', 'Request time', ['route'], buckets=[0.1, 1.0]
+    )
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, route='/upload')
+
+    text = registry.render()
+
+    assert '# TYPE request_seconds histogram' in text
+    assert 'request_seconds_bucket{route="/upload",le="0.1"} 2' in text
+    assert 'request_seconds_bucket{route="/upload",le="1.0"} 3' in text
+    assert 'request_seconds_bucket{route="/upload",le="+Inf"} 4' in text
+    assert 'request_seconds_sum{route="/upload"} 3.65' in text
+    assert 'request_seconds_count{route="/upload"} 4' in text
+
+
+def test_counters_and_stats_callbacks():
+    registry = Registry()
+    counter = registry.counter('errors', 'Errors', ['stage'])
+    counter.inc(stage='a "quoted" stage')
+    counter.inc(2, stage='a "quoted" stage')
+    registry.register_stats(
+        'jobs', 'Job queue', lambda: {'running': 2, 'hit_ratio': 0.5, 'name': 'x'}
+    )
+
+    text = registry.render()
+
+    assert 'errors_total{stage="a \\"quoted\\" stage"} 3' in text
+    assert 'jobs_running 2' in text
+    assert 'jobs_hit_ratio 0.5' in text
+    assert 'jobs_name' not in text
+    # Registering is idempotent by name but not across types
+    assert registry.counter('errors', 'Errors', ['stage']) is counter
+    with pytest.raises(ValueError):
+        registry.histogram('errors', 'Errors')
+
+
+def test_timed_records_stages_and_collects_breakdown():
+    before = metrics.STAGE_SECONDS.snapshot(stage='test.work')['count']
+
+    @timed('test.fail')
+    def fail():
+        raise ValueError('boom')
+
+    with metrics.collect() as breakdown:
+        with timed('test.work'):
+            pass
+        with pytest.raises(ValueError):
+            fail()
+    with timed('test.work'):
+        pass
+
+    assert metrics.STAGE_SECONDS.snapshot(stage='test.work')['count'] == before + 2
+    assert metrics.STAGE_ERRORS.value(stage='test.fail') >= 1
+    assert set(breakdown) == {'test.work', 'test.fail'}
+
+
+def test_breakdown_includes_pipeline_stages_on_other_threads():
+    def work():
+        with timed('test.pipeline_stage'):
+            return 1
+
+    pipeline = Pipeline().add('a', work).add('b', work)
+    with metrics.collect() as breakdown, ThreadPoolExecutor(max_workers=2) as executor:
+        pipeline.run(executor)
+
+    assert breakdown['test.pipeline_stage'] > 0
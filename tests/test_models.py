@@ -0,0 +1,46 @@
+import subprocess
+import sys
+import threading
+import time
+
+from modules import models, text_analysis
+
+
+def test_lazy_resource_loads_once_across_threads():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+
+    resource = models.LazyResource('test', loader)
+    assert not resource.loaded
+    values = []
+    threads = [
+        threading.Thread(target=lambda: values.append(resource.get())) for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert resource.loaded
+    assert all(value is values[0] for value in values)
+
+
+def test_importing_text_analysis_loads_nothing():
+    code = (
+        'import modules.text_analysis\n'
+        'from modules import models\n'
+        'assert not any(r.loaded for r in (models.nlp, models.stop_words, '
+        'models.sentiment_analyzer))\n'
+    )
+    subprocess.run([sys.executable, '-c', code], check=True)
+
+
+def test_module_attributes_resolve_to_shared_models():
+    assert text_analysis.nlp is models.nlp.get()
+    assert text_analysis.sia is models.sentiment_analyzer.get()
+    assert 'the' in text_analysis.stop_words
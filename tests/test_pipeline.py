@@ -0,0 +1,82 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from modules.pipeline import COMPLETED, FAILED, Pipeline, run_sequential
+
+
+def sleeper(seconds, value):
+    def stage(**_kwargs):
+        time.sleep(seconds)
+        return value
+    return stage
+
+
+def fan_out():
+    return (
+        Pipeline(inputs=['path'])
+        .add('transcript', sleeper(0.2, 'hello'), ['path'])
+        .add('audio', sleeper(0.3, 'audio features'), ['path'])
+        .add('text', lambda transcript: transcript.upper(), ['transcript'])
+        .add('combined', lambda text, audio: f'{text} + {audio}', ['text', 'audio'])
+    )
+
+
+def test_independent_stages_overlap():
+    with ThreadPoolExecutor(4) as executor:
+        started = time.perf_counter()
+        results, timings = fan_out().run(executor, path='call.wav')
+        elapsed = time.perf_counter() - started
+
+    assert results['combined'] == 'HELLO + audio features'
+    # Critical path is the 0.3 s audio stage, not the 0.5 s sum
+    assert elapsed < 0.45
+    assert timings['audio']['start'] < 0.05 and timings['transcript']['start'] < 0.05
+    assert timings['combined']['start'] >= timings['audio']['seconds']
+    assert {t['status'] for t in timings.values()} == {COMPLETED}
+
+    started = time.perf_counter()
+    results, _ = run_sequential(fan_out(), path='call.wav')
+    assert time.perf_counter() - started >= 0.5
+    assert results['combined'] == 'HELLO + audio features'
+
+
+def test_optional_failure_passes_none_and_required_failure_stops():
+    def boom(**_kwargs):
+        raise RuntimeError('boom')
+
+    events = []
+    pipeline = (
+        Pipeline(inputs=['x'])
+        .add('a', boom, ['x'], optional=True)
+        .add('b', lambda a: a is None, ['a'])
+    )
+    with ThreadPoolExecutor(2) as executor:
+        results, timings = pipeline.run(
+            executor, on_stage=lambda *e: events.append(e), x=1
+        )
+    assert results['b'] is True
+    assert timings['a']['status'] == FAILED
+    assert events == [('a', None), ('a', FAILED), ('b', None), ('b', COMPLETED)]
+
+    ran = threading.Event()
+    pipeline = (
+        Pipeline(inputs=['x'])
+        .add('a', boom, ['x'])
+        .add('slow', sleeper(0.1, 1), ['x'])
+        .add('b', lambda a: ran.set(), ['a'])  # noqa: ARG005
+    )
+    with ThreadPoolExecutor(2) as executor, pytest.raises(RuntimeError):
+        pipeline.run(executor, x=1)
+    assert not ran.is_set()
+
+
+def test_dependencies_are_validated():
+    with pytest.raises(ValueError):
+        Pipeline(inputs=['x']).add('a', lambda b: b, ['b'])
+    with pytest.raises(ValueError):
+        Pipeline(inputs=['x']).add('x', lambda: 1)
+    with pytest.raises(ValueError):
+        run_sequential(Pipeline(inputs=['x']))
@@ -0,0 +1,53 @@
+import librosa
+import numpy as np
+import pytest
+
+from modules import pitch
+from modules.audio_features import HOP_LENGTH, N_FFT
+from modules.pitch import PitchTracker
+
+
+def harmonic_tone(f0, sr=22050, seconds=2.0):
+    t = np.arange(int(seconds * sr)) / sr
+    return (0.2 * sum(np.sin(2 * np.pi * k * f0 * t) / k for k in range(1, 8))).astype(
+        np.float32
+    )
+
+
+def track(y, method, sr=22050):
+    tracker = PitchTracker(sr, N_FFT, method=method)
+    tracker.push_spectrum(np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH)))
+    tracker.push_samples(y)
+    return tracker.finish()
+
+
+@pytest.mark.parametrize('method', ['spectral', 'yin'])
+@pytest.mark.parametrize('f0', [90.0, 180.0, 320.0])
+def test_steady_tone(method, f0):
+    mean, std = track(harmonic_tone(f0), method)
+    assert mean == pytest.approx(f0, abs=0.5)
+    assert std < 1.0
+
+
+@pytest.mark.parametrize('method', ['spectral', 'yin'])
+def test_noise_and_silence_are_unvoiced(method):
+    noise = 0.01 * np.random.default_rng(0).standard_normal(22050 * 2).astype(
+        np.float32
+    )
+    assert track(noise, method) == (0.0, 0.0)
+    assert track(np.zeros(22050, dtype=np.float32), method) == (0.0, 0.0)
+
+
+def test_yin_is_independent_of_push_sizes(monkeypatch):
+    monkeypatch.setattr(pitch, 'PITCH_BLOCK_FRAMES', 16)
+    y = np.concatenate(
+        [harmonic_tone(120.0, seconds=1.0), harmonic_tone(240.0, seconds=1.0)]
+    )
+    whole = PitchTracker(22050, N_FFT, method='yin')
+    whole.push_samples(y)
+    pieces = PitchTracker(22050, N_FFT, method='yin')
+    for start in range(0, len(y), 3001):
+        pieces.push_samples(y[start:start + 3001])
+
+    assert pieces.finish() == pytest.approx(whole.finish())
+    assert whole.stats.mean() == pytest.approx(180.0, abs=2.0)
@@ -0,0 +1,78 @@
+import json
+
+from modules import prompt_builder
+
+
+def features():
+    return {
+        'audio_features': {
+            'tempo': 123.046875,
+            'spectral_centroid': 2345.678,
+            'mfccs': [-312.5, 98.25, 12.125],
+            'pause_count': 12,
+            'energy_mean': 0.0345678,
+        },
+        'text_features': {
+            'sentiment': {'neg': 0.0341, 'compound': 0.98765},
+            'word_count': 512,
+        },
+        'top_words': {'help': 12},
+    }
+
+
+def test_compact_rounds_and_drops_fields():
+    data = prompt_builder.compact(features())
+
+    assert data == {
+        'audio_features': {
+            'tempo': 123,
+            'spectral_centroid': 2350,
+            'pause_count': 12,
+            'energy_mean': 0.035,
+        },
+        'text_features': {
+            'sentiment': {'neg': 0.034, 'compound': 0.99},
+            'word_count': 512,
+        },
+        'top_words': {'help': 12},
+    }
+
+    # Custom schema: fields it does not mention keep DEFAULT_PRECISION
+    data = prompt_builder.compact(
+        features(), {'audio_features': {'mfccs': 2}, 'text_features': None}
+    )
+    assert data['audio_features']['mfccs'] == [-310, 98, 12]
+    assert data['audio_features']['tempo'] == 123
+    assert 'text_features' not in data
+
+
+def test_system_prompt_explains_only_sent_features():
+    system = prompt_builder.system_prompt()
+    assert 'Tempo:' in system
+    assert 'MFCCs' not in system
+    assert 'MFCCs' in prompt_builder.system_prompt({'audio_features': {'tempo': None}})
+
+    # The per-call message carries only the data
+    prompt = prompt_builder.build_prompt(features())
+    data_str = json.dumps(prompt_builder.compact(features()), separators=(',', ':'))
+    assert data_str in prompt
+    assert 'Tempo:' not in prompt
+    assert 'Transcript' not in prompt
+
+
+def test_long_transcript_fits_budget():
+    sentences = [f'Sentence number {i} of the call.' for i in range(2000)]
+    transcript = ' '.join(sentences)
+
+    short = prompt_builder.build_prompt(features(), 'Hello there.', token_budget=1500)
+    assert 'Transcript:\nHello there.' in short
+
+    prompt = prompt_builder.build_prompt(features(), transcript, token_budget=1500)
+    assert prompt_builder.count_tokens(prompt_builder.system_prompt() + prompt) <= 1500
+    assert 'Transcript (excerpts):' in prompt
+    # The opening and closing of the call are always kept
+    assert sentences[0] in prompt and sentences[-1] in prompt
+    assert '[...]' in prompt
+
+    text, shortened = prompt_builder.fit_transcript(transcript, 0)
+    assert (text, shortened) == ('', True)
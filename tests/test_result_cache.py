@@ -0,0 +1,62 @@
+import pytest
+
+from modules import database
+from modules.result_cache import ResultCache, make_key, make_version
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'cache.db'}")
+    return database.get_db()
+
+def test_version_changes_with_settings():
+    assert make_version({'model': 'nova-2'}, '1') == make_version(
+        {'model': 'nova-2'}, '1'
+    )
+    assert make_version({'model': 'nova-2'}, '1') != make_version(
+        {'model': 'nova-3'}, '1'
+    )
+    assert make_version({'model': 'nova-2'}, '1') != make_version(
+        {'model': 'nova-2'}, '2'
+    )
+
+def test_hit_and_miss(db):
+    cache = ResultCache(db)
+    key = make_key('abc123', 'v1')
+
+    assert cache.get(key) is None
+    cache.put(key, {'transcript': 'hello', 'analysis': {'tone': 'warm'}})
+
+    assert cache.get(key) == {'transcript': 'hello', 'analysis': {'tone': 'warm'}}
+    assert cache.get(make_key('abc123', 'v2')) is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 2, 1)
+
+def test_expired_entries_are_misses(db, monkeypatch):
+    cache = ResultCache(db, ttl_seconds=60)
+    now = [1000.0]
+    monkeypatch.setattr('modules.result_cache.time.time', lambda: now[0])
+    cache.put('key', {'transcript': 'hello'})
+
+    now[0] += 61
+
+    assert cache.get('key') is None
+    assert cache.stats()['entries'] == 0
+
+def test_size_limit_evicts_least_recently_used(db, monkeypatch):
+    payload = {'transcript': 'x' * 100}
+    cache = ResultCache(db, max_bytes=250)
+    now = [1000.0]
+    monkeypatch.setattr('modules.result_cache.time.time', lambda: now[0])
+
+    for key in ['a', 'b']:
+        cache.put(key, payload)
+        now[0] += 1
+    cache.get('a')
+    now[0] += 1
+    cache.put('c', payload)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == payload
+    assert cache.get('c') == payload
+    assert cache.stats()['evictions'] == 1
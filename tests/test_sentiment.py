@@ -0,0 +1,80 @@
+import random
+
+import numpy as np
+import pytest
+from nltk.sentiment import SentimentIntensityAnalyzer
+
+from modules.sentiment import SentimentEngine
+
+
+@pytest.fixture(scope='module')
+def sia():
+    return SentimentIntensityAnalyzer()
+
+
+SENTENCES = [
+    "Thank you so much for calling, I really appreciate your patience!",
+    "I'm sorry, but that is NOT something we can refund.",
+    "This is not good at all.",
+    "The service was never so bad before, it's kind of frustrating??",
+    "I am at least a little happy, and at least not angry.",
+    "It was the bomb, yeah right, what a kiss of death.",
+    "GREAT job, really GREAT, great great great.",
+    "Good, good and good!!! :) but :( sad.",
+    "I didn't like it; the agent was hardly helpful.",
+    "",
+    "   ",
+    "a b c ! ?",
+    "\"Excellent\" (terrible) good!!!! -nice- sort of okay, just enough love.",
+]
+
+
+def test_scores_match_nltk(sia):
+    words = list(sia.lexicon)[:2000] + [
+        'but',
+        'BUT',
+        'least',
+        'at',
+        'very',
+        'never',
+        'so',
+        'this',
+        'kind',
+        'of',
+        'not',
+        "isn't",
+        'GOOD',
+        'Bad',
+        'good,',
+        'the',
+        'shit',
+        'hand',
+        'to',
+        'mouth',
+    ]
+    rng = random.Random(0)
+    sentences = SENTENCES + [
+        ' '.join(rng.choice(words) for _ in range(rng.randint(1, 12)))
+        + rng.choice(['', '!', '??'])
+        for _ in range(2000)
+    ]
+
+    scores = SentimentEngine(sia.lexicon, cache_size=0).score(sentences)
+
+    assert [scores.row(i) for i in range(len(sentences))] == [
+        sia.polarity_scores(s) for s in sentences
+    ]
+
+
+def test_repeated_sentences_are_served_from_cache(sia):
+    engine = SentimentEngine(sia.lexicon, cache_size=4)
+    # Repeats within a batch are scored once, repeats across batches not at all
+    first = engine.score(SENTENCES[:3] * 2)
+    again = engine.score(SENTENCES[:3])
+
+    assert engine.stats() == {'entries': 3, 'hits': 3, 'misses': 3}
+    np.testing.assert_array_equal(again.compound, first.compound[:3])
+    engine.score(SENTENCES[3:6])
+    assert engine.stats()['entries'] == 4
+    # The least recently used sentences were evicted
+    assert SENTENCES[0] not in engine._cache and SENTENCES[5] in engine._cache
@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 from modules import text_analysis
 
@@ -77,5 +78,183 @@ def test_analyze_text():
     assert isinstance(result['named_entities']['named_entity_count'], int)
     assert isinstance(result['named_entities']['entity_types'], dict)
 
+def test_analyze_texts_matches_analyze_text():
+    transcripts = [
+        "Thank you for calling. I understand this has been frustrating for you.",
+        "",
+        "I am sorry, but that is not something we can refund. Is there anything else?",
+        "Thank you for calling. I understand this has been frustrating for you.",
+    ]
+
+    expected = [text_analysis.analyze_text(t) for t in transcripts]
+
+    # Inputs are consumed lazily and results come back in input order
+    assert (
+        list(text_analysis.analyze_texts(iter(transcripts), batch_size=3)) == expected
+    )
+    assert (
+        list(text_analysis.analyze_texts(transcripts, batch_size=1, n_process=2))
+        == expected
+    )
+
+def test_sentiment_and_emotions_come_from_sentence_scores():
+    transcript = ("Thank you so much for calling! I'm sorry, but we can't refund that. "
+                  "That is terrible news. Is there anything else I can help with?")
+    doc = text_analysis.nlp(transcript)
+    compounds = [
+        text_analysis.sia.polarity_scores(sent.text)['compound']
+        for sent in text_analysis._sentences(doc)
+    ]
+
+    result = text_analysis.analyze_text(transcript)
+
+    assert result['sentiment']['compound'] == pytest.approx(
+        sum(compounds) / len(compounds), abs=1e-4
+    )
+    assert result['emotion_analysis'] == {
+        bucket: sum(text_analysis.emotion_bucket(c) == bucket for c in compounds)
+        for bucket in text_analysis.EMOTION_BUCKETS
+    }
+    assert result['emotion_analysis'] == text_analysis.analyze_emotions(transcript)
+    assert sum(
+        result['sentiment'][key] for key in ('neg', 'neu', 'pos')
+    ) == pytest.approx(1, abs=0.002)
+    assert text_analysis.analyze_text('')['sentiment'] == {
+        'neg': 0.0,
+        'neu': 0.0,
+        'pos': 0.0,
+        'compound': 0.0,
+    }
+
+def test_analyze_readability_batch_matches_single():
+    word_lists = [
+        ['the', 'customer', 'was', 'unhappy'],
+        [],
+        ['satisfaction', 'guaranteed'],
+    ]
+    sentence_counts = [1, 0, 1]
+
+    batch = text_analysis._readability_batch(word_lists, sentence_counts)
+
+    assert batch == [
+        text_analysis.analyze_readability(w, n)
+        for w, n in zip(word_lists, sentence_counts, strict=True)
+    ]
+    assert batch[1] == {
+        'flesch_reading_ease': 0.0,
+        'flesch_kincaid_grade': 0.0,
+        'gunning_fog': 0.0,
+    }
+
+@pytest.mark.parametrize(
+    'word, syllables',
+    [
+        ('a', 1),
+        ('cat', 1),
+        ('refund', 2),
+        ('customer', 3),
+        ('apologize', 3),
+        ('frustrating', 3),
+        ('satisfaction', 4),
+    ],
+)
+def test_syllable_count(word, syllables):
+    assert text_analysis._syllable_count(word) == syllables
+
+def test_readability_known_values():
+    # 11 words, 18 syllables, 3 of them polysyllabic, in 2 sentences
+    words = [
+        'the', 'customer', 'wants', 'a', 'refund', 'we',
+        'apologize', 'for', 'the', 'frustrating', 'wait',
+    ]
+
+    scores = text_analysis.analyze_readability(words, 2)
+
+    assert scores == {
+        'flesch_reading_ease': pytest.approx(
+            206.835 - 1.015 * 11 / 2 - 84.6 * 18 / 11, abs=0.005
+        ),
+        'flesch_kincaid_grade': pytest.approx(
+            0.39 * 11 / 2 + 11.8 * 18 / 11 - 15.59, abs=0.005
+        ),
+        'gunning_fog': pytest.approx(0.4 * (11 / 2 + 100 * 3 / 11), abs=0.005),
+    }
+    assert scores['flesch_reading_ease'] == 62.82
+
+
+def test_named_entity_counts():
+    doc = text_analysis.nlp(
+        "Sarah moved from Boston to Chicago. Sarah works at Acme with John."
+    )
+    labels = [ent.label_ for ent in doc.ents]
+    texts = [ent.text for ent in doc.ents]
+
+    result = text_analysis.analyze_named_entities(doc)
+
+    assert result['named_entity_count'] == len(labels)
+    assert result['entity_types'] == {
+        label: labels.count(label) for label in set(labels)
+    }
+    for label in set(labels):
+        expected = {
+            text: texts.count(text)
+            for text, ent_label in zip(texts, labels, strict=True)
+            if ent_label == label
+        }
+        assert result['top_entities'][label] == dict(
+            sorted(expected.items(), key=lambda kv: -kv[1])[:5]
+        )
+
+
+def test_entity_stats_incremental_matches_full():
+    segments = [
+        "Sarah called from Boston.",
+        "John at Acme escalated it.",
+        "Sarah followed up from Boston again.",
+    ]
+
+    incremental = text_analysis.EntityStats()
+    for segment in segments:
+        incremental.update(text_analysis.nlp(segment))
+    full = text_analysis.EntityStats().update(text_analysis.nlp(' '.join(segments)))
+
+    assert incremental.to_dict() == full.to_dict()
+    assert incremental.frequency('Sarah') == full.frequency('Sarah')
+    merged = (
+        text_analysis.EntityStats()
+        .update(text_analysis.nlp(segments[0]))
+        .merge(
+            text_analysis.EntityStats().update(
+                text_analysis.nlp(' '.join(segments[1:]))
+            )
+        )
+    )
+    assert merged.to_dict() == full.to_dict()
+
+
+@pytest.mark.parametrize(
+    'compound, bucket',
+    [
+        (0.9, 'very_positive'),
+        (0.5, 'very_positive'),
+        (0.49, 'positive'),
+        (0.1, 'positive'),
+        (0.0, 'neutral'),
+        (-0.1, 'negative'),
+        (-0.49, 'negative'),
+        (-0.5, 'very_negative'),
+        (-0.9, 'very_negative'),
+    ],
+)
+def test_emotion_buckets_agree_at_thresholds(compound, bucket):
+    assert text_analysis.emotion_bucket(compound) == bucket
+    counts = text_analysis._emotion_counts_batch([compound], np.zeros(1, dtype=int), 1)[
+        0
+    ]
+    assert counts == {
+        name: int(name == bucket) for name in text_analysis.EMOTION_BUCKETS
+    }
+
+
 if __name__ == '__main__':
     pytest.main()
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from modules import voice_activity
+from modules.audio_features import HOP_LENGTH, FeatureEngine
+from modules.voice_activity import VoiceActivityDetector, interval_features
+
+
+@pytest.fixture
+def phrases():
+    # Ten 2 s phrases of eight 4 Hz syllables, each followed by 0.6 s of silence
+    sr = 22050
+    t = np.arange(2 * sr) / sr
+    phrase = (
+        0.3 * np.sin(2 * np.pi * 150 * t) * (0.55 + 0.45 * np.sin(2 * np.pi * 4 * t))
+    )
+    y = np.concatenate(
+        [np.concatenate([phrase, np.zeros(int(0.6 * sr))]) for _ in range(10)]
+    )
+    y += 0.003 * np.random.default_rng(0).standard_normal(len(y))
+    return y.astype(np.float32), sr
+
+
+def test_pauses_and_rates_from_segments(phrases):
+    y, sr = phrases
+    features = FeatureEngine(y, sr).activity()
+
+    duration = len(y) / sr
+    assert features['pause_count'] == 9
+    # The 93 ms rms frames blur the edges of each pause
+    assert features['pause_duration_median'] == pytest.approx(0.6, abs=0.12)
+    assert features['speaking_ratio'] == pytest.approx(20 / duration, abs=0.05)
+    assert features['speech_rate'] == pytest.approx(80 / duration * 60)
+    assert features['articulation_rate'] > features['speech_rate']
+
+
+def test_pushing_in_blocks_matches_one_push(phrases):
+    y, sr = phrases
+    rms = FeatureEngine(y, sr).rms
+    detector = VoiceActivityDetector(sr, HOP_LENGTH)
+    for start in range(0, len(rms), 37):
+        detector.push(rms[start:start + 37])
+
+    whole = VoiceActivityDetector(sr, HOP_LENGTH)
+    whole.push(rms)
+
+    np.testing.assert_array_equal(detector.segments(), whole.segments())
+    assert detector.features(len(y)) == whole.features(len(y))
+
+
+def test_silence_has_no_speech():
+    features = voice_activity.analyze_activity(np.zeros(500), 22050, HOP_LENGTH)
+    assert features['pause_count'] == 0
+    assert features['speaking_ratio'] == 0
+    assert features['speech_rate'] == 0
+
+
+def test_interval_features_bridge_short_gaps():
+    # Overlapping and touching words, a short gap, then a 1 s pause
+    words = [(0.0, 0.5), (0.4, 0.8), (0.8, 1.0), (1.1, 1.5), (2.5, 3.0)]
+    features = interval_features(words, units=5)
+
+    assert features['pause_count'] == 1
+    assert features['pause_duration_mean'] == pytest.approx(1.0)
+    assert features['speaking_ratio'] == pytest.approx(2.0 / 3.0)
+    assert features['speech_rate'] == pytest.approx(100.0)
+    assert interval_features([], units=0)['pause_count'] == 0